@@ -0,0 +1,86 @@
+from . import bench, BenchTimer, main_bench_registered
+from apq import AddressablePQ
+from random import random as random_01, randrange
+
+
+# The KeyedPQ counterparts of these benchmarks are bench_add, bench_pop,
+# bench_change_value_item, bench_value_item and bench_remove in bench.basic.
+
+@bench()
+def bench_add(b: BenchTimer) -> None:
+    pq: AddressablePQ[None] = AddressablePQ()
+
+    for _ in range(10000):
+        pq.add(random_01(), None)
+
+    with b.time() as t:
+        for _ in t:
+            pq.add(random_01(), None)
+
+    with b.offset() as t:
+        for _ in t:
+            random_01()
+
+@bench()
+def bench_pop(b: BenchTimer) -> None:
+    pq: AddressablePQ[None] = AddressablePQ()
+
+    for _ in range(b.n + 10000):
+        pq.add(random_01(), None)
+
+    with b.time() as t:
+        for _ in t:
+            pq.pop()
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+@bench()
+def bench_change_value(b: BenchTimer) -> None:
+    pq: AddressablePQ[None] = AddressablePQ()
+
+    items = [pq.add(random_01(), None) for _ in range(10000)]
+
+    with b.time() as t:
+        for _ in t:
+            item = items[randrange(len(items))]
+            pq.change_value(item, random_01())
+
+    with b.offset() as t:
+        for _ in t:
+            item = items[randrange(len(items))]
+            random_01()
+
+@bench()
+def bench_value(b: BenchTimer) -> None:
+    pq: AddressablePQ[None] = AddressablePQ()
+
+    items = [pq.add(random_01(), None) for _ in range(10000)]
+
+    with b.time() as t:
+        for _ in t:
+            item = items[randrange(len(items))]
+            item.value
+
+    with b.offset() as t:
+        for _ in t:
+            item = items[randrange(len(items))]
+
+@bench()
+def bench_remove(b: BenchTimer) -> None:
+    pq: AddressablePQ[None] = AddressablePQ()
+
+    items = [pq.add(random_01(), None) for _ in range(b.n + 10000)]
+    removed = items[:b.n]
+
+    with b.time() as t:
+        for item in removed:
+            pq.remove(item)
+
+    with b.offset() as t:
+        for item in removed:
+            pass
+
+if __name__ == '__main__':
+    main_bench_registered()
@@ -0,0 +1,107 @@
+import gc
+import sys
+import tracemalloc
+from typing import Any, Callable, List, Tuple
+
+from .utils import StringSource
+from apq import KeyedPQ, KeyedItem
+from random import random as random_01, randrange
+
+
+def _count_allocating(op: Callable[[Any], None], args: List[Any]) -> float:
+    """Returns the fraction of calls of op which allocate memory.
+
+    op is called once for each element of args. A call is counted if it
+    allocates memory through the Python allocators, even if the memory is
+    released before the call returns. Allocations performed by C++
+    containers are not traced.
+
+    tracemalloc.reset_peak() is only available from Python 3.9 on, older
+    versions restart tracing before each call to reset the peak.
+    """
+
+    allocating = 0
+
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        for arg in args:
+            if sys.version_info >= (3, 9):
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.stop()
+                tracemalloc.start()
+            op(arg)
+            current, peak = tracemalloc.get_traced_memory()
+            if peak > current:
+                allocating += 1
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+
+    return allocating / len(args)
+
+def _populated_pq(n: int) -> Tuple["KeyedPQ[None]", List["KeyedItem[None]"]]:
+    s = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+    items = [pq.add(next(s), random_01(), None) for _ in range(n)]
+    return pq, items
+
+def print_allocations(n: int = 10000) -> None:
+    """Prints the fraction of operations which allocate Python objects."""
+
+    pq, items = _populated_pq(n)
+    keys = [item.key for item in items]
+    new_keys = list(StringSource().take(2 * n))[n:]
+    values = [random_01() for _ in range(n)]
+    random_keys = [keys[randrange(len(keys))] for _ in range(n)]
+    random_items = [items[randrange(len(items))] for _ in range(n)]
+    del items
+
+    def noop(arg: Any) -> None:
+        pass
+
+    def add(key: str) -> None:
+        pq.add(key, 0.5, None)
+
+    def add_no_item(key: str) -> None:
+        pq.add(key, 0.5, None, return_item=False)
+
+    def change_value(arg: Tuple[str, float]) -> None:
+        pq.change_value(arg[0], arg[1])
+
+    def change_value_no_item(arg: Tuple[str, float]) -> None:
+        pq.change_value(arg[0], arg[1], return_item=False)
+
+    def change_value_by_item(arg: Tuple["KeyedItem[None]", float]) -> None:
+        pq.change_value(arg[0], arg[1], return_item=False)
+
+    def getitem(key: str) -> None:
+        pq[key]
+
+    def getitem_held(item: "KeyedItem[None]") -> None:
+        pq[item.key]
+
+    def peek(arg: None) -> None:
+        pq.peek()
+
+    ops: List[Tuple[str, Callable[[Any], None], List[Any]]] = [
+        ('noop', noop, [None] * n),
+        ('add', add, new_keys[:n // 2]),
+        ('add_no_item', add_no_item, new_keys[n // 2:]),
+        ('change_value', change_value, list(zip(random_keys, values))),
+        ('change_value_no_item', change_value_no_item, list(zip(random_keys, values))),
+        ('change_value_by_item', change_value_by_item, list(zip(random_items, values))),
+        ('getitem', getitem, random_keys),
+        ('getitem_held', getitem_held, random_items),
+        ('peek', peek, [None] * n),
+    ]
+
+    for name, op, args in ops:
+        print("allocations {} allocating_ops={:.4f}".format(
+            name, _count_allocating(op, args),
+        ), file=sys.stderr)
+
+if __name__ == '__main__':
+    print_allocations()
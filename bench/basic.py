@@ -1,7 +1,7 @@
 from . import bench, BenchTimer, main_bench_registered
 from .utils import StringSource
 from apq import KeyedPQ
-from random import random as random_01
+from random import random as random_01, randrange
 
 
 @bench()
@@ -39,6 +39,24 @@ def bench_pop(b: BenchTimer) -> None:
         for _ in t:
             pass
 
+@bench()
+def bench_pop_many(b: BenchTimer) -> None:
+    s = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    for _ in range(b.n + 10000):
+        pq.add(next(s), random_01(), None)
+
+    # drains the PQ in batches of 100 entries
+    with b.time() as t:
+        for _ in range(t.n // 100):
+            pq.pop_many(100, columns=True)
+        pq.pop_many(t.n % 100, columns=True)
+
+    with b.offset() as t:
+        for _ in range(t.n // 100):
+            pass
+
 @bench()
 def bench_pop_add(b: BenchTimer) -> None:
     s = StringSource()
@@ -59,6 +77,44 @@ def bench_pop_add(b: BenchTimer) -> None:
             next(s_offset)
             random_01()
 
+@bench()
+def bench_replace_top(b: BenchTimer) -> None:
+    s = StringSource()
+    s_offset = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    for _ in range(10000):
+        pq.add(next(s), random_01(), None)
+        next(s_offset)
+
+    with b.time() as t:
+        for _ in t:
+            pq.replace_top(next(s), random_01(), None)
+
+    with b.offset() as t:
+        for _ in t:
+            next(s_offset)
+            random_01()
+
+@bench()
+def bench_pushpop(b: BenchTimer) -> None:
+    s = StringSource()
+    s_offset = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    for _ in range(10000):
+        pq.add(next(s), random_01(), None)
+        next(s_offset)
+
+    with b.time() as t:
+        for _ in t:
+            pq.pushpop(next(s), random_01(), None)
+
+    with b.offset() as t:
+        for _ in t:
+            next(s_offset)
+            random_01()
+
 @bench()
 def bench_change_value(b: BenchTimer) -> None:
     s = StringSource()
@@ -77,6 +133,194 @@ def bench_change_value(b: BenchTimer) -> None:
             key = s.rand_existing()
             random_01()
 
+@bench()
+def bench_change_value_item(b: BenchTimer) -> None:
+    s = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    items = [pq.add(next(s), random_01(), None) for _ in range(10000)]
+
+    with b.time() as t:
+        for _ in t:
+            item = items[randrange(len(items))]
+            pq.change_value(item, random_01())
+
+    with b.offset() as t:
+        for _ in t:
+            item = items[randrange(len(items))]
+            random_01()
+
+@bench()
+def bench_increment(b: BenchTimer) -> None:
+    s = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    for _ in range(10000):
+        pq.add(next(s), random_01(), None)
+
+    with b.time() as t:
+        for _ in t:
+            pq.increment(s.rand_existing(), random_01() - 0.5)
+
+    with b.offset() as t:
+        for _ in t:
+            s.rand_existing()
+            random_01()
+
+@bench()
+def bench_increment_value_change_value(b: BenchTimer) -> None:
+    s = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    for _ in range(10000):
+        pq.add(next(s), random_01(), None)
+
+    # increment() implemented through value and change_value()
+    with b.time() as t:
+        for _ in t:
+            key = s.rand_existing()
+            pq.change_value(key, pq[key].value + random_01() - 0.5)
+
+    with b.offset() as t:
+        for _ in t:
+            s.rand_existing()
+            random_01()
+
+@bench()
+def bench_value_item(b: BenchTimer) -> None:
+    s = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    items = [pq.add(next(s), random_01(), None) for _ in range(10000)]
+
+    with b.time() as t:
+        for _ in t:
+            item = items[randrange(len(items))]
+            item.value
+
+    with b.offset() as t:
+        for _ in t:
+            item = items[randrange(len(items))]
+
+@bench()
+def bench_value_key(b: BenchTimer) -> None:
+    s = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    for _ in range(10000):
+        pq.add(next(s), random_01(), None)
+
+    with b.time() as t:
+        for _ in t:
+            key = s.rand_existing()
+            pq[key].value
+
+    with b.offset() as t:
+        for _ in t:
+            key = s.rand_existing()
+
+@bench()
+def bench_contains_miss(b: BenchTimer) -> None:
+    s = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    for _ in range(10000):
+        pq.add(next(s), random_01(), None)
+
+    with b.time() as t:
+        for _ in t:
+            key = str(randrange(10000, 20000))
+            key in pq
+
+    with b.offset() as t:
+        for _ in t:
+            key = str(randrange(10000, 20000))
+
+@bench()
+def bench_get_miss(b: BenchTimer) -> None:
+    s = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    for _ in range(10000):
+        pq.add(next(s), random_01(), None)
+
+    with b.time() as t:
+        for _ in t:
+            key = str(randrange(10000, 20000))
+            pq.get(key)
+
+    with b.offset() as t:
+        for _ in t:
+            key = str(randrange(10000, 20000))
+
+@bench()
+def bench_add_or_change_value(b: BenchTimer) -> None:
+    s = StringSource()
+    s_offset = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    for _ in range(10000):
+        pq.add(next(s), random_01(), None)
+        next(s_offset)
+
+    # 40% of the keys are missing and inserted
+    with b.time() as t:
+        for _ in t:
+            key = next(s) if random_01() < 0.4 else s.rand_existing()
+            pq.add_or_change_value(key, random_01(), None)
+
+    with b.offset() as t:
+        for _ in t:
+            key = next(s_offset) if random_01() < 0.4 else s_offset.rand_existing()
+            random_01()
+
+@bench()
+def bench_relax(b: BenchTimer) -> None:
+    s = StringSource()
+    s_offset = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    for _ in range(10000):
+        pq.add(next(s), random_01(), None)
+        next(s_offset)
+
+    # 40% of the keys are missing and inserted
+    with b.time() as t:
+        for _ in t:
+            key = next(s) if random_01() < 0.4 else s.rand_existing()
+            pq.relax(key, random_01(), None)
+
+    with b.offset() as t:
+        for _ in t:
+            key = next(s_offset) if random_01() < 0.4 else s_offset.rand_existing()
+            random_01()
+
+@bench()
+def bench_relax_get_change_value(b: BenchTimer) -> None:
+    s = StringSource()
+    s_offset = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ()
+
+    for _ in range(10000):
+        pq.add(next(s), random_01(), None)
+        next(s_offset)
+
+    # relax() implemented through get() and add() or change_value()
+    with b.time() as t:
+        for _ in t:
+            key = next(s) if random_01() < 0.4 else s.rand_existing()
+            value = random_01()
+            item = pq.get(key)
+            if item is None:
+                pq.add(key, value, None)
+            elif value < item.value:
+                pq.change_value(item, value)
+
+    with b.offset() as t:
+        for _ in t:
+            key = next(s_offset) if random_01() < 0.4 else s_offset.rand_existing()
+            random_01()
+
 @bench()
 def bench_remove(b: BenchTimer) -> None:
     s = StringSource()
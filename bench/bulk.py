@@ -0,0 +1,237 @@
+import array
+import sys
+import time
+from random import random as random_01, randrange
+
+from apq import KeyedPQ
+
+
+def print_load_time(n: int = 5000000) -> None:
+    """Prints the time required to construct a PQ with n entries."""
+
+    keys = [str(i) for i in range(n)]
+    priorities = [random_01() for _ in range(n)]
+    priorities_buffer = array.array('d', priorities)
+
+    start = time.perf_counter()
+    pq: KeyedPQ[None] = KeyedPQ(zip(keys, priorities, [None] * n))
+    print("load iterable n={} {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+    del pq
+
+    start = time.perf_counter()
+    pq = KeyedPQ.from_arrays(keys, priorities)
+    print("load from_arrays list n={} {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+    del pq
+
+    start = time.perf_counter()
+    pq = KeyedPQ.from_arrays(keys, priorities_buffer)
+    print("load from_arrays buffer n={} {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+    del pq
+
+def print_upsert_time(n: int = 1000000, k: int = 100000) -> None:
+    """Prints the time required to upsert k keys into a PQ with n entries.
+
+    Half of the keys are present in the PQ, the other half are inserted.
+    """
+
+    keys = [str(randrange(2 * n)) for _ in range(k)]
+    priorities = [random_01() for _ in range(k)]
+
+    def populated() -> "KeyedPQ[None]":
+        return KeyedPQ.from_arrays([str(i) for i in range(n)], [random_01() for _ in range(n)])
+
+    pq = populated()
+    start = time.perf_counter()
+    for key, priority in zip(keys, priorities):
+        pq.add_or_change_value(key, priority, return_item=False)
+    print("upsert add_or_change_value n={} k={} {:.3f}s".format(
+        n, k, time.perf_counter() - start,
+    ), file=sys.stderr)
+    del pq
+
+    for policy in ('replace', 'min', 'sum'):
+        pq = populated()
+        start = time.perf_counter()
+        pq.upsert_many(keys, priorities, policy=policy)
+        print("upsert upsert_many policy={} n={} k={} {:.3f}s".format(
+            policy, n, k, time.perf_counter() - start,
+        ), file=sys.stderr)
+        del pq
+
+def print_snapshot_time(n: int = 1000000) -> None:
+    """Prints the time required to traverse a PQ with n entries in order."""
+
+    pq: KeyedPQ[None] = KeyedPQ.from_arrays([str(i) for i in range(n)], [random_01() for _ in range(n)], [None] * n)
+
+    start = time.perf_counter()
+    for item in pq.ordered_iter():
+        item.key, item.value, item.data
+    print("snapshot ordered_iter n={} {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+    start = time.perf_counter()
+    pq.sorted_snapshot()
+    print("snapshot sorted_snapshot n={} {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+def print_discard_time(n: int = 2000000) -> None:
+    """Prints the time required to remove half of the entries of a PQ with n
+    entries."""
+
+    keys = [str(i) for i in range(n)]
+    priorities = [random_01() for _ in range(n)]
+    removed = keys[::2]
+
+    pq: KeyedPQ[None] = KeyedPQ.from_arrays(keys, priorities)
+    start = time.perf_counter()
+    for key in removed:
+        del pq[key]
+    print("discard del n={} k={} {:.3f}s".format(
+        n, len(removed), time.perf_counter() - start,
+    ), file=sys.stderr)
+    del pq
+
+    pq = KeyedPQ.from_arrays(keys, priorities)
+    start = time.perf_counter()
+    pq.discard_many(removed)
+    print("discard discard_many n={} k={} {:.3f}s".format(
+        n, len(removed), time.perf_counter() - start,
+    ), file=sys.stderr)
+    del pq
+
+def print_transform_time(n: int = 1000000, k: int = 100000) -> None:
+    """Prints the time required to shift and scale all priorities of a PQ
+    with n entries k times."""
+
+    pq: KeyedPQ[None] = KeyedPQ.from_arrays([str(i) for i in range(n)], [random_01() for _ in range(n)])
+
+    start = time.perf_counter()
+    for _ in range(k):
+        pq.shift_all(-0.001)
+        pq.scale_all(0.999)
+    print("transform shift_all+scale_all n={} k={} {:.3f}s".format(
+        n, k, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+    keys = pq.keys_list()
+    start = time.perf_counter()
+    for key in keys:
+        pq.change_value(key, (pq[key].value - 0.001) * 0.999, return_item=False)
+    print("transform change_value n={} k=1 {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+def print_merge_time(n: int = 1000000) -> None:
+    """Prints the time required to merge two PQs with n entries each and to
+    split them again."""
+
+    def populated(offset: int) -> "KeyedPQ[None]":
+        return KeyedPQ.from_arrays([str(i) for i in range(offset, offset + n)], [random_01() for _ in range(n)])
+
+    pq, other = populated(0), populated(n)
+    start = time.perf_counter()
+    for item in other.ordered_iter():
+        pq.add(item.key, item.value, item.data, return_item=False)
+    other.clear()
+    print("merge add loop n={} {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+    del pq, other
+
+    pq, other = populated(0), populated(n)
+    start = time.perf_counter()
+    pq.merge(other)
+    print("merge merge n={} {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+    start = time.perf_counter()
+    other = pq.split(0.5)
+    print("merge split n={} k={} {:.3f}s".format(
+        2 * n, len(other), time.perf_counter() - start,
+    ), file=sys.stderr)
+
+def print_lookup_time(n: int = 1000000, k: int = 100000) -> None:
+    """Prints the time required to look up the priorities of k keys in a PQ
+    with n entries, a tenth of which are missing."""
+
+    pq: KeyedPQ[None] = KeyedPQ.from_arrays([str(i) for i in range(n)], [random_01() for _ in range(n)])
+    keys = [str(randrange(n + n // 9)) for _ in range(k)]
+
+    start = time.perf_counter()
+    [pq[key].value if key in pq else float('nan') for key in keys]
+    print("lookup getitem n={} k={} {:.3f}s".format(
+        n, k, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+    start = time.perf_counter()
+    pq.get_priorities(keys)
+    print("lookup get_priorities n={} k={} {:.3f}s".format(
+        n, k, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+def print_set_priorities_time(n: int = 1000000) -> None:
+    """Prints the time required to replace all priorities of a PQ with n
+    entries."""
+
+    pq: KeyedPQ[None] = KeyedPQ.from_arrays([str(i) for i in range(n)], [random_01() for _ in range(n)])
+    keys = pq.keys_list()
+    priorities = array.array('d', [random_01() for _ in range(n)])
+
+    start = time.perf_counter()
+    for key, priority in zip(keys, priorities):
+        pq.change_value(key, priority, return_item=False)
+    print("set_priorities change_value n={} {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+    slots = pq.slots()
+    start = time.perf_counter()
+    pq.set_priorities(slots, priorities)
+    print("set_priorities set_priorities n={} {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+def print_view_time(n: int = 10000000) -> None:
+    """Prints the time required to read all priorities of a PQ with n
+    entries."""
+
+    pq: KeyedPQ[None] = KeyedPQ.from_arrays([str(i) for i in range(n)], array.array('d', [random_01() for _ in range(n)]))
+
+    start = time.perf_counter()
+    pq._export()
+    print("view _export n={} {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+    start = time.perf_counter()
+    pq.priorities_array()
+    print("view priorities_array n={} {:.3f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+    start = time.perf_counter()
+    with pq.priorities_view():
+        pass
+    print("view priorities_view n={} {:.6f}s".format(
+        n, time.perf_counter() - start,
+    ), file=sys.stderr)
+
+if __name__ == '__main__':
+    print_load_time(int(sys.argv[1]) if len(sys.argv) > 1 else 5000000)
+    print_upsert_time()
+    print_snapshot_time()
+    print_discard_time()
+    print_transform_time()
+    print_merge_time()
+    print_lookup_time()
+    print_set_priorities_time()
+    print_view_time()
@@ -0,0 +1,86 @@
+import heapq
+from typing import List, Tuple
+
+from . import bench, BenchTimer, main_bench_registered
+from .utils import StringSource
+from apq import KeyedPQ
+from random import random as random_01, randrange
+
+
+PRIORITY_TYPE = ('float64', 'int64', 'int64')
+
+def random_priority(seq: int) -> Tuple[float, int, int]:
+    return (random_01(), -randrange(10), seq)
+
+
+@bench()
+def bench_add_keyedpq(b: BenchTimer) -> None:
+    s = StringSource()
+    s_offset = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ(priority_type=PRIORITY_TYPE)
+
+    for i in range(10000):
+        pq.add(next(s), random_priority(i), None)
+        next(s_offset)
+
+    with b.time() as t:
+        for _ in t:
+            pq.add(next(s), random_priority(0), None)
+
+    with b.offset() as t:
+        for _ in t:
+            next(s_offset)
+            random_priority(0)
+
+@bench()
+def bench_add_heapq(b: BenchTimer) -> None:
+    s = StringSource()
+    s_offset = StringSource()
+    heap: List[Tuple[Tuple[float, int, int], str]] = []
+
+    for i in range(10000):
+        heapq.heappush(heap, (random_priority(i), next(s)))
+        next(s_offset)
+
+    with b.time() as t:
+        for _ in t:
+            heapq.heappush(heap, (random_priority(0), next(s)))
+
+    with b.offset() as t:
+        for _ in t:
+            (random_priority(0), next(s_offset))
+
+@bench()
+def bench_pop_keyedpq(b: BenchTimer) -> None:
+    s = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ(priority_type=PRIORITY_TYPE)
+
+    for i in range(b.n + 10000):
+        pq.add(next(s), random_priority(i), None)
+
+    with b.time() as t:
+        for _ in t:
+            pq.pop()
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+@bench()
+def bench_pop_heapq(b: BenchTimer) -> None:
+    s = StringSource()
+    heap: List[Tuple[Tuple[float, int, int], str]] = []
+
+    for i in range(b.n + 10000):
+        heapq.heappush(heap, (random_priority(i), next(s)))
+
+    with b.time() as t:
+        for _ in t:
+            heapq.heappop(heap)
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+if __name__ == '__main__':
+    main_bench_registered()
@@ -0,0 +1,149 @@
+import datetime
+import heapq
+import itertools
+from typing import Any, Dict, List, Tuple
+
+from . import bench, BenchTimer, main_bench_registered
+from .utils import StringSource
+from apq import ObjectPQ
+from random import randrange
+
+
+# ObjectPQ is compared to the keyed heapq recipe of the Python documentation:
+# entries are [priority, counter, key] lists indexed by a dict, changed
+# entries are invalidated and pushed again.
+
+_base = datetime.datetime(2020, 1, 1)
+
+
+def _random_dt() -> datetime.datetime:
+    return _base + datetime.timedelta(seconds=randrange(10 ** 8))
+
+
+class _HeapqPQ(object):
+    def __init__(self) -> None:
+        self.heap: List[List[Any]] = []
+        self.entries: Dict[str, List[Any]] = {}
+        self.counter = itertools.count()
+
+    def add_or_change_value(self, key: str, value: datetime.datetime) -> None:
+        if key in self.entries:
+            self.entries.pop(key)[-1] = None
+        entry = [value, next(self.counter), key]
+        self.entries[key] = entry
+        heapq.heappush(self.heap, entry)
+
+    def pop(self) -> Tuple[str, datetime.datetime]:
+        while True:
+            value, _, key = heapq.heappop(self.heap)
+            if key is not None:
+                del self.entries[key]
+                return key, value
+
+
+@bench()
+def bench_add_objectpq(b: BenchTimer) -> None:
+    s = StringSource()
+    s_offset = StringSource()
+    pq: ObjectPQ[None] = ObjectPQ(data_type='none')
+
+    for _ in range(10000):
+        pq.add(next(s), _random_dt())
+        next(s_offset)
+
+    with b.time() as t:
+        for _ in t:
+            pq.add(next(s), _random_dt())
+
+    with b.offset() as t:
+        for _ in t:
+            next(s_offset)
+            _random_dt()
+
+@bench()
+def bench_add_heapq(b: BenchTimer) -> None:
+    s = StringSource()
+    s_offset = StringSource()
+    pq = _HeapqPQ()
+
+    for _ in range(10000):
+        pq.add_or_change_value(next(s), _random_dt())
+        next(s_offset)
+
+    with b.time() as t:
+        for _ in t:
+            pq.add_or_change_value(next(s), _random_dt())
+
+    with b.offset() as t:
+        for _ in t:
+            next(s_offset)
+            _random_dt()
+
+@bench()
+def bench_pop_objectpq(b: BenchTimer) -> None:
+    s = StringSource()
+    pq: ObjectPQ[None] = ObjectPQ(data_type='none')
+
+    for _ in range(b.n + 10000):
+        pq.add(next(s), _random_dt())
+
+    with b.time() as t:
+        for _ in t:
+            pq.pop()
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+@bench()
+def bench_pop_heapq(b: BenchTimer) -> None:
+    s = StringSource()
+    pq = _HeapqPQ()
+
+    for _ in range(b.n + 10000):
+        pq.add_or_change_value(next(s), _random_dt())
+
+    with b.time() as t:
+        for _ in t:
+            pq.pop()
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+@bench()
+def bench_change_value_objectpq(b: BenchTimer) -> None:
+    s = StringSource()
+    pq: ObjectPQ[None] = ObjectPQ(data_type='none')
+
+    for _ in range(10000):
+        pq.add(next(s), _random_dt())
+
+    with b.time() as t:
+        for _ in t:
+            pq.change_value(s.rand_existing(), _random_dt())
+
+    with b.offset() as t:
+        for _ in t:
+            s.rand_existing()
+            _random_dt()
+
+@bench()
+def bench_change_value_heapq(b: BenchTimer) -> None:
+    s = StringSource()
+    pq = _HeapqPQ()
+
+    for _ in range(10000):
+        pq.add_or_change_value(next(s), _random_dt())
+
+    with b.time() as t:
+        for _ in t:
+            pq.add_or_change_value(s.rand_existing(), _random_dt())
+
+    with b.offset() as t:
+        for _ in t:
+            s.rand_existing()
+            _random_dt()
+
+if __name__ == '__main__':
+    main_bench_registered()
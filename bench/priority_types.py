@@ -0,0 +1,90 @@
+import sys
+from typing import Callable
+
+from . import bench, BenchTimer, main_bench_registered
+from .utils import StringSource
+from apq import KeyedPQ
+from random import random as random_01, randrange
+
+
+def random_int64() -> int:
+    return randrange(-2 ** 63, 2 ** 63)
+
+
+def _bench_add(b: BenchTimer, priority_type: str, random_value: Callable[[], float]) -> None:
+    s = StringSource()
+    s_offset = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ(priority_type=priority_type)
+
+    for _ in range(10000):
+        pq.add(next(s), random_value(), None)
+        next(s_offset)
+
+    with b.time() as t:
+        for _ in t:
+            pq.add(next(s), random_value(), None)
+
+    with b.offset() as t:
+        for _ in t:
+            next(s_offset)
+            random_value()
+
+def _bench_pop(b: BenchTimer, priority_type: str, random_value: Callable[[], float]) -> None:
+    s = StringSource()
+    pq: KeyedPQ[None] = KeyedPQ(priority_type=priority_type)
+
+    for _ in range(b.n + 10000):
+        pq.add(next(s), random_value(), None)
+
+    with b.time() as t:
+        for _ in t:
+            pq.pop()
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+@bench()
+def bench_add_float64(b: BenchTimer) -> None:
+    _bench_add(b, 'float64', random_01)
+
+@bench()
+def bench_add_int64(b: BenchTimer) -> None:
+    _bench_add(b, 'int64', random_int64)
+
+@bench()
+def bench_add_float32(b: BenchTimer) -> None:
+    _bench_add(b, 'float32', random_01)
+
+@bench()
+def bench_pop_float64(b: BenchTimer) -> None:
+    _bench_pop(b, 'float64', random_01)
+
+@bench()
+def bench_pop_int64(b: BenchTimer) -> None:
+    _bench_pop(b, 'int64', random_int64)
+
+@bench()
+def bench_pop_float32(b: BenchTimer) -> None:
+    _bench_pop(b, 'float32', random_01)
+
+
+def print_memory_usage(n: int = 100000) -> None:
+    """Prints the memory used per entry as reported by sys.getsizeof()."""
+
+    for priority_type, random_value in [
+        ('float64', random_01),
+        ('int64', random_int64),
+        ('float32', random_01),
+    ]:
+        pq: KeyedPQ[None] = KeyedPQ(
+            ((str(i), random_value(), None) for i in range(n)),
+            priority_type=priority_type,
+        )
+        print("memory {} bytes_per_entry={}".format(
+            priority_type, sys.getsizeof(pq) / n,
+        ), file=sys.stderr)
+
+if __name__ == '__main__':
+    print_memory_usage()
+    main_bench_registered()
@@ -0,0 +1,130 @@
+import array
+import heapq
+import itertools
+from typing import List, Tuple
+
+from . import bench, BenchTimer, main_bench_registered
+from apq import SimplePQ
+from random import random as random_01
+
+
+@bench()
+def bench_add_simplepq(b: BenchTimer) -> None:
+    pq: SimplePQ[None] = SimplePQ()
+
+    for _ in range(10000):
+        pq.add(random_01(), None)
+
+    with b.time() as t:
+        for _ in t:
+            pq.add(random_01(), None)
+
+    with b.offset() as t:
+        for _ in t:
+            random_01()
+
+@bench()
+def bench_add_heapq(b: BenchTimer) -> None:
+    # The counter breaks ties in FIFO order, as SimplePQ does.
+    counter = itertools.count()
+    heap: List[Tuple[float, int, None]] = []
+
+    for _ in range(10000):
+        heapq.heappush(heap, (random_01(), next(counter), None))
+
+    with b.time() as t:
+        for _ in t:
+            heapq.heappush(heap, (random_01(), next(counter), None))
+
+    with b.offset() as t:
+        for _ in t:
+            (random_01(), next(counter), None)
+
+@bench()
+def bench_pop_simplepq(b: BenchTimer) -> None:
+    pq: SimplePQ[None] = SimplePQ()
+
+    for _ in range(b.n + 10000):
+        pq.add(random_01(), None)
+
+    with b.time() as t:
+        for _ in t:
+            pq.pop()
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+@bench()
+def bench_pop_heapq(b: BenchTimer) -> None:
+    counter = itertools.count()
+    heap: List[Tuple[float, int, None]] = []
+
+    for _ in range(b.n + 10000):
+        heapq.heappush(heap, (random_01(), next(counter), None))
+
+    with b.time() as t:
+        for _ in t:
+            heapq.heappop(heap)
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+@bench()
+def bench_add_many_simplepq(b: BenchTimer) -> None:
+    priorities = array.array('d', [random_01() for _ in range(1000)])
+    pq: SimplePQ[None] = SimplePQ()
+
+    with b.time() as t:
+        for _ in t:
+            pq.add_many(priorities)
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+@bench()
+def bench_add_many_heapq(b: BenchTimer) -> None:
+    counter = itertools.count()
+    priorities = [random_01() for _ in range(1000)]
+    heap: List[Tuple[float, int, None]] = []
+
+    with b.time() as t:
+        for _ in t:
+            for priority in priorities:
+                heapq.heappush(heap, (priority, next(counter), None))
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+@bench()
+def bench_pop_many_simplepq(b: BenchTimer) -> None:
+    pq: SimplePQ[None] = SimplePQ()
+    pq.add_many(array.array('d', [random_01() for _ in range(1000 * b.n + 10000)]))
+
+    with b.time() as t:
+        for _ in t:
+            pq.pop_many(1000)
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+@bench()
+def bench_pop_many_heapq(b: BenchTimer) -> None:
+    counter = itertools.count()
+    heap = [(random_01(), next(counter), None) for _ in range(1000 * b.n + 10000)]
+    heapq.heapify(heap)
+
+    with b.time() as t:
+        for _ in t:
+            [heapq.heappop(heap) for _ in range(1000)]
+
+    with b.offset() as t:
+        for _ in t:
+            pass
+
+if __name__ == '__main__':
+    main_bench_registered()
@@ -0,0 +1,64 @@
+import gc
+import sys
+import time
+from typing import Callable, Optional
+
+from apq import KeyedPQ
+
+
+class Data(object):
+    pass
+
+
+def _time_teardown(n: int, data_type: str, make_data: Callable[[], Optional[Data]], clear: bool) -> float:
+    pq: KeyedPQ[Optional[Data]] = KeyedPQ(
+        ((str(i), float(i), make_data()) for i in range(n)),
+        data_type=data_type,
+    )
+
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        if clear:
+            pq.clear()
+        else:
+            del pq
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+def _time_full_collection(n: int) -> float:
+    pq: KeyedPQ[Data] = KeyedPQ((str(i), float(i), Data()) for i in range(n))
+
+    gc.collect()
+    start = time.perf_counter()
+    gc.collect()
+    duration = time.perf_counter() - start
+
+    del pq
+    return duration
+
+def print_teardown_time(n: int = 10000000) -> None:
+    """Prints the time required to release a PQ with n entries."""
+
+    for data_type, make_data in [
+        ('object', Data),
+        ('object', lambda: None),
+        ('none', lambda: None),
+    ]:
+        for clear in (True, False):
+            print("teardown {} data={} n={} {}={:.3f}s".format(
+                data_type,
+                'None' if make_data() is None else 'Data()',
+                n,
+                'clear' if clear else 'del',
+                _time_teardown(n, data_type, make_data, clear),
+            ), file=sys.stderr)
+
+    print("gc full collection n={} {:.3f}s".format(
+        n, _time_full_collection(n),
+    ), file=sys.stderr)
+
+if __name__ == '__main__':
+    print_teardown_time(int(sys.argv[1]) if len(sys.argv) > 1 else 10000000)
@@ -1,9 +1,14 @@
-from typing import Any, Generic, Generator, Iterable, List, Optional, overload, Tuple, TypeVar, Union
+from typing import Any, Callable, Generic, Generator, ItemsView, Iterable, Iterator, KeysView, List, Mapping, Optional, overload, Sequence, Tuple, TypeVar, Union, ValuesView
+from typing_extensions import Literal
 
 
 _DT = TypeVar('_DT') # data type
 _T = TypeVar('_T') # any type
 
+_Priority = Union[float, Tuple[float, ...]] # scalar or composite priority
+_PriorityType = Union[str, Sequence[str]]
+_Buffer = Any # object supporting the buffer protocol
+
 
 class KeyedItem(Generic[_DT]):
     @property
@@ -25,22 +30,30 @@ class KeyedItem(Generic[_DT]):
         ...
 
 
-class KeyedPQ(Generic[_DT]):
+class KeyedPQ(Mapping[str, KeyedItem[_DT]]):
     @overload
-    def __init__(self, max_heap: bool=False) -> None:
+    def __init__(self, max_heap: bool=False, priority_type: _PriorityType='float64', data_type: str='object') -> None:
         ...
 
     @overload
-    def __init__(self, iterable: Iterable[Tuple[str, float, _DT]], max_heap: bool=False) -> None:
+    def __init__(self, iterable: Iterable[Union[Tuple[str, _Priority, _DT], Tuple[str, _Priority]]], max_heap: bool=False, priority_type: _PriorityType='float64', data_type: str='object') -> None:
         ...
 
     def __len__(self) -> int:
         ...
 
-    def __contains__(self, identifier: Union[str, KeyedItem[_DT]]) -> bool:
+    @property
+    def priority_type(self) -> Union[str, Tuple[str, ...]]:
+        ...
+
+    @property
+    def data_type(self) -> str:
+        ...
+
+    def __contains__(self, identifier: object) -> bool:
         ...
 
-    def __iter__(self) -> Generator[KeyedItem[_DT], None, None]:
+    def __iter__(self) -> Iterator[str]:
         ...
 
     def __getitem__(self, identifier: Union[str, KeyedItem[_DT]]) -> KeyedItem[_DT]:
@@ -66,22 +79,112 @@ class KeyedPQ(Generic[_DT]):
     def clear(self) -> None:
         ...
 
-    def add(self, key: str, value: float, data: _DT) -> KeyedItem[_DT]:
+    def discard_many(self, identifiers: Iterable[Union[str, KeyedItem[_DT]]]) -> int:
+        ...
+
+    def retain(self, predicate: Callable[[str, Any, _DT], object]) -> int:
+        ...
+
+    def remove_where(self, predicate: Callable[[str, Any, _DT], object]) -> int:
+        ...
+
+    def merge(self, other: 'KeyedPQ[_DT]', policy: str='raise') -> None:
+        ...
+
+    def split(self, predicate_or_threshold: Union[Callable[[str, Any, _DT], object], _Priority], inclusive: bool=True) -> 'KeyedPQ[_DT]':
+        ...
+
+    @classmethod
+    def from_arrays(cls, keys: Sequence[str], priorities: Union[Sequence[_Priority], _Buffer], data: Optional[Sequence[_DT]]=None, *, max_heap: bool=False, priority_type: _PriorityType='float64', data_type: str='object') -> 'KeyedPQ[_DT]':
+        ...
+
+    def add_many(self, keys: Sequence[str], priorities: Union[Sequence[_Priority], _Buffer], data: Optional[Sequence[_DT]]=None) -> None:
+        ...
+
+    def upsert_many(self, keys: Sequence[str], priorities: Union[Sequence[_Priority], _Buffer], data: Optional[Sequence[_DT]]=None, policy: str='replace') -> Tuple[int, int]:
+        ...
+
+    def increment(self, key: str, delta: _Priority, default: Optional[_Priority]=None, data: _DT=...) -> _Priority:
+        ...
+
+    def increment_many(self, keys: Sequence[str], deltas: Union[Sequence[_Priority], _Buffer], default: Optional[_Priority]=None, data: Optional[Sequence[_DT]]=None) -> None:
+        ...
+
+    def shift_all(self, delta: float) -> None:
+        ...
+
+    def scale_all(self, factor: float) -> None:
+        ...
+
+    def relax(self, key: str, value: _Priority, data: _DT=...) -> bool:
+        ...
+
+    def relax_many(self, keys: Sequence[str], priorities: Union[Sequence[_Priority], _Buffer], data: Optional[Sequence[_DT]]=None) -> int:
+        ...
+
+    @overload
+    def add(self, key: str, value: _Priority, data: _DT=..., *, return_item: Literal[True]=...) -> KeyedItem[_DT]:
+        ...
+
+    @overload
+    def add(self, key: str, value: _Priority, data: _DT=..., *, return_item: Literal[False]) -> None:
+        ...
+
+    def items(self) -> ItemsView[str, KeyedItem[_DT]]:
+        ...
+
+    def keys(self) -> KeysView[str]:
+        ...
+
+    def values(self) -> ValuesView[KeyedItem[_DT]]:
+        ...
+
+    def keys_list(self) -> List[str]:
+        ...
+
+    def priorities_array(self) -> Sequence[_Priority]:
+        ...
+
+    def priorities_view(self) -> memoryview:
+        ...
+
+    def timestamps_view(self) -> memoryview:
+        ...
+
+    def slot(self, identifier: Union[str, KeyedItem[_DT]]) -> int:
+        ...
+
+    def slots(self) -> Sequence[int]:
+        ...
+
+    def set_priorities(self, slots: Union[Sequence[int], _Buffer], priorities: Union[Sequence[_Priority], _Buffer]) -> None:
         ...
 
-    def items(self) -> Generator[Tuple[str, KeyedItem[_DT]], None, None]:
+    def get_priorities(self, keys: Iterable[str], default: float=...) -> Sequence[float]:
         ...
 
-    def keys(self) -> Generator[str, None, None]:
+    @overload
+    def get_data_many(self, keys: Iterable[str]) -> List[Optional[_DT]]:
         ...
 
-    def values(self) -> Generator[KeyedItem[_DT], None, None]:
+    @overload
+    def get_data_many(self, keys: Iterable[str], default: _T) -> List[Union[_DT, _T]]:
         ...
 
-    def change_value(self, identifier: Union[str, KeyedItem[_DT]], value: float) -> KeyedItem[_DT]:
+    @overload
+    def change_value(self, identifier: Union[str, KeyedItem[_DT]], value: _Priority, *, return_item: Literal[True]=...) -> KeyedItem[_DT]:
         ...
 
-    def add_or_change_value(self, key: str, value: float, data: _DT) -> KeyedItem[_DT]:
+    @overload
+    def change_value(self, identifier: Union[str, KeyedItem[_DT]], value: _Priority, *, return_item: Literal[False]) -> None:
+        ...
+
+    @overload
+    def add_or_change_value(self, key: str, value: _Priority, data: _DT=..., *, return_item: Literal[True]=...) -> KeyedItem[_DT]:
+        ...
+
+    @overload
+    def add_or_change_value(self, key: str, value: _Priority, data: _DT=..., *, return_item: Literal[False]) -> None:
         ...
 
     def peek(self) -> KeyedItem[_DT]:
@@ -90,6 +193,39 @@ class KeyedPQ(Generic[_DT]):
     def pop(self) -> Tuple[str, float, _DT]:
         ...
 
+    def pushpop(self, key: str, value: _Priority, data: _DT=...) -> Tuple[str, _Priority, _DT]:
+        ...
+
+    def replace_top(self, key: str, value: _Priority, data: _DT=...) -> Tuple[str, _Priority, _DT]:
+        ...
+
+    @overload
+    def pop_many(self, k: Optional[int]=None, until: Optional[_Priority]=None, inclusive: bool=True, *, columns: Literal[False]=...) -> List[Tuple[str, _Priority, _DT]]:
+        ...
+
+    @overload
+    def pop_many(self, k: Optional[int]=None, until: Optional[_Priority]=None, inclusive: bool=True, *, columns: Literal[True]) -> Tuple[List[str], Sequence[_Priority], List[_DT]]:
+        ...
+
+    @overload
+    def peek_many(self, k: int, *, columns: Literal[False]=...) -> List[Tuple[str, _Priority, _DT]]:
+        ...
+
+    @overload
+    def peek_many(self, k: int, *, columns: Literal[True]) -> Tuple[List[str], Sequence[_Priority], List[_DT]]:
+        ...
+
+    @overload
+    def iter_below(self, threshold: _Priority, inclusive: bool=True, *, columns: Literal[False]=...) -> List[Tuple[str, _Priority, _DT]]:
+        ...
+
+    @overload
+    def iter_below(self, threshold: _Priority, inclusive: bool=True, *, columns: Literal[True]) -> Tuple[List[str], Sequence[_Priority], List[_DT]]:
+        ...
+
+    def sorted_snapshot(self) -> Tuple[List[str], Sequence[_Priority], List[_DT]]:
+        ...
+
     def ordered_iter(self) -> Generator[KeyedItem[_DT], None, None]:
         ...
 
@@ -98,3 +234,210 @@ class KeyedPQ(Generic[_DT]):
 
     def _verify_invariants(self) -> bool:
         ...
+
+
+class SimplePQ(Generic[_DT]):
+    def __init__(self, iterable: Iterable[Tuple[float, _DT]]=..., *, max_heap: bool=False, priority_type: str='float64', data_type: str='object') -> None:
+        ...
+
+    @property
+    def priority_type(self) -> str:
+        ...
+
+    @property
+    def data_type(self) -> str:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+    def add(self, value: float, data: _DT=...) -> None:
+        ...
+
+    def add_many(self, priorities: Union[Sequence[float], _Buffer], data: Optional[Sequence[_DT]]=None) -> None:
+        ...
+
+    def peek(self) -> Tuple[float, _DT]:
+        ...
+
+    def pop(self) -> Tuple[float, _DT]:
+        ...
+
+    @overload
+    def pop_many(self, k: Optional[int]=None, until: Optional[float]=None, inclusive: bool=True, *, columns: Literal[False]=...) -> List[Tuple[float, _DT]]:
+        ...
+
+    @overload
+    def pop_many(self, k: Optional[int]=None, until: Optional[float]=None, inclusive: bool=True, *, columns: Literal[True]) -> Tuple[Sequence[float], List[_DT]]:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+    def _verify_invariants(self) -> bool:
+        ...
+
+
+class Item(Generic[_DT]):
+    @property
+    def value(self) -> _Priority:
+        ...
+
+    @property
+    def data(self) -> _DT:
+        ...
+
+
+class AddressablePQ(Generic[_DT]):
+    def __init__(self, iterable: Iterable[Tuple[_Priority, _DT]]=..., *, max_heap: bool=False, priority_type: _PriorityType='float64', data_type: str='object') -> None:
+        ...
+
+    @property
+    def priority_type(self) -> Union[str, Tuple[str, ...]]:
+        ...
+
+    @property
+    def data_type(self) -> str:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+    def __contains__(self, item: object) -> bool:
+        ...
+
+    def add(self, value: _Priority, data: _DT=...) -> Item[_DT]:
+        ...
+
+    def change_value(self, item: Item[_DT], value: _Priority) -> None:
+        ...
+
+    def remove(self, item: Item[_DT]) -> None:
+        ...
+
+    def peek(self) -> Item[_DT]:
+        ...
+
+    def pop(self) -> Tuple[_Priority, _DT]:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+    def _verify_invariants(self) -> bool:
+        ...
+
+
+class ObjectItem(Generic[_DT]):
+    @property
+    def key(self) -> str:
+        ...
+
+    @property
+    def value(self) -> Any:
+        ...
+
+    @property
+    def data(self) -> _DT:
+        ...
+
+    def __eq__(self, other: Any) -> bool:
+        ...
+
+    def __ne__(self, other: Any) -> bool:
+        ...
+
+
+class ObjectPQ(Mapping[str, ObjectItem[_DT]]):
+    def __init__(self, iterable: Iterable[Union[Tuple[str, Any, _DT], Tuple[str, Any]]]=..., *, max_heap: bool=False, sort_key: Optional[Callable[[Any], Any]]=None, data_type: str='object') -> None:
+        ...
+
+    @property
+    def sort_key(self) -> Optional[Callable[[Any], Any]]:
+        ...
+
+    @property
+    def data_type(self) -> str:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+    def __contains__(self, identifier: object) -> bool:
+        ...
+
+    def __iter__(self) -> Iterator[str]:
+        ...
+
+    def __getitem__(self, identifier: Union[str, ObjectItem[_DT]]) -> ObjectItem[_DT]:
+        ...
+
+    def __delitem__(self, identifier: Union[str, ObjectItem[_DT]]) -> None:
+        ...
+
+    def __eq__(self, other: Any) -> bool:
+        ...
+
+    def __ne__(self, other: Any) -> bool:
+        ...
+
+    @overload
+    def get(self, identifier: Union[str, ObjectItem[_DT]]) -> Optional[ObjectItem[_DT]]:
+        ...
+
+    @overload
+    def get(self, identifier: Union[str, ObjectItem[_DT]], default: Union[ObjectItem[_DT], _T]) -> Union[ObjectItem[_DT], _T]:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+    def items(self) -> ItemsView[str, ObjectItem[_DT]]:
+        ...
+
+    def keys(self) -> KeysView[str]:
+        ...
+
+    def values(self) -> ValuesView[ObjectItem[_DT]]:
+        ...
+
+    @overload
+    def add(self, key: str, value: Any, data: _DT=..., *, return_item: Literal[True]=...) -> ObjectItem[_DT]:
+        ...
+
+    @overload
+    def add(self, key: str, value: Any, data: _DT=..., *, return_item: Literal[False]) -> None:
+        ...
+
+    @overload
+    def change_value(self, identifier: Union[str, ObjectItem[_DT]], value: Any, *, return_item: Literal[True]=...) -> ObjectItem[_DT]:
+        ...
+
+    @overload
+    def change_value(self, identifier: Union[str, ObjectItem[_DT]], value: Any, *, return_item: Literal[False]) -> None:
+        ...
+
+    @overload
+    def add_or_change_value(self, key: str, value: Any, data: _DT=..., *, return_item: Literal[True]=...) -> ObjectItem[_DT]:
+        ...
+
+    @overload
+    def add_or_change_value(self, key: str, value: Any, data: _DT=..., *, return_item: Literal[False]) -> None:
+        ...
+
+    def peek(self) -> ObjectItem[_DT]:
+        ...
+
+    def pop(self) -> Tuple[str, Any, _DT]:
+        ...
+
+    @overload
+    def pop_many(self, k: Optional[int]=None, until: Any=None, inclusive: bool=True, *, columns: Literal[False]=...) -> List[Tuple[str, Any, _DT]]:
+        ...
+
+    @overload
+    def pop_many(self, k: Optional[int]=None, until: Any=None, inclusive: bool=True, *, columns: Literal[True]) -> Tuple[List[str], List[Any], List[_DT]]:
+        ...
+
+    def _verify_invariants(self) -> bool:
+        ...
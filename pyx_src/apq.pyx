@@ -2,13 +2,44 @@
 # cython: language_level = 3
 # cython: embedsignature = True
 
+from libc.math cimport NAN, fabs, isfinite
+from libc.stdint cimport int64_t, uint64_t
+from libcpp cimport bool as cpp_bool
+from libcpp.deque cimport deque
 from libcpp.string cimport string
 from libcpp.vector cimport vector
 from libcpp.unordered_map cimport unordered_map
+from libcpp.pair cimport pair
 from libcpp.limits cimport numeric_limits
 
+from cpython cimport array
+from cpython.buffer cimport PyBUF_FORMAT, PyBUF_STRIDES, PyBUF_WRITABLE, PyObject_CheckBuffer
+from cpython.exc cimport PyErr_Occurred
+from cpython.number cimport PyIndex_Check
+from cpython.object cimport PyObject_RichCompareBool, Py_GT, Py_LT
+from cpython.ref cimport PyObject, Py_INCREF, Py_XDECREF
+
+cimport cython
 from cython.operator cimport dereference, preincrement
 
+from collections.abc import ItemsView, KeysView, Mapping, ValuesView
+import operator
+
+
+cdef extern from "Python.h":
+    # Declared here instead of cimporting from cpython.object, as the
+    # declarations shipped with Cython carry exception specifications which
+    # do not match the semantics of the GC slots.
+    ctypedef int (*visitproc)(PyObject*, void*)
+    ctypedef int (*traverseproc)(PyObject*, visitproc, void*)
+    ctypedef int (*inquiry)(PyObject*)
+
+    ctypedef struct PyTypeObject:
+        traverseproc tp_traverse
+        inquiry tp_clear
+
+    const char* PyUnicode_AsUTF8AndSize(object, Py_ssize_t*) except NULL
+
 
 cdef extern from "cpp/binheap.hpp" nogil:
     cdef cppclass BinHeap[T, Container=*, Compare=*, SetIndex=*]:
@@ -17,6 +48,8 @@ cdef extern from "cpp/binheap.hpp" nogil:
         ctypedef Compare value_compare
         ctypedef SetIndex value_set_index
 
+        BinHeap(Compare, SetIndex, Container&)
+
     cdef cppclass AnyBinHeap[T]:
         ctypedef T value_type
 
@@ -55,15 +88,24 @@ cdef extern from "cpp/binheap.hpp" nogil:
 
         void clear()
         void push(value_type&) except +
+        void extend(value_type*, value_type*) except +
+        void rebuild()
+        void rebuild(value_type*, value_type*) except +
         void fix(size_type)
         void fix(iterator)
         void fix(const_iterator)
+        void fixUp(size_type)
+        void fixDown(size_type)
         void remove(size_type)
         void remove(iterator)
         void remove(const_iterator)
         void pop()
+        void replaceTop(value_type&)
+        void unsift(size_type, size_type) except +
+        void unremove(size_type, value_type&, size_type) except +
         bint empty()
         size_type size()
+        bint compareValues(value_type&, value_type&)
         value_type& top()
         T& operator[](size_type)
         iterator begin()
@@ -93,7 +135,7 @@ cdef extern from "cpp/binheap.hpp" nogil:
         MaxBinHeap(MaxHeapCompare[T], SetIndex, Container&)
 
     cdef cppclass StandardEntry[T, V=*, ChangeTSTracking=*, SetIndex=*]:
-        ctypedef double value_type
+        ctypedef V value_type
         ctypedef T data_type
         ctypedef size_t ts_type
         ctypedef StandardEntry entry_type
@@ -107,6 +149,8 @@ cdef extern from "cpp/binheap.hpp" nogil:
         void setValue(value_type, ts_type)
         ts_type getChangeTS()
         void setChangeTS(ts_type)
+        const value_type* valuePtr()
+        const ts_type* changeTSPtr()
         data_type& getData()
         void setData(data_type&)
         void setData(data_type&, ts_type)
@@ -114,17 +158,499 @@ cdef extern from "cpp/binheap.hpp" nogil:
         bint maxHeapCompare(entry_type&)
 
 
+cdef extern from * nogil:
+    """
+    #include <algorithm>
+    #include <cstddef>
+    #include <cstdint>
+    #include <memory>
+    #include <vector>
+
+    // PriorityValue is the storage of a single priority component. The
+    // active member is chosen when the PQ is constructed and is the same for
+    // all entries.
+    union PriorityValue {
+        double f64;
+        std::int64_t i64;
+        float f32;
+    };
+
+    enum PriorityType {
+        PRIORITY_FLOAT64,
+        PRIORITY_INT64,
+        PRIORITY_FLOAT32,
+    };
+
+    const std::size_t PRIORITY_MAX_COMPONENTS = 4;
+
+    // PriorityLayout describes the priorities of a PQ: the number of
+    // components (width) and the type of each component. Priorities with a
+    // width > 1 are compared lexicographically. A floating point first
+    // component is stored as (priority - offset) / scale, see
+    // encodePriority().
+    struct PriorityLayout {
+        std::size_t width;
+        PriorityType types[PRIORITY_MAX_COMPONENTS];
+        double offset;
+        double scale;
+    };
+
+    // PriorityTail stores the components following the first component of
+    // composite priorities. The first component is stored in the heap entry
+    // so that most comparisons do not have to access the tail. Storage is
+    // only allocated when components are set, i.e. for composite priorities.
+    class PriorityTail {
+        std::unique_ptr<PriorityValue[]> values;
+
+    public:
+        PriorityTail() = default;
+        PriorityTail(const PriorityTail& other) {
+            *this = other;
+        }
+        PriorityTail(PriorityTail&& other) = default;
+
+        PriorityTail& operator=(const PriorityTail& other) {
+            if (other.values) {
+                if (!values)
+                    values.reset(new PriorityValue[PRIORITY_MAX_COMPONENTS - 1]);
+                std::copy(other.values.get(), other.values.get() + PRIORITY_MAX_COMPONENTS - 1, values.get());
+            } else {
+                values.reset();
+            }
+            return *this;
+        }
+        PriorityTail& operator=(PriorityTail&& other) = default;
+
+        PriorityValue get(std::size_t ind) const {
+            return values[ind];
+        }
+        void set(std::size_t ind, PriorityValue value) {
+            if (!values)
+                values.reset(new PriorityValue[PRIORITY_MAX_COMPONENTS - 1]);
+            values[ind] = value;
+        }
+
+        void swap(PriorityTail& other) {
+            values.swap(other.values);
+        }
+    };
+
+    // comparePriorityValues performs a three-way comparison of two
+    // PriorityValue values interpreted as type.
+    inline int comparePriorityValues(PriorityType type, const PriorityValue& lhs, const PriorityValue& rhs) {
+        switch (type) {
+        case PRIORITY_INT64:
+            return (lhs.i64 > rhs.i64) - (lhs.i64 < rhs.i64);
+        case PRIORITY_FLOAT32:
+            return (lhs.f32 > rhs.f32) - (lhs.f32 < rhs.f32);
+        default:
+            return (lhs.f64 > rhs.f64) - (lhs.f64 < rhs.f64);
+        }
+    }
+
+    // comparePriorities performs a three-way lexicographic comparison of two
+    // priorities according to layout. The first component is passed as a
+    // value, further components are stored in the tail.
+    inline int comparePriorities(
+        const PriorityLayout& layout,
+        const PriorityValue& lhs, const PriorityTail& lhsTail,
+        const PriorityValue& rhs, const PriorityTail& rhsTail
+    ) {
+        int res = comparePriorityValues(layout.types[0], lhs, rhs);
+        for (std::size_t i = 1; i < layout.width && res == 0; ++i)
+            res = comparePriorityValues(layout.types[i], lhsTail.get(i - 1), rhsTail.get(i - 1));
+        return res;
+    }
+
+    // addPriorityValues returns the sum of two PriorityValue values
+    // interpreted as type. Sums of int64 values saturate instead of
+    // overflowing.
+    inline PriorityValue addPriorityValues(PriorityType type, const PriorityValue& lhs, const PriorityValue& rhs) {
+        PriorityValue res;
+        switch (type) {
+        case PRIORITY_INT64:
+            if (rhs.i64 > 0 && lhs.i64 > INT64_MAX - rhs.i64)
+                res.i64 = INT64_MAX;
+            else if (rhs.i64 < 0 && lhs.i64 < INT64_MIN - rhs.i64)
+                res.i64 = INT64_MIN;
+            else
+                res.i64 = lhs.i64 + rhs.i64;
+            break;
+        case PRIORITY_FLOAT32:
+            res.f32 = lhs.f32 + rhs.f32;
+            break;
+        default:
+            res.f64 = lhs.f64 + rhs.f64;
+        }
+        return res;
+    }
+
+    // encodePriority converts the first component of a priority to its
+    // stored representation. The order of floating point priorities is
+    // preserved by any transform with a positive scale, which allows
+    // shifting and scaling all priorities of a PQ in O(1) by modifying the
+    // layout. The transform is the identity for offset 0 and scale 1.
+    inline PriorityValue encodePriority(const PriorityLayout& layout, PriorityValue value) {
+        switch (layout.types[0]) {
+        case PRIORITY_FLOAT64:
+            value.f64 = (value.f64 - layout.offset) / layout.scale;
+            break;
+        case PRIORITY_FLOAT32:
+            value.f32 = static_cast<float>((value.f32 - layout.offset) / layout.scale);
+            break;
+        default:
+            break;
+        }
+        return value;
+    }
+
+    // encodePriorityDelta converts a difference of priorities to the
+    // difference of their stored representations.
+    inline PriorityValue encodePriorityDelta(const PriorityLayout& layout, PriorityValue value) {
+        switch (layout.types[0]) {
+        case PRIORITY_FLOAT64:
+            value.f64 = value.f64 / layout.scale;
+            break;
+        case PRIORITY_FLOAT32:
+            value.f32 = static_cast<float>(value.f32 / layout.scale);
+            break;
+        default:
+            break;
+        }
+        return value;
+    }
+
+    // decodePriority is the inverse of encodePriority. The offset is only
+    // added if it is non-zero, so that the sign of zero priorities is kept.
+    inline PriorityValue decodePriority(const PriorityLayout& layout, PriorityValue value) {
+        double res;
+        switch (layout.types[0]) {
+        case PRIORITY_FLOAT64:
+            res = value.f64 * layout.scale;
+            if (layout.offset != 0)
+                res += layout.offset;
+            value.f64 = res;
+            break;
+        case PRIORITY_FLOAT32:
+            res = value.f32 * layout.scale;
+            if (layout.offset != 0)
+                res += layout.offset;
+            value.f32 = static_cast<float>(res);
+            break;
+        default:
+            break;
+        }
+        return value;
+    }
+
+    enum UpsertPolicy {
+        UPSERT_REPLACE,
+        UPSERT_MIN,
+        UPSERT_MAX,
+        UPSERT_SUM,
+    };
+
+    // applyUpsertPolicy combines the priority (value, tail) of an existing
+    // entry with the priority (newValue, newTail) according to policy. The
+    // result is stored in value and tail, newTail may be left empty. Returns
+    // false if the priority is unchanged. UPSERT_SUM is only defined for
+    // scalar priorities.
+    inline bool applyUpsertPolicy(
+        UpsertPolicy policy, const PriorityLayout& layout,
+        PriorityValue& value, PriorityTail& tail,
+        const PriorityValue& newValue, PriorityTail& newTail
+    ) {
+        switch (policy) {
+        case UPSERT_MIN:
+            if (comparePriorities(layout, newValue, newTail, value, tail) >= 0)
+                return false;
+            break;
+        case UPSERT_MAX:
+            if (comparePriorities(layout, newValue, newTail, value, tail) <= 0)
+                return false;
+            break;
+        case UPSERT_SUM:
+            value = addPriorityValues(layout.types[0], value, newValue);
+            return true;
+        default:
+            break;
+        }
+
+        value = newValue;
+        tail.swap(newTail);
+        return true;
+    }
+
+    template<class P>
+    struct PriorityMember;
+
+    template<>
+    struct PriorityMember<double> {
+        static double get(const PriorityValue& value) { return value.f64; }
+    };
+
+    template<>
+    struct PriorityMember<std::int64_t> {
+        static std::int64_t get(const PriorityValue& value) { return value.i64; }
+    };
+
+    template<>
+    struct PriorityMember<float> {
+        static float get(const PriorityValue& value) { return value.f32; }
+    };
+
+    // MinPriorityCompare and MaxPriorityCompare compare StandardEntry objects
+    // holding PriorityValue values by interpreting the values as P. Ties are
+    // broken by the change timestamp (FIFO).
+
+    template<class T, class P>
+    class MinPriorityCompare {
+    public:
+        bool operator()(const T& lhs, const T& rhs) const {
+            const P lhsValue = PriorityMember<P>::get(lhs.getValue());
+            const P rhsValue = PriorityMember<P>::get(rhs.getValue());
+            if (lhsValue < rhsValue)
+                return true;
+            else if (lhsValue == rhsValue)
+                return lhs.getChangeTS() < rhs.getChangeTS();
+            else
+                return false;
+        }
+    };
+
+    template<class T, class P>
+    class MaxPriorityCompare {
+    public:
+        bool operator()(const T& lhs, const T& rhs) const {
+            const P lhsValue = PriorityMember<P>::get(lhs.getValue());
+            const P rhsValue = PriorityMember<P>::get(rhs.getValue());
+            if (lhsValue > rhsValue)
+                return true;
+            else if (lhsValue == rhsValue)
+                return lhs.getChangeTS() < rhs.getChangeTS();
+            else
+                return false;
+        }
+    };
+
+    // CompositePriorityCompare compares StandardEntry objects holding
+    // composite priorities lexicographically. The first component is the
+    // value of the entry, further components are stored in the tail of the
+    // entry's data. Ties are broken by the change timestamp (FIFO).
+    template<class T, bool Max>
+    class CompositePriorityCompare {
+        PriorityLayout layout;
+
+    public:
+        CompositePriorityCompare(const PriorityLayout& layout) : layout(layout) {}
+
+        bool operator()(const T& lhs, const T& rhs) const {
+            const int res = comparePriorities(
+                layout,
+                lhs.getValue(), lhs.getData()->tail,
+                rhs.getValue(), rhs.getData()->tail
+            );
+
+            if (res == 0)
+                return lhs.getChangeTS() < rhs.getChangeTS();
+            return Max ? res > 0 : res < 0;
+        }
+    };
+
+    // SnapshotEntry is a copy of the priority and change timestamp of the
+    // entry at index of a snapshot of a PQ, see sortSnapshot().
+    struct SnapshotEntry {
+        PriorityValue value;
+        std::size_t ts;
+        std::size_t index;
+    };
+
+    template<class P, bool Max>
+    class ScalarSnapshotCompare {
+    public:
+        bool operator()(const SnapshotEntry& lhs, const SnapshotEntry& rhs) const {
+            const P lhsValue = PriorityMember<P>::get(lhs.value);
+            const P rhsValue = PriorityMember<P>::get(rhs.value);
+            if (lhsValue == rhsValue)
+                return lhs.ts < rhs.ts;
+            return Max ? lhsValue > rhsValue : lhsValue < rhsValue;
+        }
+    };
+
+    class CompositeSnapshotCompare {
+        const PriorityLayout& layout;
+        bool maxHeap;
+        const std::vector<PriorityTail>& tails;
+
+    public:
+        CompositeSnapshotCompare(const PriorityLayout& layout, bool maxHeap, const std::vector<PriorityTail>& tails)
+            : layout(layout), maxHeap(maxHeap), tails(tails) {}
+
+        bool operator()(const SnapshotEntry& lhs, const SnapshotEntry& rhs) const {
+            const int res = comparePriorities(layout, lhs.value, tails[lhs.index], rhs.value, tails[rhs.index]);
+            if (res == 0)
+                return lhs.ts < rhs.ts;
+            return maxHeap ? res > 0 : res < 0;
+        }
+    };
+
+    template<class P>
+    void _sortScalarSnapshot(std::vector<SnapshotEntry>& entries, bool maxHeap) {
+        if (maxHeap)
+            std::sort(entries.begin(), entries.end(), ScalarSnapshotCompare<P, true>());
+        else
+            std::sort(entries.begin(), entries.end(), ScalarSnapshotCompare<P, false>());
+    }
+
+    // sortSnapshot sorts entries in the order in which they would be popped
+    // from a PQ with layout. tails holds the tail of each entry by index and
+    // is only accessed for composite priorities. Neither the PQ nor Python
+    // objects are accessed, so the GIL need not be held.
+    void sortSnapshot(std::vector<SnapshotEntry>& entries, const std::vector<PriorityTail>& tails, const PriorityLayout& layout, bool maxHeap) {
+        if (layout.width > 1)
+            std::sort(entries.begin(), entries.end(), CompositeSnapshotCompare(layout, maxHeap, tails));
+        else if (layout.types[0] == PRIORITY_INT64)
+            _sortScalarSnapshot<std::int64_t>(entries, maxHeap);
+        else if (layout.types[0] == PRIORITY_FLOAT32)
+            _sortScalarSnapshot<float>(entries, maxHeap);
+        else
+            _sortScalarSnapshot<double>(entries, maxHeap);
+    }
+
+    // permuteSnapshot reorders values, which are indexed like the entries of
+    // a snapshot, into the order of the sorted entries.
+    template<class T>
+    void permuteSnapshot(const std::vector<SnapshotEntry>& entries, std::vector<T>& values) {
+        std::vector<T> sorted;
+        sorted.reserve(entries.size());
+        for (const SnapshotEntry& entry : entries)
+            sorted.push_back(std::move(values[entry.index]));
+        values.swap(sorted);
+    }
+
+    template<class T, class P>
+    void _initScalarPriorityHeap(AnyBinHeap<T>& heap, bool maxHeap, std::vector<T>& container) {
+        if (maxHeap)
+            heap = BinHeap<T, std::vector<T>, MaxPriorityCompare<T, P>>(
+                MaxPriorityCompare<T, P>(), DefaultSetIndex<T>(), std::move(container)
+            );
+        else
+            heap = BinHeap<T, std::vector<T>, MinPriorityCompare<T, P>>(
+                MinPriorityCompare<T, P>(), DefaultSetIndex<T>(), std::move(container)
+            );
+    }
+
+    // initScalarPriorityHeap assigns a heap comparing values as the first
+    // type of layout to heap. In contrast to initPriorityHeap, the data of
+    // entries is never accessed, so any StandardEntry may be used as T.
+    template<class T>
+    void initScalarPriorityHeap(AnyBinHeap<T>& heap, const PriorityLayout& layout, bool maxHeap, std::vector<T>& container) {
+        if (layout.types[0] == PRIORITY_INT64)
+            _initScalarPriorityHeap<T, std::int64_t>(heap, maxHeap, container);
+        else if (layout.types[0] == PRIORITY_FLOAT32)
+            _initScalarPriorityHeap<T, float>(heap, maxHeap, container);
+        else
+            _initScalarPriorityHeap<T, double>(heap, maxHeap, container);
+    }
+
+    // initPriorityHeap assigns a heap comparing values according to layout
+    // to heap. The entries of container are moved into the new heap.
+    template<class T>
+    void initPriorityHeap(AnyBinHeap<T>& heap, const PriorityLayout& layout, bool maxHeap, std::vector<T>& container) {
+        if (layout.width > 1) {
+            if (maxHeap)
+                heap = BinHeap<T, std::vector<T>, CompositePriorityCompare<T, true>>(
+                    CompositePriorityCompare<T, true>(layout), DefaultSetIndex<T>(), std::move(container)
+                );
+            else
+                heap = BinHeap<T, std::vector<T>, CompositePriorityCompare<T, false>>(
+                    CompositePriorityCompare<T, false>(layout), DefaultSetIndex<T>(), std::move(container)
+                );
+        } else {
+            initScalarPriorityHeap(heap, layout, maxHeap, container);
+        }
+    }
+    """
+
+    ctypedef union PriorityValue:
+        double f64
+        int64_t i64
+        float f32
+
+    cdef enum PriorityType:
+        PRIORITY_FLOAT64
+        PRIORITY_INT64
+        PRIORITY_FLOAT32
+
+    const size_t PRIORITY_MAX_COMPONENTS
+
+    cdef struct PriorityLayout:
+        size_t width
+        PriorityType types[4]
+        double offset
+        double scale
+
+    cdef cppclass PriorityTail:
+        PriorityTail()
+        PriorityValue get(size_t)
+        void set(size_t, PriorityValue) except +
+        void swap(PriorityTail&)
+
+    cdef enum UpsertPolicy:
+        UPSERT_REPLACE
+        UPSERT_MIN
+        UPSERT_MAX
+        UPSERT_SUM
+
+    cdef struct SnapshotEntry:
+        PriorityValue value
+        size_t ts
+        size_t index
+
+    void sortSnapshot(vector[SnapshotEntry]&, vector[PriorityTail]&, PriorityLayout&, bint) except +
+    void permuteSnapshot[T](vector[SnapshotEntry]&, vector[T]&) except +
+
+    int comparePriorityValues(PriorityType, PriorityValue&, PriorityValue&)
+    int comparePriorities(PriorityLayout&, PriorityValue&, PriorityTail&, PriorityValue&, PriorityTail&)
+    PriorityValue addPriorityValues(PriorityType, PriorityValue&, PriorityValue&)
+    PriorityValue encodePriority(PriorityLayout&, PriorityValue)
+    PriorityValue encodePriorityDelta(PriorityLayout&, PriorityValue)
+    PriorityValue decodePriority(PriorityLayout&, PriorityValue)
+    bint applyUpsertPolicy(UpsertPolicy, PriorityLayout&, PriorityValue&, PriorityTail&, PriorityValue&, PriorityTail&)
+
+    void initPriorityHeap[T](AnyBinHeap[T]&, PriorityLayout&, bint, vector[T]&) except +
+    void initScalarPriorityHeap[T](AnyBinHeap[T]&, PriorityLayout&, bint, vector[T]&) except +
+
+
 cdef extern from * nogil:
     """
     #include <cstddef>
+    #include <cstdint>
     #include <string>
 
+    // PayloadValue is the storage of the data of an entry. The active member
+    // is chosen when the PQ is constructed and is the same for all entries.
+    // obj is an owned reference, reference counting is performed by the PQ.
+    union PayloadValue {
+        PyObject* obj;
+        std::int64_t i64;
+        double f64;
+    };
+
+    // APQPayload is the entry of a PQ stored in the lookup map. slot is the
+    // index of the entry in the slot table of the PQ, generation is unique
+    // among all entries ever stored in the PQ and detects stale handles.
+    // item is a borrowed reference to the handle of the entry, if one exists.
     template<class T>
     class APQPayload {
     public:
         std::size_t index;
         std::string key;
         T data;
+        PriorityTail tail;
+        std::size_t slot;
+        std::uint64_t generation;
+        PyObject* item;
 
         void setIndex(std::size_t index) {
             this->index = index;
@@ -138,25 +664,129 @@ cdef extern from * nogil:
             el->setIndex(index);
         }
     };
+
+    // The following helpers use the node API of C++17, which setup.py builds
+    // with. The fallbacks are used by compilers ignoring -std, which default
+    // to C++14, such as MSVC.
+
+    // findOrInsert returns a pointer to the value of key in map. If key is
+    // missing, a value initialised value is inserted and inserted is set to
+    // true. Key is hashed only once in either case.
+    template<class Map>
+    typename Map::mapped_type* findOrInsert(Map& map, const typename Map::key_type& key, bool& inserted) {
+    #if __cplusplus >= 201703L || (defined(_MSVC_LANG) && _MSVC_LANG >= 201703L)
+        auto res = map.try_emplace(key);
+    #else
+        auto res = map.insert(typename Map::value_type(key, typename Map::mapped_type()));
+    #endif
+        inserted = res.second;
+        return &res.first->second;
+    }
+
+    // rekey moves the value of oldKey in map to newKey, which must not be
+    // present, and returns a pointer to the moved value. Under C++17 the node
+    // is reused, so the value is neither moved nor is memory allocated.
+    template<class Map>
+    typename Map::mapped_type* rekey(Map& map, const typename Map::key_type& oldKey, const typename Map::key_type& newKey) {
+    #if __cplusplus >= 201703L || (defined(_MSVC_LANG) && _MSVC_LANG >= 201703L)
+        auto node = map.extract(oldKey);
+        node.key() = newKey;
+        return &map.insert(std::move(node)).position->second;
+    #else
+        auto it = map.find(oldKey);
+        typename Map::mapped_type value(std::move(it->second));
+        map.erase(it);
+        return &map.emplace(newKey, std::move(value)).first->second;
+    #endif
+    }
+
+    // moveEntry moves the value of key from src to dst, in which key must not
+    // be present, and returns a pointer to the moved value. Under C++17 the
+    // node is moved, so the value is neither moved nor is memory allocated.
+    // The key is hashed again by dst in either case.
+    template<class Map>
+    typename Map::mapped_type* moveEntry(Map& src, Map& dst, const typename Map::key_type& key) {
+    #if __cplusplus >= 201703L || (defined(_MSVC_LANG) && _MSVC_LANG >= 201703L)
+        return &dst.insert(src.extract(key)).position->second;
+    #else
+        auto it = src.find(key);
+        auto res = dst.emplace(it->first, std::move(it->second));
+        src.erase(it);
+        return &res.first->second;
+    #endif
+    }
     """
 
+    ctypedef union PayloadValue:
+        PyObject* obj
+        int64_t i64
+        double f64
+
     cdef cppclass APQPayload[T]:
         size_t index
         string key
         T data
+        PriorityTail tail
+        size_t slot
+        uint64_t generation
+        PyObject* item
 
 
-cdef cppclass PyObjectWrapper:
-    # PyObjectWrapper wraps an owned reference to a Python object.
-    #
-    # Reference counting operations are performed on construction, assigment
-    # and destruction. This makes PyObjectWrapper useful for storing Python
-    # objects in C++ containers.
-    object obj
+ctypedef APQPayload[PayloadValue] Entry
+ctypedef Entry* EntryPointer
+ctypedef StandardEntry[EntryPointer, PriorityValue] HeapEntry
+# The entries of SimplePQ hold their data inline, the heap does not maintain
+# any index.
+ctypedef StandardEntry[PayloadValue, PriorityValue] SimpleHeapEntry
+
+# Exported by empty heap columns, buffers must not be NULL.
+cdef HeapEntry _empty_heap_entry
+
+
+cdef extern from * nogil:
+    Entry* findOrInsert(unordered_map[string, Entry]&, string&, cpp_bool&) except +
+    Entry* rekey(unordered_map[string, Entry]&, string&, string&) except +
+    Entry* moveEntry(unordered_map[string, Entry]&, unordered_map[string, Entry]&, string&) except +
+
+
+cdef dict _priority_types = {
+    'float64': PRIORITY_FLOAT64,
+    'int64': PRIORITY_INT64,
+    'float32': PRIORITY_FLOAT32,
+}
+
 
+cdef enum DataType:
+    DATA_OBJECT
+    DATA_NONE
+    DATA_INT64
+    DATA_FLOAT64
 
-ctypedef APQPayload[PyObjectWrapper] Entry
-ctypedef StandardEntry[Entry*] HeapEntry
+
+cdef dict _data_types = {
+    'object': DATA_OBJECT,
+    'none': DATA_NONE,
+    'int64': DATA_INT64,
+    'float64': DATA_FLOAT64,
+}
+
+
+cdef array.array _float64_array_template = array.array('d')
+cdef array.array _int64_array_template = array.array('q')
+cdef array.array _float32_array_template = array.array('f')
+
+
+cdef dict _upsert_policies = {
+    'replace': UPSERT_REPLACE,
+    'min': UPSERT_MIN,
+    'max': UPSERT_MAX,
+    'sum': UPSERT_SUM,
+}
+
+
+# merge() policies for duplicate keys in addition to _upsert_policies. For
+# 'raise', KeyError is raised, for 'keep' the entry of the PQ is kept.
+cdef tuple _merge_policies = ('raise', 'keep') + tuple(_upsert_policies)
 
 
 cdef extern from "<utility>" namespace "std" nogil:
@@ -171,32 +801,60 @@ cdef extern from "<utility>" namespace "std" nogil:
     cdef vector[HeapEntry] move(vector[HeapEntry])
 
 
+cdef class KeyedPQ
+
+
+# KeyedItem never needs to be cleared by the GC, as reference cycles always
+# pass through the PQ. __dealloc__ requires _pq to unregister the handle.
+@cython.no_gc_clear
+@cython.freelist(32)
 cdef class KeyedItem:
-    cdef AnyBinHeap[HeapEntry]* _heap
-    cdef Entry* _e
+    # A KeyedItem references an entry through its slot and generation. The
+    # handle is validated on each access, so it may safely outlive the entry.
+    # The PQ is kept alive by the handle. While an entry is alive, at most one
+    # handle exists for it, which is registered in the entry.
+    cdef KeyedPQ _pq
+    cdef size_t _slot
+    cdef uint64_t _generation
     cdef unicode _cached_key
     cdef bint _cached_key_set
 
+    def __dealloc__(self):
+        cdef Entry* e
+        if self._pq is not None:
+            e = self._pq._entry_from_slot(self._slot, self._generation)
+            if e is not NULL and e.item == <PyObject*>self:
+                e.item = NULL
+
     @property
     def key(self):
+        # The entry is looked up even if the key is cached, so that a stale
+        # handle raises KeyError like value and data.
+        cdef Entry* e = self._entry()
         if not self._cached_key_set:
-            self._cached_key = self._e.key.decode('utf8')
+            self._cached_key = e.key.decode('utf8')
+            self._cached_key_set = True
 
         return self._cached_key
 
     @property
     def value(self):
-        return dereference(self._heap)[self._e.index].getValue()
+        cdef Entry* e = self._entry()
+        return from_priority_value(self._pq._heap[e.index].getValue(), e.tail, self._pq._priority_layout)
 
     @property
     def data(self):
-        return self._e.data.obj
+        return from_payload(self._entry().data, self._pq._data_type)
 
     def __eq__(self, object other):
         cdef KeyedItem otherItem
         if isinstance(other, KeyedItem):
             otherItem = <KeyedItem>other
-            return self._heap == otherItem._heap and self._e == otherItem._e
+            return (
+                self._pq is otherItem._pq and
+                self._slot == otherItem._slot and
+                self._generation == otherItem._generation
+            )
 
         return NotImplemented
 
@@ -206,84 +864,152 @@ cdef class KeyedItem:
             return NotImplemented
         return not res
 
+    cdef Entry* _entry(self) except NULL:
+        if self._pq is None:
+            raise KeyError("KeyedItem does not reference a PQ entry")
+
+        cdef Entry* e = self._pq._entry_from_slot(self._slot, self._generation)
+        if e is NULL:
+            raise KeyError("KeyedItem references an entry which has been removed from the PQ")
+        return e
+
     @staticmethod
-    cdef KeyedItem from_pointer(AnyBinHeap[HeapEntry]* heap, Entry* e):
-        i = KeyedItem()
-        i._heap = heap
-        i._e = e
+    cdef KeyedItem from_entry(KeyedPQ pq, Entry* e):
+        if e.item is not NULL:
+            return <KeyedItem>e.item
+
+        cdef KeyedItem i = KeyedItem.__new__(KeyedItem)
+        i._pq = pq
+        i._slot = e.slot
+        i._generation = e.generation
+        e.item = <PyObject*>i
         return i
 
 
 cdef class KeyedPQ:
     cdef AnyBinHeap[HeapEntry] _heap
     cdef unordered_map[string, Entry] _lookup_map
+    # Slot table mapping slot ids to entries, NULL marks free slots.
+    cdef vector[EntryPointer] _slots
+    cdef vector[size_t] _free_slots
+    cdef uint64_t _generation
     cdef unsigned long long int _ts
     cdef bint _max_heap
+    cdef PriorityLayout _priority_layout
+    # number of shift_all() and scale_all() calls since the stored priorities
+    # have last been renormalised
+    cdef size_t _transforms
+    # number of active buffer exports of _HeapColumn, the PQ must not be
+    # modified while there are any
+    cdef Py_ssize_t _exports
+    cdef DataType _data_type
+    # Being an object attribute, priority_type also causes Cython to generate
+    # the GC slots of KeyedPQ. These are extended to visit the data objects,
+    # see _keyedpq_traverse() and _keyedpq_clear().
+    cdef readonly object priority_type
 
-    def __cinit__(self, *iterables, bint max_heap=False):
+    def __cinit__(self, *iterables, bint max_heap=False, object priority_type='float64', str data_type='object'):
         cdef vector[HeapEntry] container
 
+        # The heap is initialised empty first, so that it may be accessed
+        # during the GC traversal and in __dealloc__ if __cinit__ fails.
+        self._init_heap(container)
+
         if len(iterables) > 1:
             raise TypeError("KeyedPQ accepts at most 1 non-keyword argument, {} given".format(len(iterables)))
 
+        self._priority_layout = parse_priority_layout(priority_type)
+        self.priority_type = priority_layout_name(self._priority_layout)
+
+        if data_type not in _data_types:
+            raise ValueError("Unknown data_type {!r}, must be one of {}".format(
+                data_type, ', '.join(_data_types),
+            ))
+        self._data_type = _data_types[data_type]
+
         if len(iterables) == 1:
-            for element in iterables[0]:
-                self._allocate_and_push(container, element)
+            try:
+                for element in iterables[0]:
+                    self._allocate_and_push(container, element)
+            except:
+                self._release_lookup_map()
+                raise
 
         self._max_heap = max_heap
-        if max_heap:
-            self._heap = MaxBinHeap[HeapEntry, vector[HeapEntry], DefaultSetIndex[HeapEntry]](
-                MaxHeapCompare[HeapEntry](), DefaultSetIndex[HeapEntry](), move(container)
-            )
-        else:
-            self._heap = MinBinHeap[HeapEntry, vector[HeapEntry], DefaultSetIndex[HeapEntry]](
-                MinHeapCompare[HeapEntry](), DefaultSetIndex[HeapEntry](), move(container)
-            )
+        self._init_heap(container)
+
+    def __dealloc__(self):
+        self._clear()
+
+    cdef _init_heap(self, vector[HeapEntry]& container):
+        initPriorityHeap[HeapEntry](self._heap, self._priority_layout, self._max_heap, container)
 
     cdef _allocate_and_push(self, vector[HeapEntry]& container, object element):
+        if len(element) == 2 and self._data_type == DATA_NONE:
+            element = (element[0], element[1], None)
+
         if len(element) != 3:
             raise ValueError("element in initialisation iterable must have length 3, has length {}".format(len(element)))
 
-        cdef Entry e
-        e.key = stringify(element[0])
+        cdef string key = stringify(element[0])
 
-        if self._lookup_map.count(e.key) > 0:
+        if self._lookup_map.count(key) > 0:
             raise KeyError("Duplicate key: key already exists in PQ")
 
-        cdef double value = <double?> element[1]
-        e.data.obj = element[2]
+        cdef PriorityTail tail
+        cdef PriorityValue value = to_priority_value(element[1], self._priority_layout, tail)
+        cdef PayloadValue payload = to_payload(element[2], self._data_type)
 
-        self._lookup_map[e.key] = e
-        cdef Entry* e_pointer = &self._lookup_map[e.key]
+        cdef Entry* e = self._insert_entry(key, payload, tail)
 
         container.push_back(HeapEntry(
             value,
-            e_pointer,
+            e,
             preincrement(self._ts),
         ))
 
     def __len__(self):
         return self._heap.size()
 
+    def __sizeof__(self):
+        # Approximation of the memory allocated by the C++ containers. Each
+        # node of the lookup map additionally stores the next node pointer and
+        # the cached hash of the key.
+        return (
+            object.__sizeof__(self) +
+            self._heap.size() * sizeof(HeapEntry) +
+            self._lookup_map.size() * (sizeof(pair[string, Entry]) + 2 * sizeof(void*)) +
+            self._lookup_map.bucket_count() * sizeof(void*) +
+            self._slots.capacity() * sizeof(EntryPointer) +
+            self._free_slots.capacity() * sizeof(size_t)
+        )
+
+    @property
+    def data_type(self):
+        for name, data_type in _data_types.items():
+            if data_type == self._data_type:
+                return name
+
     def __contains__(self, object identifier):
         try:
-            self._entry_from_identifier(identifier)
-        except:
+            return self._find_identifier(identifier) is not NULL
+        except TypeError:
             return False
-        else:
-            return True
 
     def __iter__(self):
-        return self.values()
+        return self._iter_keys()
 
     def __getitem__(self, object identifier):
         cdef Entry* e = self._entry_from_identifier(identifier)
-        return KeyedItem.from_pointer(&self._heap, e)
+        return KeyedItem.from_entry(self, e)
 
     def __delitem__(self, object identifier):
+        self._check_mutable()
         cdef Entry* e = self._entry_from_identifier(identifier)
+        cdef PayloadValue payload = e.data
         self._heap.remove(e.index)
-        self._lookup_map.erase(e.key)
+        self._erase_entry(e)
+        release_payload(payload, self._data_type)
 
     def __eq__(self, object other):
         cdef KeyedPQ otherPQ
@@ -303,169 +1029,3117 @@ cdef class KeyedPQ:
     def get(self, object identifier, object default=None):
         cdef Entry* e
         try:
-            e = self._entry_from_identifier(identifier)
-        except:
+            e = self._find_identifier(identifier)
+        except TypeError:
             return default
-        else:
-            return KeyedItem.from_pointer(&self._heap, e)
+        if e is NULL:
+            return default
+        return KeyedItem.from_entry(self, e)
 
     def keys(self):
+        return _KeysView(self)
+
+    def items(self):
+        return _ItemsView(self)
+
+    def values(self):
+        return _ValuesView(self)
+
+    def keys_list(self):
+        # Keys are copied before any Python objects are created, see
+        # _batch_result().
+        cdef vector[string] keys
+        cdef size_t i
+        keys.reserve(self._heap.size())
+        for i in range(self._heap.size()):
+            keys.push_back(self._heap[i].getData().key)
+
+        cdef list l = [None] * <Py_ssize_t>keys.size()
+        for i in range(keys.size()):
+            l[i] = keys[i].decode('utf8')
+        return l
+
+    def priorities_array(self):
+        cdef vector[PriorityValue] values
+        cdef vector[PriorityTail] tails
+        cdef size_t i
+        values.reserve(self._heap.size())
+        for i in range(self._heap.size()):
+            values.push_back(self._heap[i].getValue())
+            if self._priority_layout.width > 1:
+                tails.push_back(self._heap[i].getData().tail)
+
+        return self._priorities_column(values, tails, self._priority_layout)
+
+    def priorities_view(self):
+        if self._priority_layout.width > 1:
+            raise ValueError("priorities_view() is not supported for composite priorities")
+        if self._priority_layout.offset != 0 or self._priority_layout.scale != 1:
+            self._check_mutable()
+            self._renormalise()
+        return memoryview(_HeapColumn(self, COLUMN_PRIORITY))
+
+    def timestamps_view(self):
+        return memoryview(_HeapColumn(self, COLUMN_TIMESTAMP))
+
+    cdef inline int _check_mutable(self) except -1:
+        if self._exports > 0:
+            raise BufferError("Existing exports of priorities_view() or timestamps_view(): PQ cannot be modified")
+        return 0
+
+    def slot(self, object identifier):
+        cdef Entry* e = self._find_identifier(identifier)
+        if e is NULL:
+            raise KeyError(identifier)
+        return e.slot
+
+    def slots(self):
+        cdef Py_ssize_t n = self._heap.size()
+        cdef array.array a = array.clone(_int64_array_template, n, zero=False)
+        cdef Py_ssize_t i
+        for i in range(n):
+            a.data.as_longlongs[i] = self._heap[i].getData().slot
+        return a
+
+    def set_priorities(self, object slots, object priorities):
+        self._check_mutable()
+        cdef vector[size_t] slot_ids
+        read_slots(slots, slot_ids)
+        cdef Py_ssize_t n = slot_ids.size()
+        if len(priorities) != n:
+            raise ValueError("priorities must have the same length as slots, {} != {}".format(len(priorities), n))
+
+        cdef vector[PriorityValue] values
+        cdef vector[PriorityTail] tails
+        self._convert_priorities(priorities, n, values, tails)
+        # The conversion may have exported a view.
+        self._check_mutable()
+
+        cdef Py_ssize_t i
+        for i in range(n):
+            if slot_ids[i] >= self._slots.size() or self._slots[slot_ids[i]] is NULL:
+                raise KeyError(slot_ids[i])
+
+        # As in _upsert_many(), large batches are applied in place and the
+        # heap is rebuilt once.
+        cdef bint rebuild = <size_t>n * 2 >= self._heap.size()
+        cdef Entry* e
+        for i in range(n):
+            e = self._slots[slot_ids[i]]
+            e.tail.swap(tails[i])
+            self._heap[e.index].setValue(values[i], preincrement(self._ts))
+            if not rebuild:
+                self._heap.fix(e.index)
+
+        if rebuild:
+            self._heap.rebuild()
+
+    def get_priorities(self, object keys, double default=NAN):
+        if self._priority_layout.width > 1:
+            raise ValueError("get_priorities() is not supported for composite priorities")
+
+        cdef vector[EntryPointer] entries
+        self._find_many(keys, entries)
+
+        cdef Py_ssize_t n = entries.size()
+        cdef array.array a = array.clone(_float64_array_template, n, zero=False)
+        cdef PriorityType priority_type = self._priority_layout.types[0]
+        cdef PriorityValue value
+        cdef Entry* e
+        cdef Py_ssize_t i
+        for i in range(n):
+            e = entries[i]
+            if e is NULL:
+                a.data.as_doubles[i] = default
+                continue
+
+            value = decodePriority(self._priority_layout, self._heap[e.index].getValue())
+            if priority_type == PRIORITY_INT64:
+                a.data.as_doubles[i] = <double>value.i64
+            elif priority_type == PRIORITY_FLOAT32:
+                a.data.as_doubles[i] = value.f32
+            else:
+                a.data.as_doubles[i] = value.f64
+        return a
+
+    def get_data_many(self, object keys, object default=None):
+        cdef vector[EntryPointer] entries
+        self._find_many(keys, entries)
+
+        cdef Py_ssize_t n = entries.size()
+        cdef list l = [default] * n
+        cdef Py_ssize_t i
+        for i in range(n):
+            if entries[i] is not NULL:
+                l[i] = from_payload(entries[i].data, self._data_type)
+        return l
+
+    cdef int _find_many(self, object keys, vector[EntryPointer]& entries) except -1:
+        # Looks up all keys, missing keys are NULL. The keys are converted
+        # first, so that the lookups do not create any Python objects. keys
+        # may be any iterable, its length is only used as a hint.
+        cdef vector[string] string_keys
+        string_keys.reserve(operator.length_hint(keys))
+        for key in keys:
+            string_keys.push_back(stringify(key))
+
+        cdef unordered_map[string, Entry].iterator it
+        cdef size_t i
+        entries.resize(string_keys.size(), NULL)
+        for i in range(string_keys.size()):
+            it = self._lookup_map.find(string_keys[i])
+            if it != self._lookup_map.end():
+                entries[i] = &dereference(it).second
+        return 0
+
+    def _iter_keys(self):
         cdef HeapEntry entry
         for entry in self._heap:
             yield entry.getData().key.decode('utf8')
 
-    def items(self):
+    def _iter_items(self):
         cdef HeapEntry entry
         for entry in self._heap:
             yield (
                 entry.getData().key.decode('utf8'),
-                KeyedItem.from_pointer(&self._heap, entry.getData()),
+                KeyedItem.from_entry(self, entry.getData()),
             )
 
-    def values(self):
+    def _iter_values(self):
         cdef HeapEntry entry
         for entry in self._heap:
-            yield KeyedItem.from_pointer(&self._heap, entry.getData())
+            yield KeyedItem.from_entry(self, entry.getData())
 
     def clear(self):
-        self._heap.clear()
-        self._lookup_map.clear()
+        self._check_mutable()
+        self._clear()
 
-    def add(self, object key, double value, object data):
-        cdef Entry e
-        e.key = stringify(key)
+    def discard_many(self, object identifiers):
+        self._check_mutable()
+        # Duplicates are skipped by marking entries by heap index.
+        cdef vector[cpp_bool] seen
+        seen.resize(self._heap.size(), False)
+        cdef vector[EntryPointer] entries
+        cdef Entry* e
+        for identifier in identifiers:
+            e = self._find_identifier(identifier)
+            if e is not NULL and not seen[e.index]:
+                seen[e.index] = True
+                entries.push_back(e)
 
-        if self._lookup_map.count(e.key) > 0:
-            raise KeyError("Duplicate key: key already exists in PQ")
+        return self._remove_entries(entries)
 
-        e.data.obj = data
+    def retain(self, object predicate):
+        self._check_mutable()
+        cdef vector[EntryPointer] entries
+        self._select_where(predicate, False, entries)
+        return self._remove_entries(entries)
 
-        self._lookup_map[e.key] = e
-        cdef Entry* e_pointer = &self._lookup_map[e.key]
+    def remove_where(self, object predicate):
+        self._check_mutable()
+        cdef vector[EntryPointer] entries
+        self._select_where(predicate, True, entries)
+        return self._remove_entries(entries)
 
-        self._heap.push(HeapEntry(
-            value,
-            e_pointer,
-            preincrement(self._ts),
-        ))
+    def merge(self, KeyedPQ other not None, str policy='raise'):
+        self._check_mutable()
+        if other is self:
+            raise ValueError("Cannot merge a PQ into itself")
+        other._check_mutable()
+        self._check_compatible(other)
+        if policy not in _merge_policies:
+            raise ValueError("Unknown policy {!r}, must be one of {}".format(
+                policy, ', '.join(_merge_policies),
+            ))
+        if policy == 'sum' and self._priority_layout.width > 1:
+            raise ValueError("policy 'sum' is not supported for composite priorities")
 
-        return KeyedItem.from_pointer(&self._heap, e_pointer)
+        cdef size_t n = other._heap.size()
+        cdef Entry* e
+        cdef Entry* other_e
+        cdef size_t i
+        if policy == 'raise':
+            for i in range(n):
+                other_e = other._heap[i].getData()
+                if self._find(other_e.key) is not NULL:
+                    raise KeyError(other_e.key.decode('utf8'))
 
-    def change_value(self, object identifier, double value):
-        cdef Entry* e = self._entry_from_identifier(identifier)
-        self._heap[e.index].setValue(value, preincrement(self._ts))
-        self._heap.fix(e.index)
-        return KeyedItem.from_pointer(&self._heap, e)
+        # Encoded priorities are comparable if both PQs share the transform.
+        # Sums of encoded priorities include the offset twice, so 'sum'
+        # additionally requires the offset to be folded in.
+        if (
+            self._priority_layout.offset != other._priority_layout.offset or
+            self._priority_layout.scale != other._priority_layout.scale or
+            (policy == 'sum' and self._priority_layout.offset != 0)
+        ):
+            self._renormalise()
+            other._renormalise()
 
-    def add_or_change_value(self, object key, double value, object data):
-        cdef string string_key = stringify(key)
-        cdef Entry* e
-        try:
-            e = self._lookup(string_key)
-            self._heap[e.index].setValue(value, preincrement(self._ts))
-            self._heap.fix(e.index)
-            return KeyedItem.from_pointer(&self._heap, e)
-        except KeyError:
-            return self.add(key, value, data)
+        cdef bint keep = policy == 'keep' or policy == 'raise'
+        cdef UpsertPolicy upsert_policy = UPSERT_REPLACE if keep else _upsert_policies[policy]
 
-    def peek(self):
-        if self._heap.size() == 0:
-            raise IndexError("PQ is empty")
+        # Entries of other are ordered after the entries of the PQ on ties,
+        # their relative order is kept by offsetting their change timestamps.
+        cdef unsigned long long int ts_offset = self._ts
+        cdef vector[HeapEntry] container
+        cdef vector[PayloadValue] unused_payloads
+        cdef bint changed = False
+        cdef HeapEntry other_entry
+        cdef PriorityValue value, other_value
+        container.reserve(n)
+        for i in range(n):
+            other_entry = other._heap[i]
+            other_e = other_entry.getData()
+            e = self._find(other_e.key)
+            if e is NULL:
+                e = moveEntry(other._lookup_map, self._lookup_map, other_e.key)
+                e.item = NULL
+                self._assign_slot(e)
+                container.push_back(HeapEntry(other_entry.getValue(), e, ts_offset + other_entry.getChangeTS()))
+                continue
 
-        return KeyedItem.from_pointer(&self._heap, self._heap.top().getData())
+            value = self._heap[e.index].getValue()
+            other_value = other_entry.getValue()
+            if keep or not applyUpsertPolicy(upsert_policy, self._priority_layout, value, e.tail, other_value, other_e.tail):
+                unused_payloads.push_back(other_e.data)
+                continue
 
-    def pop(self):
-        if self._heap.size() == 0:
-            raise IndexError("PQ is empty")
+            if upsert_policy == UPSERT_SUM:
+                unused_payloads.push_back(other_e.data)
+            else:
+                unused_payloads.push_back(e.data)
+                e.data = other_e.data
+            self._heap[e.index].setValue(value, ts_offset + other_entry.getChangeTS())
+            changed = True
 
-        cdef HeapEntry heapEntry = self._heap.top()
-        cdef Entry* e = heapEntry.getData()
+        self._ts = ts_offset + other._ts
 
-        cdef double value = heapEntry.getValue()
-        cdef string key = e.key
-        cdef object data = e.data.obj
+        # The remaining entries of other are duplicates, their payloads are
+        # released below.
+        other._heap.clear()
+        other._lookup_map.clear()
+        other._slots.clear()
+        other._free_slots.clear()
+        other._reset_transform()
 
-        self._heap.pop()
-        self._lookup_map.erase(key)
+        if changed:
+            self._heap.rebuild(container.data(), container.data() + container.size())
+        else:
+            self._heap.extend(container.data(), container.data() + container.size())
 
-        return key.decode('utf8'), value, data
+        release_payloads(unused_payloads, self._data_type)
 
-    def ordered_iter(self):
-        cdef AnyBinHeap[HeapEntry].ordered_iterable iterable = self._heap.orderedIterable()
-        cdef HeapEntry entry
-        for entry in iterable:
-            yield KeyedItem.from_pointer(&self._heap, entry.getData())
+    def split(self, object predicate_or_threshold, bint inclusive=True):
+        self._check_mutable()
+        cdef vector[EntryPointer] entries
+        cdef PriorityTail threshold_tail
+        cdef PriorityValue threshold_value
+        cdef vector[size_t] stack
+        cdef size_t size = self._heap.size()
+        cdef size_t i
+        if callable(predicate_or_threshold):
+            self._select_where(predicate_or_threshold, True, entries)
+        else:
+            # Depth-first traversal of the heap as in iter_below().
+            threshold_value = to_priority_value(predicate_or_threshold, self._priority_layout, threshold_tail)
+            if size > 0:
+                stack.push_back(0)
+            while not stack.empty():
+                i = stack.back()
+                stack.pop_back()
+                if not self._precedes(self._heap[i], threshold_value, threshold_tail, inclusive):
+                    continue
 
-    cdef Entry* _lookup(self, string key) except +KeyError:
-        return &self._lookup_map.at(key)
+                entries.push_back(self._heap[i].getData())
+                if 2 * i + 2 < size:
+                    stack.push_back(2 * i + 2)
+                if 2 * i + 1 < size:
+                    stack.push_back(2 * i + 1)
 
-    cdef Entry* _entry_from_identifier(self, object identifier) except *:
-        cdef Entry* e
-        if type(identifier) is KeyedItem:
-            if (<KeyedItem>identifier)._e is NULL:
-                raise KeyError("Passed identifier (of type KeyedItem) does not reference a PQ entry")
-            e = (<KeyedItem>identifier)._e
-            if e.index >= self._heap.size() or self._heap[e.index].getData() != e:
-                raise KeyError("Passed identifier (of type KeyedItem) is not known to the PQ")
-            return e
+        cdef KeyedPQ pq = KeyedPQ(max_heap=self._max_heap, priority_type=self.priority_type, data_type=self.data_type)
+        pq._priority_layout.offset = self._priority_layout.offset
+        pq._priority_layout.scale = self._priority_layout.scale
+        pq._ts = self._ts
 
-        cdef string key = stringify(identifier)
-        return self._lookup(key)
+        cdef size_t k = entries.size()
+        cdef vector[HeapEntry] container
+        container.reserve(k)
+        for i in range(k):
+            container.push_back(self._heap[entries[i].index])
+        self._detach_entries(entries)
 
-    def _export(self):
-        l = []
+        # Entries are moved with their lookup map nodes, keys are neither
+        # decoded nor converted again.
+        cdef Entry* e
+        for i in range(k):
+            e = entries[i]
+            self._free_slot(e)
+            e = moveEntry(self._lookup_map, pq._lookup_map, e.key)
+            e.item = NULL
+            pq._assign_slot(e)
+            container[i].setData(e)
 
-        cdef HeapEntry entry
-        for entry in self._heap:
-            l.append(entry.getValue())
+        pq._heap.rebuild(container.data(), container.data() + container.size())
+        return pq
 
-        return l
+    cdef int _check_compatible(self, KeyedPQ other) except -1:
+        if (
+            self._max_heap != other._max_heap or
+            self.priority_type != other.priority_type or
+            self._data_type != other._data_type
+        ):
+            raise ValueError("PQs must have the same max_heap, priority_type and data_type")
+        return 0
 
-    def _verify_invariants(self):
-        if self._heap.size() != self._lookup_map.size():
-            # heap and lookup map don't have the same size
-            return False
+    cdef int _select_where(self, object predicate, bint select, vector[EntryPointer]& entries) except -1:
+        # Appends all entries for which bool(predicate(key, priority, data))
+        # is select to entries. predicate may modify the PQ, so entries are
+        # referenced by slot and generation until all calls have returned.
+        cdef size_t n = self._heap.size()
+        cdef vector[size_t] slots
+        cdef vector[uint64_t] generations
+        slots.reserve(n)
+        generations.reserve(n)
 
         cdef Entry* e
-        cdef AnyBinHeap[HeapEntry].size_type i, left_child_ind, right_child_ind
-        cdef AnyBinHeap[HeapEntry].iterator begin_it, end_it, it
+        cdef size_t i
+        for i in range(n):
+            e = self._heap[i].getData()
+            slots.push_back(e.slot)
+            generations.push_back(e.generation)
 
-        begin_it = self._heap.begin()
-        end_it = self._heap.end()
-        it = begin_it
-        while it != end_it:
-            e = dereference(it).getData()
-            i = it - begin_it
-            if e.index != i:
-                # wrong index is stored in the entry
-                return False
+        cdef vector[size_t] matches
+        cdef object key, priority, data
+        for i in range(n):
+            e = self._entry_from_slot(slots[i], generations[i])
+            if e is NULL:
+                continue
+            key = e.key.decode('utf8')
+            priority = from_priority_value(self._heap[e.index].getValue(), e.tail, self._priority_layout)
+            data = from_payload(e.data, self._data_type)
+            if bool(predicate(key, priority, data)) == select:
+                matches.push_back(i)
 
-            if &self._lookup_map[e.key] != e:
-                # key is not mapped to entry
-                return False
+        entries.reserve(entries.size() + matches.size())
+        for i in matches:
+            e = self._entry_from_slot(slots[i], generations[i])
+            if e is not NULL:
+                entries.push_back(e)
+        return 0
 
-            left_child_ind = 2 * i + 1
-            right_child_ind = left_child_ind + 1
-            if left_child_ind < self._heap.size() and self._compare(self._heap[left_child_ind], dereference(it)):
-                    # left child is less than parent
-                    return False
-            if right_child_ind < self._heap.size() and self._compare(self._heap[left_child_ind], dereference(it)):
-                    # right child is less than parent
-                    return False
+    cdef Py_ssize_t _remove_entries(self, vector[EntryPointer]& entries) except -1:
+        # Removes distinct entries from the PQ and returns their number.
+        self._detach_entries(entries)
 
-            preincrement(it)
+        cdef size_t k = entries.size()
+        cdef vector[PayloadValue] payloads
+        payloads.reserve(k)
+        cdef Entry* e
+        cdef size_t i
+        for i in range(k):
+            e = entries[i]
+            payloads.push_back(e.data)
+            self._erase_entry(e)
+
+        release_payloads(payloads, self._data_type)
+        return k
+
+    cdef int _detach_entries(self, vector[EntryPointer]& entries) except -1:
+        # Removes distinct entries from the heap, but not from the lookup map.
+        # Small batches are removed one by one, each in O(log n). For larger
+        # batches, the remaining entries are compacted and the heap is rebuilt
+        # once in O(n). Entries are selected by arbitrary code, which may have
+        # exported a view, so the PQ is checked again.
+        self._check_mutable()
+
+        cdef size_t k = entries.size()
+        cdef size_t n = self._heap.size()
+        cdef vector[cpp_bool] removed
+        cdef vector[HeapEntry] container
+        cdef Entry* e
+        cdef size_t i
+        if k * 2 < n:
+            for i in range(k):
+                self._heap.remove(entries[i].index)
+        elif k > 0:
+            # Removed entries are marked by heap index, so that compacting
+            # does not have to access the entries.
+            removed.resize(n, False)
+            for i in range(k):
+                removed[entries[i].index] = True
+
+            container.reserve(n - k)
+            for i in range(n):
+                if not removed[i]:
+                    container.push_back(self._heap[i])
+
+            self._heap.clear()
+            self._heap.rebuild(container.data(), container.data() + container.size())
+        return 0
+
+    @classmethod
+    def from_arrays(cls, object keys, object priorities, object data=None, *, bint max_heap=False, object priority_type='float64', str data_type='object'):
+        cdef KeyedPQ pq = cls(max_heap=max_heap, priority_type=priority_type, data_type=data_type)
+        pq.add_many(keys, priorities, data)
+        return pq
+
+    def add_many(self, object keys, object priorities, object data=None):
+        self._check_mutable()
+        cdef vector[string] string_keys
+        cdef vector[PriorityValue] values
+        cdef vector[PriorityTail] tails
+        cdef vector[PayloadValue] payloads
+        cdef Py_ssize_t n = self._convert_many(keys, priorities, data, string_keys, values, tails, payloads)
+
+        cdef vector[HeapEntry] container
+        container.reserve(n)
+        self._lookup_map.reserve(self._lookup_map.size() + n)
+        self._slots.reserve(self._slots.size() + n)
+
+        cdef Entry* e
+        cdef Py_ssize_t i
+        for i in range(n):
+            if self._lookup_map.count(string_keys[i]) > 0:
+                self._discard_entries(container)
+                release_payloads(payloads, self._data_type)
+                raise KeyError("Duplicate key: key already exists in PQ")
+
+            e = self._insert_entry(string_keys[i], payloads[i], tails[i])
+            container.push_back(HeapEntry(values[i], e, preincrement(self._ts)))
+
+        self._heap.extend(container.data(), container.data() + container.size())
+
+    def upsert_many(self, object keys, object priorities, object data=None, str policy='replace'):
+        self._check_mutable()
+        if policy not in _upsert_policies:
+            raise ValueError("Unknown policy {!r}, must be one of {}".format(
+                policy, ', '.join(_upsert_policies),
+            ))
+        cdef UpsertPolicy upsert_policy = _upsert_policies[policy]
+        if upsert_policy == UPSERT_SUM and self._priority_layout.width > 1:
+            raise ValueError("policy 'sum' is not supported for composite priorities")
+
+        inserted, updated, _ = self._upsert_many(keys, priorities, data, upsert_policy, False)
+        return inserted, updated
+
+    def increment(self, object key, object delta, object default=None, object data=None):
+        self._check_mutable()
+        if self._priority_layout.width > 1:
+            raise ValueError("increment is not supported for composite priorities")
+
+        cdef PriorityType priority_type = self._priority_layout.types[0]
+        cdef string string_key = stringify(key)
+        cdef PriorityValue delta_value = encodePriorityDelta(self._priority_layout, to_priority(delta, priority_type))
+        cdef PriorityValue value
+        cdef PriorityTail tail
+        cdef PayloadValue payload
+        cdef cpp_bool inserted = False
+        cdef Entry* e
+
+        if default is None:
+            e = self._find(string_key)
+            if e is NULL:
+                raise KeyError(key)
+        else:
+            value = encodePriority(self._priority_layout, to_priority(default, priority_type))
+            payload = to_payload(data, self._data_type)
+            e = findOrInsert(self._lookup_map, string_key, inserted)
+            if inserted:
+                self._init_entry(e, string_key, payload, tail)
+                value = addPriorityValues(priority_type, value, delta_value)
+                self._heap.push(HeapEntry(
+                    value,
+                    e,
+                    preincrement(self._ts),
+                ))
+                return from_priority_value(value, tail, self._priority_layout)
+            release_payload(payload, self._data_type)
+
+        cdef HeapEntry* heap_entry = &self._heap[e.index]
+        cdef PriorityValue old_value = heap_entry.getValue()
+        value = addPriorityValues(priority_type, old_value, delta_value)
+        heap_entry.setValue(value, preincrement(self._ts))
+        self._fix_moved(e.index, comparePriorityValues(priority_type, value, old_value))
+        return from_priority_value(value, tail, self._priority_layout)
+
+    def increment_many(self, object keys, object deltas, object default=None, object data=None):
+        self._check_mutable()
+        if self._priority_layout.width > 1:
+            raise ValueError("increment_many is not supported for composite priorities")
+
+        self._upsert_many(keys, deltas, data, UPSERT_SUM, False, default is not None, default)
+
+    def shift_all(self, double delta):
+        self._check_mutable()
+        if self._priority_layout.types[0] == PRIORITY_INT64:
+            raise ValueError("shift_all requires a floating point priority type")
+        if not isfinite(delta):
+            raise ValueError("delta must be finite")
+
+        self._priority_layout.offset += delta
+        self._transformed()
+
+    def scale_all(self, double factor):
+        self._check_mutable()
+        if self._priority_layout.types[0] == PRIORITY_INT64:
+            raise ValueError("scale_all requires a floating point priority type")
+        if not (factor > 0 and isfinite(factor)):
+            raise ValueError("factor must be positive and finite")
+
+        self._priority_layout.offset *= factor
+        self._priority_layout.scale *= factor
+        self._transformed()
+
+    cdef void _transformed(self):
+        # Stored priorities lose precision if the scale drifts far from 1 or
+        # if the offset outweighs the priorities. Renormalising is O(n), so
+        # apart from an extreme scale it is done at most once per n
+        # transforms.
+        preincrement(self._transforms)
+        cdef PriorityValue top
+        cdef double top_value
+        if 2.0 ** -32 <= self._priority_layout.scale <= 2.0 ** 32 and self._heap.size() > 0:
+            if self._transforms < self._heap.size():
+                return
 
+            top = decodePriority(self._priority_layout, self._heap.top().getValue())
+            top_value = top.f32 if self._priority_layout.types[0] == PRIORITY_FLOAT32 else top.f64
+            if fabs(self._priority_layout.offset) <= 2.0 ** 20 * fabs(top_value):
+                return
+
+        self._renormalise()
+
+    cdef void _renormalise(self):
+        # Applies the transform to all stored priorities. The heap is rebuilt,
+        # as rounding may turn ordered priorities into ties, which are then
+        # ordered by their change timestamp.
+        cdef size_t i
+        for i in range(self._heap.size()):
+            self._heap[i].setValue(decodePriority(self._priority_layout, self._heap[i].getValue()))
+        self._heap.rebuild()
+        self._reset_transform()
+
+    cdef inline void _reset_transform(self):
+        self._priority_layout.offset = 0
+        self._priority_layout.scale = 1
+        self._transforms = 0
+
+    def relax(self, object key, object value, object data=None):
+        self._check_mutable()
+        cdef string string_key = stringify(key)
+        cdef PriorityTail tail
+        cdef PriorityValue priority = to_priority_value(value, self._priority_layout, tail)
+        cdef PayloadValue payload = to_payload(data, self._data_type)
+
+        cdef cpp_bool inserted = False
+        cdef Entry* e = findOrInsert(self._lookup_map, string_key, inserted)
+        if inserted:
+            self._init_entry(e, string_key, payload, tail)
+            self._heap.push(HeapEntry(
+                priority,
+                e,
+                preincrement(self._ts),
+            ))
+            return True
+
+        cdef int res = comparePriorities(self._priority_layout, priority, tail, self._heap[e.index].getValue(), e.tail)
+        if self._max_heap:
+            res = -res
+        if res >= 0:
+            release_payload(payload, self._data_type)
+            return False
+
+        e.tail.swap(tail)
+        payload, e.data = e.data, payload
+        self._heap[e.index].setValue(priority, preincrement(self._ts))
+        self._heap.fixUp(e.index)
+        release_payload(payload, self._data_type)
         return True
 
-    cdef bint _compare(self, HeapEntry& lhs, HeapEntry& rhs):
+    def relax_many(self, object keys, object priorities, object data=None):
+        self._check_mutable()
+        inserted, _, changed = self._upsert_many(keys, priorities, data, UPSERT_MAX if self._max_heap else UPSERT_MIN, True)
+        return inserted + changed
+
+    cdef tuple _upsert_many(
+        self, object keys, object priorities, object data,
+        UpsertPolicy policy, bint replace_data, bint insert=True, object default=None,
+    ):
+        # Implements upsert_many(), relax_many() and increment_many(). If
+        # replace_data is true, the data of entries is replaced if their
+        # priority changes. If insert is false, KeyError is raised before the
+        # PQ is modified if any key is missing. For UPSERT_SUM, priorities
+        # are deltas and inserted entries start at default or 0. Returns the
+        # number of inserted, present and changed entries.
+
+        cdef PriorityType priority_type = self._priority_layout.types[0]
+        cdef PriorityValue default_value
+        if policy == UPSERT_SUM:
+            default_value = encodePriority(self._priority_layout, to_priority(0 if default is None else default, priority_type))
+
+        cdef vector[string] string_keys
+        cdef vector[PriorityValue] values
+        cdef vector[PriorityTail] tails
+        cdef vector[PayloadValue] payloads
+        cdef Py_ssize_t n = self._convert_many(keys, priorities, data, string_keys, values, tails, payloads, policy == UPSERT_SUM)
+
+        cdef Py_ssize_t i
+        if not insert:
+            for i in range(n):
+                if self._find(string_keys[i]) is NULL:
+                    release_payloads(payloads, self._data_type)
+                    raise KeyError(string_keys[i].decode('utf8'))
+
+        # Updated entries are fixed one by one for small batches. For large
+        # batches, all entries are modified in place and the heap is rebuilt
+        # once, which is O(n) instead of O(k log n) for k updates. Fixing
+        # random updates is faster until k approaches n.
+        cdef bint rebuild = <size_t>n * 2 >= self._heap.size()
+
+        # Entries inserted by this call are not on the heap until the end of
+        # the batch. They are recognised by their generation, their index
+        # refers to container meanwhile.
+        cdef uint64_t first_generation = self._generation + 1
+        cdef vector[HeapEntry] container
+        cdef vector[PayloadValue] unused_payloads
+        cdef Py_ssize_t inserted = 0
+        cdef Py_ssize_t changed = 0
+
+        cdef cpp_bool is_new = False
+        cdef Entry* e
+        cdef HeapEntry* heap_entry
+        cdef PriorityValue value
+        cdef PriorityValue old_value
+        for i in range(n):
+            e = findOrInsert(self._lookup_map, string_keys[i], is_new)
+            if is_new:
+                if policy == UPSERT_SUM:
+                    values[i] = addPriorityValues(priority_type, default_value, values[i])
+                self._init_entry(e, string_keys[i], payloads[i], tails[i])
+                e.index = container.size()
+                container.push_back(HeapEntry(values[i], e, preincrement(self._ts)))
+                inserted += 1
+                continue
+
+            if e.generation >= first_generation:
+                heap_entry = &container[e.index]
+            else:
+                heap_entry = &self._heap[e.index]
+
+            value = old_value = heap_entry.getValue()
+            if not applyUpsertPolicy(policy, self._priority_layout, value, e.tail, values[i], tails[i]):
+                unused_payloads.push_back(payloads[i])
+                continue
+
+            if replace_data:
+                unused_payloads.push_back(e.data)
+                e.data = payloads[i]
+            else:
+                unused_payloads.push_back(payloads[i])
+
+            changed += 1
+            heap_entry.setValue(value, preincrement(self._ts))
+            if e.generation >= first_generation or rebuild:
+                continue
+
+            # The direction in which the entry moves is known except for
+            # UPSERT_REPLACE, so only one side of the entry is inspected.
+            if policy == UPSERT_SUM:
+                self._fix_moved(e.index, comparePriorityValues(priority_type, value, old_value))
+            elif policy == UPSERT_MIN:
+                self._fix_moved(e.index, -1)
+            elif policy == UPSERT_MAX:
+                self._fix_moved(e.index, 1)
+            else:
+                self._heap.fix(e.index)
+
+        if rebuild:
+            self._heap.rebuild(container.data(), container.data() + container.size())
+        else:
+            self._heap.extend(container.data(), container.data() + container.size())
+
+        release_payloads(unused_payloads, self._data_type)
+
+        return inserted, n - inserted, changed
+
+    def add(self, object key, object value, object data=None, *, bint return_item=True):
+        self._check_mutable()
+        cdef string string_key = stringify(key)
+
+        if self._lookup_map.count(string_key) > 0:
+            raise KeyError("Duplicate key: key already exists in PQ")
+
+        cdef PriorityTail tail
+        cdef PriorityValue priority = to_priority_value(value, self._priority_layout, tail)
+        cdef PayloadValue payload = to_payload(data, self._data_type)
+
+        cdef Entry* e = self._insert_entry(string_key, payload, tail)
+
+        self._heap.push(HeapEntry(
+            priority,
+            e,
+            preincrement(self._ts),
+        ))
+
+        if return_item:
+            return KeyedItem.from_entry(self, e)
+
+    def change_value(self, object identifier, object value, *, bint return_item=True):
+        self._check_mutable()
+        cdef PriorityTail tail
+        cdef PriorityValue priority = to_priority_value(value, self._priority_layout, tail)
+        cdef Entry* e = self._entry_from_identifier(identifier)
+        e.tail.swap(tail)
+        self._heap[e.index].setValue(priority, preincrement(self._ts))
+        self._heap.fix(e.index)
+        if return_item:
+            return KeyedItem.from_entry(self, e)
+
+    def add_or_change_value(self, object key, object value, object data=None, *, bint return_item=True):
+        self._check_mutable()
+        cdef string string_key = stringify(key)
+        cdef PriorityTail tail
+        cdef PriorityValue priority = to_priority_value(value, self._priority_layout, tail)
+
+        # data is converted before the lookup map is accessed, as the
+        # conversion may execute arbitrary code. It is released again if the
+        # key is present.
+        cdef PayloadValue payload = to_payload(data, self._data_type)
+
+        cdef cpp_bool inserted = False
+        cdef Entry* e = findOrInsert(self._lookup_map, string_key, inserted)
+        if inserted:
+            self._init_entry(e, string_key, payload, tail)
+            self._heap.push(HeapEntry(
+                priority,
+                e,
+                preincrement(self._ts),
+            ))
+        else:
+            e.tail.swap(tail)
+            self._heap[e.index].setValue(priority, preincrement(self._ts))
+            self._heap.fix(e.index)
+            release_payload(payload, self._data_type)
+
+        if return_item:
+            return KeyedItem.from_entry(self, e)
+
+    def peek(self):
+        if self._heap.size() == 0:
+            raise IndexError("PQ is empty")
+
+        return KeyedItem.from_entry(self, self._heap.top().getData())
+
+    def pop(self):
+        self._check_mutable()
+        if self._heap.size() == 0:
+            raise IndexError("PQ is empty")
+
+        cdef HeapEntry heapEntry = self._heap.top()
+        cdef Entry* e = heapEntry.getData()
+
+        cdef object value = from_priority_value(heapEntry.getValue(), e.tail, self._priority_layout)
+        cdef string key = e.key
+        cdef object data = from_payload(e.data, self._data_type)
+        cdef PayloadValue payload = e.data
+
+        self._heap.pop()
+        self._erase_entry(e)
+        release_payload(payload, self._data_type)
+
+        return key.decode('utf8'), value, data
+
+    def pushpop(self, object key, object value, object data=None):
+        self._check_mutable()
+        cdef string string_key = stringify(key)
+        cdef PriorityTail tail
+        cdef PriorityValue priority = to_priority_value(value, self._priority_layout, tail)
+        cdef PayloadValue payload = to_payload(data, self._data_type)
+
+        if self._lookup_map.count(string_key) > 0:
+            release_payload(payload, self._data_type)
+            raise KeyError("Duplicate key: key already exists in PQ")
+
+        # The new entry is popped right away if it is ordered before the top
+        # entry. On ties the top entry is popped, as it is older.
+        cdef int res
+        if self._heap.size() > 0:
+            res = comparePriorities(self._priority_layout, priority, tail, self._heap.top().getValue(), self._heap.top().getData().tail)
+            if self._max_heap:
+                res = -res
+            if res >= 0:
+                return self._replace_top(string_key, priority, tail, payload)
+
+        cdef tuple result = (string_key.decode('utf8'), from_priority_value(priority, tail, self._priority_layout), from_payload(payload, self._data_type))
+        release_payload(payload, self._data_type)
+        return result
+
+    def replace_top(self, object key, object value, object data=None):
+        self._check_mutable()
+        cdef string string_key = stringify(key)
+        cdef PriorityTail tail
+        cdef PriorityValue priority = to_priority_value(value, self._priority_layout, tail)
+        cdef PayloadValue payload = to_payload(data, self._data_type)
+
+        if self._heap.size() == 0:
+            release_payload(payload, self._data_type)
+            raise IndexError("PQ is empty")
+
+        if string_key != self._heap.top().getData().key and self._lookup_map.count(string_key) > 0:
+            release_payload(payload, self._data_type)
+            raise KeyError("Duplicate key: key already exists in PQ")
+
+        return self._replace_top(string_key, priority, tail, payload)
+
+    cdef tuple _replace_top(self, string& key, PriorityValue priority, PriorityTail& tail, PayloadValue payload):
+        # Pops the top entry and pushes a new entry in a single sift down.
+        # The entry of the lookup map and its slot are reused for the new
+        # entry. key must not be present, except as the key of the top entry.
+        cdef Entry* e = self._heap.top().getData()
+        cdef tuple result = (
+            e.key.decode('utf8'),
+            from_priority_value(self._heap.top().getValue(), e.tail, self._priority_layout),
+            from_payload(e.data, self._data_type),
+        )
+        cdef PayloadValue old_payload = e.data
+        cdef string old_key
+
+        if key != e.key:
+            old_key = e.key
+            e = rekey(self._lookup_map, old_key, key)
+            e.key = key
+            self._slots[e.slot] = e
+
+        # Handles of the popped entry are invalidated by the new generation.
+        e.data = payload
+        e.tail.swap(tail)
+        e.item = NULL
+        e.generation = preincrement(self._generation)
+        self._heap.replaceTop(HeapEntry(
+            priority,
+            e,
+            preincrement(self._ts),
+        ))
+
+        release_payload(old_payload, self._data_type)
+        return result
+
+    def pop_many(self, object k=None, object until=None, bint inclusive=True, *, bint columns=False):
+        self._check_mutable()
+        cdef size_t limit = self._heap.size()
+        if k is not None:
+            k = operator.index(k)
+            if k < 0:
+                raise ValueError("k must be non-negative, not {}".format(k))
+            if k < limit:
+                limit = k
+
+        cdef PriorityTail until_tail
+        cdef PriorityValue until_value
+        if until is not None:
+            until_value = to_priority_value(until, self._priority_layout, until_tail)
+
+        # Entries are moved out of the PQ before any Python objects are
+        # created, ownership of the data objects is passed to the result.
+        cdef vector[string] keys
+        cdef vector[PriorityValue] values
+        cdef vector[PriorityTail] tails
+        cdef vector[PayloadValue] payloads
+        cdef bint composite = self._priority_layout.width > 1
+        cdef HeapEntry heap_entry
+        cdef Entry* e
+        keys.reserve(limit)
+        values.reserve(limit)
+        payloads.reserve(limit)
+        while keys.size() < limit:
+            heap_entry = self._heap.top()
+            e = heap_entry.getData()
+
+            if until is not None and not self._precedes(heap_entry, until_value, until_tail, inclusive):
+                break
+
+            keys.push_back(e.key)
+            values.push_back(heap_entry.getValue())
+            if composite:
+                tails.push_back(PriorityTail())
+                tails.back().swap(e.tail)
+            payloads.push_back(e.data)
+
+            self._heap.pop()
+            self._erase_entry(e)
+
+        return self._batch_result(keys, values, tails, payloads, self._priority_layout, columns)
+
+    def peek_many(self, Py_ssize_t k, *, bint columns=False):
+        if k < 0:
+            raise ValueError("k must be non-negative, not {}".format(k))
+
+        cdef vector[string] keys
+        cdef vector[PriorityValue] values
+        cdef vector[PriorityTail] tails
+        cdef vector[PayloadValue] payloads
+
+        # The ordered iterator visits the heap in O(k log k) using an
+        # auxiliary heap of the candidate indices.
+        cdef AnyBinHeap[HeapEntry].ordered_iterable iterable = self._heap.orderedIterable()
+        cdef AnyBinHeap[HeapEntry].ordered_iterator it = iterable.begin()
+        cdef AnyBinHeap[HeapEntry].ordered_iterator end = iterable.end()
+        while <Py_ssize_t>keys.size() < k and it != end:
+            self._copy_entry(dereference(it), keys, values, tails, payloads)
+            preincrement(it)
+
+        return self._batch_result(keys, values, tails, payloads, self._priority_layout, columns)
+
+    def iter_below(self, object threshold, bint inclusive=True, *, bint columns=False):
+        cdef PriorityTail threshold_tail
+        cdef PriorityValue threshold_value = to_priority_value(threshold, self._priority_layout, threshold_tail)
+
+        cdef vector[string] keys
+        cdef vector[PriorityValue] values
+        cdef vector[PriorityTail] tails
+        cdef vector[PayloadValue] payloads
+
+        # Depth-first traversal of the heap. If an entry does not precede
+        # threshold, neither does any entry of its subtree, so only the
+        # matching entries and their direct children are visited.
+        cdef vector[size_t] stack
+        cdef size_t size = self._heap.size()
+        cdef size_t i
+        if size > 0:
+            stack.push_back(0)
+        while not stack.empty():
+            i = stack.back()
+            stack.pop_back()
+            if not self._precedes(self._heap[i], threshold_value, threshold_tail, inclusive):
+                continue
+
+            self._copy_entry(self._heap[i], keys, values, tails, payloads)
+            if 2 * i + 2 < size:
+                stack.push_back(2 * i + 2)
+            if 2 * i + 1 < size:
+                stack.push_back(2 * i + 1)
+
+        return self._batch_result(keys, values, tails, payloads, self._priority_layout, columns)
+
+    def sorted_snapshot(self):
+        # All entries and the priority layout are copied before the GIL is
+        # released, the sort and the decoding of the priorities do not access
+        # the PQ, which may be modified concurrently.
+        cdef PriorityLayout layout = self._priority_layout
+        cdef size_t n = self._heap.size()
+        cdef vector[SnapshotEntry] entries
+        cdef vector[string] keys
+        cdef vector[PriorityValue] values
+        cdef vector[PriorityTail] tails
+        cdef vector[PayloadValue] payloads
+        cdef bint composite = self._priority_layout.width > 1
+        entries.resize(n)
+        keys.reserve(n)
+        payloads.reserve(n)
+
+        cdef size_t i
+        for i in range(n):
+            entries[i].value = self._heap[i].getValue()
+            entries[i].ts = self._heap[i].getChangeTS()
+            entries[i].index = i
+            self._copy_entry(self._heap[i], keys, values, tails, payloads)
+
+        with nogil:
+            sortSnapshot(entries, tails, layout, self._max_heap)
+            permuteSnapshot(entries, keys)
+            permuteSnapshot(entries, payloads)
+            if composite:
+                permuteSnapshot(entries, tails)
+            for i in range(n):
+                values[i] = entries[i].value
+
+        return self._batch_result(keys, values, tails, payloads, layout, True)
+
+    cdef inline void _fix_moved(self, size_t index, int res):
+        # Restores the heap invariant after the priority of the entry at index
+        # has been changed. res is the three-way comparison of the new and the
+        # previous priority. On ties the entry may only move down, as its
+        # change timestamp is new.
         if self._max_heap:
-            return lhs.maxHeapCompare(rhs)
+            res = -res
+        if res < 0:
+            self._heap.fixUp(index)
+        else:
+            self._heap.fixDown(index)
+
+    cdef inline bint _precedes(self, HeapEntry& entry, PriorityValue& value, PriorityTail& tail, bint inclusive):
+        # Returns whether entry is ordered before the priority (value, tail).
+        # Ties are resolved by inclusive.
+        cdef int res = comparePriorities(self._priority_layout, entry.getValue(), entry.getData().tail, value, tail)
+        if self._max_heap:
+            res = -res
+        return res < 0 or (res == 0 and inclusive)
+
+    cdef void _copy_entry(
+        self, HeapEntry& entry,
+        vector[string]& keys, vector[PriorityValue]& values,
+        vector[PriorityTail]& tails, vector[PayloadValue]& payloads,
+    ):
+        # Appends a copy of entry to the columns. The copied payload holds a
+        # new reference, which is passed on by _batch_result().
+        cdef Entry* e = entry.getData()
+        keys.push_back(e.key)
+        values.push_back(entry.getValue())
+        if self._priority_layout.width > 1:
+            tails.push_back(e.tail)
+        payloads.push_back(e.data)
+        if self._data_type == DATA_OBJECT:
+            Py_INCREF(<object>e.data.obj)
+
+    cdef object _batch_result(
+        self,
+        vector[string]& keys, vector[PriorityValue]& values,
+        vector[PriorityTail]& tails, vector[PayloadValue]& payloads,
+        PriorityLayout& layout, bint columns,
+    ):
+        # Builds the result of a batch operation from entries which have been
+        # copied or moved out of the PQ. The priorities are decoded with
+        # layout. The references held by payloads are released.
+        cdef Py_ssize_t n = keys.size()
+        cdef Py_ssize_t i
+        cdef list key_list = [None] * n
+        cdef list data_list = [None] * n
+        cdef object priorities
+        try:
+            for i in range(n):
+                key_list[i] = keys[i].decode('utf8')
+                if self._data_type != DATA_NONE:
+                    data_list[i] = from_payload(payloads[i], self._data_type)
+
+            priorities = self._priorities_column(values, tails, layout)
+        finally:
+            release_payloads(payloads, self._data_type)
+
+        if columns:
+            return key_list, priorities, data_list
+        return list(zip(key_list, priorities, data_list))
+
+    cdef object _priorities_column(self, vector[PriorityValue]& values, vector[PriorityTail]& tails, PriorityLayout& layout):
+        # Returns an array.array of scalar priorities or a list of composite
+        # priorities, decoded with layout.
+        cdef Py_ssize_t n = values.size()
+        cdef Py_ssize_t i
+        cdef list l
+        if layout.width > 1:
+            l = [None] * n
+            for i in range(n):
+                l[i] = from_priority_value(values[i], tails[i], layout)
+            return l
+
+        return scalar_priorities_array(values, layout)
+
+    def ordered_iter(self):
+        # The iterators are locals of the generator. A for loop keeps the
+        # iterator in a temporary, which is copied on every yield, copying
+        # the auxiliary heap of the ordered iterator.
+        cdef AnyBinHeap[HeapEntry].ordered_iterable iterable = self._heap.orderedIterable()
+        cdef AnyBinHeap[HeapEntry].ordered_iterator it = iterable.begin()
+        cdef AnyBinHeap[HeapEntry].ordered_iterator end = iterable.end()
+        cdef Entry* e
+        while it != end:
+            e = dereference(it).getData()
+            preincrement(it)
+            yield KeyedItem.from_entry(self, e)
+
+    cdef Py_ssize_t _convert_many(
+        self, object keys, object priorities, object data,
+        vector[string]& string_keys, vector[PriorityValue]& values,
+        vector[PriorityTail]& tails, vector[PayloadValue]& payloads,
+        bint deltas=False,
+    ) except -1:
+        # Converts the arguments of a batch operation. All arguments are
+        # converted before the PQ is modified, as the conversion may execute
+        # arbitrary code accessing the PQ. The caller must release payloads.
+        # If deltas is true, priorities are converted as differences.
+
+        cdef Py_ssize_t n = len(keys)
+        if len(priorities) != n:
+            raise ValueError("priorities must have the same length as keys, {} != {}".format(len(priorities), n))
+        if data is not None and len(data) != n:
+            raise ValueError("data must have the same length as keys, {} != {}".format(len(data), n))
+
+        self._convert_priorities(priorities, n, values, tails, deltas)
+
+        cdef Py_ssize_t i
+        string_keys.reserve(n)
+        for i in range(n):
+            string_keys.push_back(stringify(keys[i]))
+
+        payloads.reserve(n)
+        try:
+            for i in range(n):
+                payloads.push_back(to_payload(None if data is None else data[i], self._data_type))
+            # The conversion may have exported a view.
+            self._check_mutable()
+        except:
+            release_payloads(payloads, self._data_type)
+            payloads.clear()
+            raise
+
+        return n
+
+    cdef int _convert_priorities(
+        self, object priorities, Py_ssize_t n,
+        vector[PriorityValue]& values, vector[PriorityTail]& tails,
+        bint deltas=False,
+    ) except -1:
+        # Converts n priorities, which have already been checked to have
+        # length n, and encodes them for the current transform.
+        cdef Py_ssize_t i
+        tails.resize(n)
+        if self._priority_layout.width > 1:
+            values.resize(n)
+            for i in range(n):
+                values[i] = to_priority_value(priorities[i], self._priority_layout, tails[i])
+            return 0
+
+        if not read_priority_buffer(priorities, self._priority_layout.types[0], values):
+            values.resize(n)
+            for i in range(n):
+                values[i] = to_priority(priorities[i], self._priority_layout.types[0])
+
+        if deltas:
+            if self._priority_layout.scale != 1:
+                for i in range(n):
+                    values[i] = encodePriorityDelta(self._priority_layout, values[i])
+        elif self._priority_layout.offset != 0 or self._priority_layout.scale != 1:
+            for i in range(n):
+                values[i] = encodePriority(self._priority_layout, values[i])
+        return 0
+
+    cdef void _clear(self) except *:
+        # Data objects are collected from the heap container, which is
+        # contiguous and thus considerably faster to iterate than the nodes of
+        # the lookup map. All entries are moved out of the PQ before the
+        # objects are released, as releasing objects may execute arbitrary
+        # code accessing the PQ.
+        cdef vector[PyObject*] objects
+        cdef AnyBinHeap[HeapEntry].iterator it
+        if self._data_type == DATA_OBJECT:
+            objects.reserve(self._heap.size())
+            it = self._heap.begin()
+            while it != self._heap.end():
+                objects.push_back(dereference(it).getData().data.obj)
+                preincrement(it)
+
+        cdef unordered_map[string, Entry] lookup_map
+        lookup_map.swap(self._lookup_map)
+        self._heap.clear()
+        self._slots.clear()
+        self._free_slots.clear()
+        self._reset_transform()
+
+        cdef size_t i
+        for i in range(objects.size()):
+            Py_XDECREF(objects[i])
+
+    cdef void _discard_entries(self, vector[HeapEntry]& container):
+        # Removes the entries of container, which have been inserted into the
+        # lookup map but not pushed onto the heap. Payloads are not released.
+        cdef size_t i
+        for i in range(container.size()):
+            self._erase_entry(container[i].getData())
+        container.clear()
+
+    cdef void _release_lookup_map(self):
+        # Releases all entries of the lookup map, regardless of whether they
+        # have been pushed onto the heap.
+        cdef unordered_map[string, Entry] lookup_map
+        lookup_map.swap(self._lookup_map)
+        self._slots.clear()
+        self._free_slots.clear()
+
+        cdef unordered_map[string, Entry].iterator it = lookup_map.begin()
+        while it != lookup_map.end():
+            release_payload(dereference(it).second.data, self._data_type)
+            preincrement(it)
+
+    cdef int _traverse_payloads(self, visitproc visit, void* arg):
+        if self._data_type != DATA_OBJECT:
+            return 0
+
+        cdef int res
+        cdef AnyBinHeap[HeapEntry].iterator heap_it
+        cdef unordered_map[string, Entry].iterator map_it
+
+        if self._heap.size() == self._lookup_map.size():
+            heap_it = self._heap.begin()
+            while heap_it != self._heap.end():
+                res = visit(dereference(heap_it).getData().data.obj, arg)
+                if res != 0:
+                    return res
+                preincrement(heap_it)
+        else:
+            # The PQ is being initialised, entries are only accessible via the
+            # lookup map.
+            map_it = self._lookup_map.begin()
+            while map_it != self._lookup_map.end():
+                res = visit(dereference(map_it).second.data.obj, arg)
+                if res != 0:
+                    return res
+                preincrement(map_it)
+
+        return 0
+
+    cdef Entry* _insert_entry(self, string& key, PayloadValue payload, PriorityTail& tail) except NULL:
+        # Inserts a new entry into the lookup map and assigns it a slot. The
+        # entry is not pushed onto the heap.
+        cdef Entry* e = &self._lookup_map[key]
+        self._init_entry(e, key, payload, tail)
+        return e
+
+    cdef void _init_entry(self, Entry* e, string& key, PayloadValue payload, PriorityTail& tail):
+        # Initialises an entry which has just been inserted into the lookup
+        # map and assigns it a slot.
+        e.key = key
+        e.data = payload
+        e.tail.swap(tail)
+        e.item = NULL
+        self._assign_slot(e)
+
+    cdef void _assign_slot(self, Entry* e):
+        # Assigns a slot and a new generation to an entry of the lookup map.
+        if self._free_slots.empty():
+            e.slot = self._slots.size()
+            self._slots.push_back(e)
         else:
-            return lhs.minHeapCompare(rhs)
+            e.slot = self._free_slots.back()
+            self._free_slots.pop_back()
+            self._slots[e.slot] = e
+        e.generation = preincrement(self._generation)
+
+    cdef void _erase_entry(self, Entry* e):
+        # Removes an entry from the lookup map and frees its slot. The entry
+        # must have already been removed from the heap.
+        self._free_slot(e)
+        self._lookup_map.erase(e.key)
+
+    cdef inline void _free_slot(self, Entry* e):
+        self._slots[e.slot] = NULL
+        self._free_slots.push_back(e.slot)
+
+    cdef inline Entry* _entry_from_slot(self, size_t slot, uint64_t generation):
+        # Returns NULL if the slot does not reference the entry of generation.
+        if slot >= self._slots.size():
+            return NULL
+        cdef Entry* e = self._slots[slot]
+        if e is NULL or e.generation != generation:
+            return NULL
+        return e
+
+    cdef Entry* _find(self, string& key):
+        # Returns NULL if key is not present.
+        cdef unordered_map[string, Entry].iterator it = self._lookup_map.find(key)
+        if it == self._lookup_map.end():
+            return NULL
+        return &dereference(it).second
+
+    cdef Entry* _find_identifier(self, object identifier) except? NULL:
+        # Returns NULL if identifier does not reference an entry of the PQ.
+        # Raises TypeError if identifier is neither a KeyedItem nor a key.
+        cdef KeyedItem item
+        if type(identifier) is KeyedItem:
+            item = <KeyedItem>identifier
+            if item._pq is not self:
+                return NULL
+            return self._entry_from_slot(item._slot, item._generation)
+
+        return self._find(stringify(identifier))
+
+    cdef Entry* _entry_from_identifier(self, object identifier) except *:
+        cdef Entry* e
+        cdef KeyedItem item
+        if type(identifier) is KeyedItem:
+            item = <KeyedItem>identifier
+            if item._pq is None:
+                raise KeyError("Passed identifier (of type KeyedItem) does not reference a PQ entry")
+            if item._pq is not self:
+                raise KeyError("Passed identifier (of type KeyedItem) is not known to the PQ")
+            e = self._entry_from_slot(item._slot, item._generation)
+            if e is NULL:
+                raise KeyError("Passed identifier (of type KeyedItem) is not known to the PQ")
+            return e
+
+        e = self._find(stringify(identifier))
+        if e is NULL:
+            raise KeyError(identifier)
+        return e
+
+    def _export(self):
+        l = []
+
+        cdef HeapEntry entry
+        for entry in self._heap:
+            l.append(from_priority_value(entry.getValue(), entry.getData().tail, self._priority_layout))
+
+        return l
+
+    def _verify_invariants(self):
+        if self._heap.size() != self._lookup_map.size():
+            # heap and lookup map don't have the same size
+            return False
+
+        if self._slots.size() - self._free_slots.size() != self._lookup_map.size():
+            # number of occupied slots differs from the number of entries
+            return False
+
+        cdef Entry* e
+        cdef AnyBinHeap[HeapEntry].size_type i, left_child_ind, right_child_ind
+        cdef AnyBinHeap[HeapEntry].iterator begin_it, end_it, it
+
+        begin_it = self._heap.begin()
+        end_it = self._heap.end()
+        it = begin_it
+        while it != end_it:
+            e = dereference(it).getData()
+            i = it - begin_it
+            if e.index != i:
+                # wrong index is stored in the entry
+                return False
+
+            if &self._lookup_map[e.key] != e:
+                # key is not mapped to entry
+                return False
+
+            if e.slot >= self._slots.size() or self._slots[e.slot] != e:
+                # slot does not reference entry
+                return False
+
+            left_child_ind = 2 * i + 1
+            right_child_ind = left_child_ind + 1
+            if left_child_ind < self._heap.size() and self._heap.compareValues(self._heap[left_child_ind], dereference(it)):
+                    # left child is less than parent
+                    return False
+            if right_child_ind < self._heap.size() and self._heap.compareValues(self._heap[right_child_ind], dereference(it)):
+                    # right child is less than parent
+                    return False
+
+            preincrement(it)
+
+        return True
+
+
+# Cython only visits the object attributes of KeyedPQ in the GC slots it
+# generates. The slots are wrapped to additionally visit and clear the data
+# objects stored in the PQ, allowing reference cycles through data objects to
+# be collected.
+
+cdef traverseproc _keyedpq_base_traverse = (<PyTypeObject*>KeyedPQ).tp_traverse
+cdef inquiry _keyedpq_base_clear = (<PyTypeObject*>KeyedPQ).tp_clear
+
+
+cdef int _keyedpq_traverse(PyObject* o, visitproc visit, void* arg):
+    cdef int res = _keyedpq_base_traverse(o, visit, arg)
+    if res != 0:
+        return res
+    return (<KeyedPQ>o)._traverse_payloads(visit, arg)
+
+
+cdef int _keyedpq_clear(PyObject* o):
+    (<KeyedPQ>o)._clear()
+    return _keyedpq_base_clear(o)
+
+
+(<PyTypeObject*>KeyedPQ).tp_traverse = _keyedpq_traverse
+(<PyTypeObject*>KeyedPQ).tp_clear = _keyedpq_clear
+
+
+# The views returned by KeyedPQ.keys(), values() and items(). The base
+# classes implement membership tests and len() through the PQ in O(1),
+# except for ValuesView.__contains__.
+
+class _KeysView(KeysView):
+    __slots__ = ()
+
+    def __contains__(self, key):
+        return isinstance(key, str) and key in self._mapping
+
+
+class _ValuesView(ValuesView):
+    __slots__ = ()
+
+    def __contains__(self, value):
+        return (type(value) is KeyedItem or type(value) is ObjectItem) and value in self._mapping
+
+    def __iter__(self):
+        return self._mapping._iter_values()
+
+
+class _ItemsView(ItemsView):
+    __slots__ = ()
+
+    def __iter__(self):
+        return self._mapping._iter_items()
+
+
+Mapping.register(KeyedPQ)
+
+
+cdef enum HeapColumn:
+    COLUMN_PRIORITY
+    COLUMN_TIMESTAMP
+
+
+# _HeapColumn exports a column of the heap container of a KeyedPQ as a
+# strided, read-only buffer, without copying. The container may be
+# reallocated by any modification, so the PQ refuses to be modified while
+# there are exports. Exports are released with the memoryview.
+@cython.final
+cdef class _HeapColumn:
+    cdef KeyedPQ _pq
+    cdef HeapColumn _column
+    cdef Py_ssize_t _shape
+    cdef Py_ssize_t _stride
+
+    def __cinit__(self, KeyedPQ pq, HeapColumn column):
+        self._pq = pq
+        self._column = column
+
+    def __getbuffer__(self, Py_buffer* buffer, int flags):
+        if flags & PyBUF_WRITABLE:
+            raise BufferError("heap columns are read-only")
+        if not flags & PyBUF_STRIDES:
+            raise BufferError("heap columns are not contiguous")
+
+        cdef KeyedPQ pq = self._pq
+        cdef HeapEntry* first = &_empty_heap_entry
+        if pq._heap.size() > 0:
+            first = &pq._heap[0]
+
+        cdef PriorityType priority_type = pq._priority_layout.types[0]
+        if self._column == COLUMN_TIMESTAMP:
+            buffer.buf = <void*>first.changeTSPtr()
+            buffer.itemsize = sizeof(size_t)
+            buffer.format = b'Q' if sizeof(size_t) == 8 else b'I'
+        else:
+            buffer.buf = <void*>first.valuePtr()
+            if priority_type == PRIORITY_INT64:
+                buffer.itemsize = sizeof(int64_t)
+                buffer.format = b'q'
+            elif priority_type == PRIORITY_FLOAT32:
+                buffer.itemsize = sizeof(float)
+                buffer.format = b'f'
+            else:
+                buffer.itemsize = sizeof(double)
+                buffer.format = b'd'
+        if not flags & PyBUF_FORMAT:
+            buffer.format = NULL
+
+        self._shape = pq._heap.size()
+        self._stride = sizeof(HeapEntry)
+        buffer.obj = self
+        buffer.len = self._shape * buffer.itemsize
+        buffer.readonly = 1
+        buffer.ndim = 1
+        buffer.shape = &self._shape
+        buffer.strides = &self._stride
+        buffer.suboffsets = NULL
+        buffer.internal = NULL
+        pq._exports += 1
+
+    def __releasebuffer__(self, Py_buffer* buffer):
+        self._pq._exports -= 1
+
+
+cdef class SimplePQ:
+    cdef AnyBinHeap[SimpleHeapEntry] _heap
+    cdef unsigned long long int _ts
+    cdef bint _max_heap
+    cdef PriorityLayout _priority_layout
+    cdef DataType _data_type
+    # As for KeyedPQ, priority_type causes Cython to generate the GC slots,
+    # see _simplepq_traverse() and _simplepq_clear().
+    cdef readonly object priority_type
+
+    def __cinit__(self, *iterables, bint max_heap=False, object priority_type='float64', str data_type='object'):
+        cdef vector[SimpleHeapEntry] container
+        self._init_heap(container)
+
+        if len(iterables) > 1:
+            raise TypeError("SimplePQ accepts at most 1 non-keyword argument, {} given".format(len(iterables)))
+
+        self._priority_layout = parse_priority_layout(priority_type)
+        if self._priority_layout.width > 1:
+            raise ValueError("SimplePQ does not support composite priorities")
+        self.priority_type = priority_layout_name(self._priority_layout)
+
+        if data_type not in _data_types:
+            raise ValueError("Unknown data_type {!r}, must be one of {}".format(
+                data_type, ', '.join(_data_types),
+            ))
+        self._data_type = _data_types[data_type]
+
+        cdef PriorityValue value
+        cdef PayloadValue payload
+        if len(iterables) == 1:
+            try:
+                for element in iterables[0]:
+                    if len(element) != 2:
+                        raise ValueError("element in initialisation iterable must have length 2, has length {}".format(len(element)))
+                    value = to_priority(element[0], self._priority_layout.types[0])
+                    payload = to_payload(element[1], self._data_type)
+                    container.push_back(SimpleHeapEntry(value, payload, preincrement(self._ts)))
+            except:
+                self._release_container(container)
+                raise
+
+        self._max_heap = max_heap
+        self._init_heap(container)
+
+    def __dealloc__(self):
+        self._clear()
+
+    cdef _init_heap(self, vector[SimpleHeapEntry]& container):
+        initScalarPriorityHeap[SimpleHeapEntry](self._heap, self._priority_layout, self._max_heap, container)
+
+    def __len__(self):
+        return self._heap.size()
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self._heap.size() * sizeof(SimpleHeapEntry)
+
+    @property
+    def data_type(self):
+        for name, data_type in _data_types.items():
+            if data_type == self._data_type:
+                return name
+
+    def add(self, object value, object data=None):
+        cdef PriorityValue priority = to_priority(value, self._priority_layout.types[0])
+        cdef PayloadValue payload = to_payload(data, self._data_type)
+        self._heap.push(SimpleHeapEntry(priority, payload, preincrement(self._ts)))
+
+    def add_many(self, object priorities, object data=None):
+        cdef Py_ssize_t n = len(priorities)
+        if data is not None and len(data) != n:
+            raise ValueError("data must have the same length as priorities, {} != {}".format(len(data), n))
+
+        cdef PriorityType priority_type = self._priority_layout.types[0]
+        cdef vector[PriorityValue] values
+        cdef Py_ssize_t i
+        if not read_priority_buffer(priorities, priority_type, values):
+            values.resize(n)
+            for i in range(n):
+                values[i] = to_priority(priorities[i], priority_type)
+
+        cdef vector[SimpleHeapEntry] container
+        container.reserve(n)
+        try:
+            for i in range(n):
+                container.push_back(SimpleHeapEntry(
+                    values[i],
+                    to_payload(None if data is None else data[i], self._data_type),
+                    preincrement(self._ts),
+                ))
+        except:
+            self._release_container(container)
+            raise
+
+        self._heap.extend(container.data(), container.data() + container.size())
+
+    def peek(self):
+        if self._heap.size() == 0:
+            raise IndexError("PQ is empty")
+
+        cdef SimpleHeapEntry heap_entry = self._heap.top()
+        return (
+            from_priority(heap_entry.getValue(), self._priority_layout.types[0]),
+            from_payload(heap_entry.getData(), self._data_type),
+        )
+
+    def pop(self):
+        if self._heap.size() == 0:
+            raise IndexError("PQ is empty")
+
+        cdef SimpleHeapEntry heap_entry = self._heap.top()
+        cdef object value = from_priority(heap_entry.getValue(), self._priority_layout.types[0])
+        cdef object data = from_payload(heap_entry.getData(), self._data_type)
+
+        self._heap.pop()
+        release_payload(heap_entry.getData(), self._data_type)
+
+        return value, data
+
+    def pop_many(self, object k=None, object until=None, bint inclusive=True, *, bint columns=False):
+        cdef size_t limit = self._heap.size()
+        if k is not None:
+            k = operator.index(k)
+            if k < 0:
+                raise ValueError("k must be non-negative, not {}".format(k))
+            if k < limit:
+                limit = k
+
+        cdef PriorityType priority_type = self._priority_layout.types[0]
+        cdef PriorityValue until_value
+        if until is not None:
+            until_value = to_priority(until, priority_type)
+
+        # As in KeyedPQ.pop_many(), entries are moved out of the PQ before
+        # any Python objects are created.
+        cdef vector[PriorityValue] values
+        cdef vector[PayloadValue] payloads
+        cdef SimpleHeapEntry heap_entry
+        cdef int res
+        values.reserve(limit)
+        payloads.reserve(limit)
+        while values.size() < limit:
+            heap_entry = self._heap.top()
+
+            if until is not None:
+                res = comparePriorityValues(priority_type, heap_entry.getValue(), until_value)
+                if self._max_heap:
+                    res = -res
+                if res > 0 or (res == 0 and not inclusive):
+                    break
+
+            values.push_back(heap_entry.getValue())
+            payloads.push_back(heap_entry.getData())
+            self._heap.pop()
+
+        cdef Py_ssize_t n = values.size()
+        cdef list data_list = [None] * n
+        cdef object priorities
+        cdef Py_ssize_t i
+        try:
+            if self._data_type != DATA_NONE:
+                for i in range(n):
+                    data_list[i] = from_payload(payloads[i], self._data_type)
+
+            priorities = scalar_priorities_array(values, self._priority_layout)
+        finally:
+            release_payloads(payloads, self._data_type)
+
+        if columns:
+            return priorities, data_list
+        return list(zip(priorities, data_list))
+
+    def clear(self):
+        self._clear()
+
+    cdef void _clear(self) except *:
+        # As in KeyedPQ._clear(), all entries are moved out of the PQ before
+        # the data objects are released.
+        cdef vector[SimpleHeapEntry] container
+        cdef AnyBinHeap[SimpleHeapEntry].iterator it = self._heap.begin()
+        container.reserve(self._heap.size())
+        while it != self._heap.end():
+            container.push_back(dereference(it))
+            preincrement(it)
+
+        self._heap.clear()
+        self._release_container(container)
+
+    cdef void _release_container(self, vector[SimpleHeapEntry]& container):
+        cdef size_t i
+        if self._data_type == DATA_OBJECT:
+            for i in range(container.size()):
+                Py_XDECREF(container[i].getData().obj)
+        container.clear()
+
+    cdef int _traverse_payloads(self, visitproc visit, void* arg):
+        if self._data_type != DATA_OBJECT:
+            return 0
+
+        cdef int res
+        cdef AnyBinHeap[SimpleHeapEntry].iterator it = self._heap.begin()
+        while it != self._heap.end():
+            res = visit(dereference(it).getData().obj, arg)
+            if res != 0:
+                return res
+            preincrement(it)
+        return 0
+
+    def _verify_invariants(self):
+        cdef size_t i
+        for i in range(1, self._heap.size()):
+            if self._heap.compareValues(self._heap[i], self._heap[(i - 1) // 2]):
+                # child is less than parent
+                return False
+        return True
+
+
+cdef traverseproc _simplepq_base_traverse = (<PyTypeObject*>SimplePQ).tp_traverse
+cdef inquiry _simplepq_base_clear = (<PyTypeObject*>SimplePQ).tp_clear
+
+
+cdef int _simplepq_traverse(PyObject* o, visitproc visit, void* arg):
+    cdef int res = _simplepq_base_traverse(o, visit, arg)
+    if res != 0:
+        return res
+    return (<SimplePQ>o)._traverse_payloads(visit, arg)
+
+
+cdef int _simplepq_clear(PyObject* o):
+    (<SimplePQ>o)._clear()
+    return _simplepq_base_clear(o)
+
+
+(<PyTypeObject*>SimplePQ).tp_traverse = _simplepq_traverse
+(<PyTypeObject*>SimplePQ).tp_clear = _simplepq_clear
+
+
+cdef extern from * nogil:
+    """
+    // AddressablePayload is the entry of an AddressablePQ. It corresponds to
+    // APQPayload without the key, as entries are only addressed by slot.
+    template<class T>
+    class AddressablePayload {
+    public:
+        std::size_t index;
+        T data;
+        PriorityTail tail;
+        std::size_t slot;
+        std::uint64_t generation;
+        PyObject* item;
+
+        void setIndex(std::size_t index) {
+            this->index = index;
+        }
+    };
+
+    template<class T>
+    class DefaultSetIndex<AddressablePayload<T>*> {
+    public:
+        void operator()(AddressablePayload<T>* el, std::size_t index) const {
+            el->setIndex(index);
+        }
+    };
+    """
+
+    cdef cppclass AddressablePayload[T]:
+        size_t index
+        T data
+        PriorityTail tail
+        size_t slot
+        uint64_t generation
+        PyObject* item
+
+
+ctypedef AddressablePayload[PayloadValue] AddressableEntry
+ctypedef AddressableEntry* AddressableEntryPointer
+ctypedef StandardEntry[AddressableEntryPointer, PriorityValue] AddressableHeapEntry
+
+
+cdef class AddressablePQ
+
+
+# Item is the handle of an entry of an AddressablePQ and works like KeyedItem.
+@cython.no_gc_clear
+@cython.freelist(32)
+cdef class Item:
+    cdef AddressablePQ _pq
+    cdef size_t _slot
+    cdef uint64_t _generation
+
+    def __dealloc__(self):
+        cdef AddressableEntry* e
+        if self._pq is not None:
+            e = self._pq._entry_from_slot(self._slot, self._generation)
+            if e is not NULL and e.item == <PyObject*>self:
+                e.item = NULL
+
+    @property
+    def value(self):
+        cdef AddressableEntry* e = self._entry()
+        return from_priority_value(self._pq._heap[e.index].getValue(), e.tail, self._pq._priority_layout)
+
+    @property
+    def data(self):
+        return from_payload(self._entry().data, self._pq._data_type)
+
+    def __eq__(self, object other):
+        cdef Item otherItem
+        if isinstance(other, Item):
+            otherItem = <Item>other
+            return (
+                self._pq is otherItem._pq and
+                self._slot == otherItem._slot and
+                self._generation == otherItem._generation
+            )
+
+        return NotImplemented
+
+    def __ne__(self, object other):
+        cdef object res = self.__eq__(other)
+        if res is NotImplemented:
+            return NotImplemented
+        return not res
+
+    cdef AddressableEntry* _entry(self) except NULL:
+        if self._pq is None:
+            raise KeyError("Item does not reference a PQ entry")
+
+        cdef AddressableEntry* e = self._pq._entry_from_slot(self._slot, self._generation)
+        if e is NULL:
+            raise KeyError("Item references an entry which has been removed from the PQ")
+        return e
+
+    @staticmethod
+    cdef Item from_entry(AddressablePQ pq, AddressableEntry* e):
+        if e.item is not NULL:
+            return <Item>e.item
+
+        cdef Item i = Item.__new__(Item)
+        i._pq = pq
+        i._slot = e.slot
+        i._generation = e.generation
+        e.item = <PyObject*>i
+        return i
+
+
+cdef class AddressablePQ:
+    cdef AnyBinHeap[AddressableHeapEntry] _heap
+    # Entries are stored by slot. A deque never moves its elements, so the
+    # heap may point to them. Free slots have generation 0.
+    cdef deque[AddressableEntry] _entries
+    cdef vector[size_t] _free_slots
+    cdef uint64_t _generation
+    cdef unsigned long long int _ts
+    cdef bint _max_heap
+    cdef PriorityLayout _priority_layout
+    cdef DataType _data_type
+    # As for KeyedPQ, priority_type causes Cython to generate the GC slots,
+    # see _addressablepq_traverse() and _addressablepq_clear().
+    cdef readonly object priority_type
+
+    def __cinit__(self, *iterables, bint max_heap=False, object priority_type='float64', str data_type='object'):
+        cdef vector[AddressableHeapEntry] container
+        self._init_heap(container)
+
+        if len(iterables) > 1:
+            raise TypeError("AddressablePQ accepts at most 1 non-keyword argument, {} given".format(len(iterables)))
+
+        self._priority_layout = parse_priority_layout(priority_type)
+        self.priority_type = priority_layout_name(self._priority_layout)
+
+        if data_type not in _data_types:
+            raise ValueError("Unknown data_type {!r}, must be one of {}".format(
+                data_type, ', '.join(_data_types),
+            ))
+        self._data_type = _data_types[data_type]
+
+        cdef PriorityTail tail
+        cdef PriorityValue value
+        cdef PayloadValue payload
+        if len(iterables) == 1:
+            try:
+                for element in iterables[0]:
+                    if len(element) != 2:
+                        raise ValueError("element in initialisation iterable must have length 2, has length {}".format(len(element)))
+                    value = to_priority_value(element[0], self._priority_layout, tail)
+                    payload = to_payload(element[1], self._data_type)
+                    container.push_back(AddressableHeapEntry(value, self._insert_entry(payload, tail), preincrement(self._ts)))
+            except:
+                self._release_entries()
+                raise
+
+        self._max_heap = max_heap
+        self._init_heap(container)
+
+    def __dealloc__(self):
+        self._clear()
+
+    cdef _init_heap(self, vector[AddressableHeapEntry]& container):
+        initPriorityHeap[AddressableHeapEntry](self._heap, self._priority_layout, self._max_heap, container)
+
+    def __len__(self):
+        return self._heap.size()
+
+    def __sizeof__(self):
+        return (
+            object.__sizeof__(self) +
+            self._heap.size() * sizeof(AddressableHeapEntry) +
+            self._entries.size() * sizeof(AddressableEntry) +
+            self._free_slots.capacity() * sizeof(size_t)
+        )
+
+    @property
+    def data_type(self):
+        for name, data_type in _data_types.items():
+            if data_type == self._data_type:
+                return name
+
+    def __contains__(self, object item):
+        return type(item) is Item and (<Item>item)._pq is self and self._entry_from_slot((<Item>item)._slot, (<Item>item)._generation) is not NULL
+
+    def add(self, object value, object data=None):
+        cdef PriorityTail tail
+        cdef PriorityValue priority = to_priority_value(value, self._priority_layout, tail)
+        cdef PayloadValue payload = to_payload(data, self._data_type)
+        cdef AddressableEntry* e = self._insert_entry(payload, tail)
+        self._heap.push(AddressableHeapEntry(priority, e, preincrement(self._ts)))
+        return Item.from_entry(self, e)
+
+    def change_value(self, Item item not None, object value):
+        cdef PriorityTail tail
+        cdef PriorityValue priority = to_priority_value(value, self._priority_layout, tail)
+        cdef AddressableEntry* e = self._entry_from_item(item)
+        e.tail.swap(tail)
+        self._heap[e.index].setValue(priority, preincrement(self._ts))
+        self._heap.fix(e.index)
+
+    def remove(self, Item item not None):
+        cdef AddressableEntry* e = self._entry_from_item(item)
+        cdef PayloadValue payload = e.data
+        self._heap.remove(e.index)
+        self._erase_entry(e)
+        release_payload(payload, self._data_type)
+
+    def peek(self):
+        if self._heap.size() == 0:
+            raise IndexError("PQ is empty")
+
+        return Item.from_entry(self, self._heap.top().getData())
+
+    def pop(self):
+        if self._heap.size() == 0:
+            raise IndexError("PQ is empty")
+
+        cdef AddressableHeapEntry heap_entry = self._heap.top()
+        cdef AddressableEntry* e = heap_entry.getData()
+        cdef object value = from_priority_value(heap_entry.getValue(), e.tail, self._priority_layout)
+        cdef object data = from_payload(e.data, self._data_type)
+        cdef PayloadValue payload = e.data
+
+        self._heap.pop()
+        self._erase_entry(e)
+        release_payload(payload, self._data_type)
+
+        return value, data
+
+    def clear(self):
+        self._clear()
+
+    cdef AddressableEntry* _insert_entry(self, PayloadValue payload, PriorityTail& tail) except NULL:
+        # Stores a new entry in a free slot. The entry is not pushed onto the
+        # heap.
+        cdef AddressableEntry* e
+        if self._free_slots.empty():
+            self._entries.resize(self._entries.size() + 1)
+            e = &self._entries.back()
+            e.slot = self._entries.size() - 1
+        else:
+            e = &self._entries[self._free_slots.back()]
+            self._free_slots.pop_back()
+        e.data = payload
+        e.tail.swap(tail)
+        e.item = NULL
+        e.generation = preincrement(self._generation)
+        return e
+
+    cdef void _erase_entry(self, AddressableEntry* e):
+        # Frees the slot of an entry, which must have already been removed
+        # from the heap. The payload is not released.
+        e.generation = 0
+        e.item = NULL
+        e.tail = PriorityTail()
+        self._free_slots.push_back(e.slot)
+
+    cdef inline AddressableEntry* _entry_from_slot(self, size_t slot, uint64_t generation):
+        # Returns NULL if the slot does not reference the entry of generation.
+        if slot >= self._entries.size() or generation == 0:
+            return NULL
+        cdef AddressableEntry* e = &self._entries[slot]
+        if e.generation != generation:
+            return NULL
+        return e
+
+    cdef AddressableEntry* _entry_from_item(self, Item item) except NULL:
+        if item._pq is not self:
+            raise KeyError("Passed item is not known to the PQ")
+        cdef AddressableEntry* e = self._entry_from_slot(item._slot, item._generation)
+        if e is NULL:
+            raise KeyError("Passed item references an entry which has been removed from the PQ")
+        return e
+
+    cdef void _clear(self) except *:
+        # As in KeyedPQ._clear(), all entries are moved out of the PQ before
+        # the data objects are released.
+        cdef vector[PyObject*] objects
+        cdef AnyBinHeap[AddressableHeapEntry].iterator it
+        if self._data_type == DATA_OBJECT:
+            objects.reserve(self._heap.size())
+            it = self._heap.begin()
+            while it != self._heap.end():
+                objects.push_back(dereference(it).getData().data.obj)
+                preincrement(it)
+
+        cdef deque[AddressableEntry] entries
+        entries.swap(self._entries)
+        self._heap.clear()
+        self._free_slots.clear()
+
+        cdef size_t i
+        for i in range(objects.size()):
+            Py_XDECREF(objects[i])
+
+    cdef void _release_entries(self):
+        # Releases all entries, regardless of whether they have been pushed
+        # onto the heap.
+        cdef deque[AddressableEntry] entries
+        entries.swap(self._entries)
+        self._free_slots.clear()
+
+        cdef size_t i
+        for i in range(entries.size()):
+            if entries[i].generation != 0:
+                release_payload(entries[i].data, self._data_type)
+
+    cdef int _traverse_payloads(self, visitproc visit, void* arg):
+        if self._data_type != DATA_OBJECT:
+            return 0
+
+        # During initialisation, entries are not yet on the heap.
+        cdef int res
+        cdef size_t i
+        for i in range(self._entries.size()):
+            if self._entries[i].generation != 0:
+                res = visit(self._entries[i].data.obj, arg)
+                if res != 0:
+                    return res
+        return 0
+
+    def _verify_invariants(self):
+        if self._heap.size() + self._free_slots.size() != self._entries.size():
+            # number of occupied slots differs from the number of entries
+            return False
+
+        cdef AddressableEntry* e
+        cdef size_t i
+        for i in range(self._heap.size()):
+            e = self._heap[i].getData()
+            if e.index != i:
+                # wrong index is stored in the entry
+                return False
+            if e.generation == 0 or &self._entries[e.slot] != e:
+                # slot does not reference entry
+                return False
+            if i > 0 and self._heap.compareValues(self._heap[i], self._heap[(i - 1) // 2]):
+                # child is less than parent
+                return False
+        return True
+
+
+cdef traverseproc _addressablepq_base_traverse = (<PyTypeObject*>AddressablePQ).tp_traverse
+cdef inquiry _addressablepq_base_clear = (<PyTypeObject*>AddressablePQ).tp_clear
+
+
+cdef int _addressablepq_traverse(PyObject* o, visitproc visit, void* arg):
+    cdef int res = _addressablepq_base_traverse(o, visit, arg)
+    if res != 0:
+        return res
+    return (<AddressablePQ>o)._traverse_payloads(visit, arg)
+
+
+cdef int _addressablepq_clear(PyObject* o):
+    (<AddressablePQ>o)._clear()
+    return _addressablepq_base_clear(o)
+
+
+(<PyTypeObject*>AddressablePQ).tp_traverse = _addressablepq_traverse
+(<PyTypeObject*>AddressablePQ).tp_clear = _addressablepq_clear
+
+
+cdef extern from *:
+    """
+    // ObjectPayload is the entry of an ObjectPQ stored in the lookup map. It
+    // corresponds to APQPayload, with the priority stored as Python objects
+    // instead of a tail. value is the priority as passed to the PQ, sortKey
+    // is the object compared by the heap: the result of the sort key function
+    // or value itself. Both are owned references, the heap entry holds a
+    // borrowed copy of sortKey so that comparisons do not access the entry.
+    template<class T>
+    class ObjectPayload {
+    public:
+        std::size_t index;
+        std::string key;
+        T data;
+        PyObject* value;
+        PyObject* sortKey;
+        std::size_t slot;
+        std::uint64_t generation;
+        PyObject* item;
+
+        void setIndex(std::size_t index) {
+            this->index = index;
+        }
+    };
+
+    template<class T>
+    class DefaultSetIndex<ObjectPayload<T>*> {
+    public:
+        void operator()(ObjectPayload<T>* el, std::size_t index) const {
+            el->setIndex(index);
+        }
+    };
+
+    // ObjectPriorityCompare compares StandardEntry objects holding Python
+    // objects as values using rich comparison, < for min heaps and > for max
+    // heaps. Ties, i.e. values comparing neither less nor greater, are broken
+    // by the change timestamp (FIFO).
+    //
+    // A sift of BinHeap cannot be aborted, so exceptions raised by
+    // comparisons are not propagated. Once an exception is set, all further
+    // comparisons return false without calling into Python, which completes
+    // the sift with the heap structurally intact. Callers check
+    // PyErr_Occurred() after each heap operation and revert it using
+    // unsift() or unremove(). The GIL must be held.
+    template<class T, bool Max>
+    class ObjectPriorityCompare {
+    public:
+        bool operator()(const T& lhs, const T& rhs) const {
+            if (PyErr_Occurred())
+                return false;
+
+            PyObject* lhsValue = lhs.getValue();
+            PyObject* rhsValue = rhs.getValue();
+            if (lhsValue != rhsValue) {
+                int res = PyObject_RichCompareBool(lhsValue, rhsValue, Max ? Py_GT : Py_LT);
+                if (res != 0)
+                    return res > 0;
+                res = PyObject_RichCompareBool(rhsValue, lhsValue, Max ? Py_GT : Py_LT);
+                if (res != 0)
+                    return false;
+            }
+            return lhs.getChangeTS() < rhs.getChangeTS();
+        }
+    };
+
+    // initObjectHeap assigns a heap comparing the Python objects stored as
+    // values of entries to heap. The entries of container are moved into the
+    // new heap, which may compare them.
+    template<class T>
+    void initObjectHeap(AnyBinHeap<T>& heap, bool maxHeap, std::vector<T>& container) {
+        if (maxHeap)
+            heap = BinHeap<T, std::vector<T>, ObjectPriorityCompare<T, true>>(
+                ObjectPriorityCompare<T, true>(), DefaultSetIndex<T>(), std::move(container)
+            );
+        else
+            heap = BinHeap<T, std::vector<T>, ObjectPriorityCompare<T, false>>(
+                ObjectPriorityCompare<T, false>(), DefaultSetIndex<T>(), std::move(container)
+            );
+    }
+    """
+
+    cdef cppclass ObjectPayload[T]:
+        size_t index
+        string key
+        T data
+        PyObject* value
+        PyObject* sortKey
+        size_t slot
+        uint64_t generation
+        PyObject* item
+
+    void initObjectHeap[T](AnyBinHeap[T]&, bint, vector[T]&) except +
+
+
+ctypedef ObjectPayload[PayloadValue] ObjectEntry
+ctypedef ObjectEntry* ObjectEntryPointer
+ctypedef PyObject* ObjectPointer
+ctypedef StandardEntry[ObjectEntryPointer, ObjectPointer] ObjectHeapEntry
+
+
+cdef extern from * nogil:
+    ObjectEntry* findOrInsert(unordered_map[string, ObjectEntry]&, string&, cpp_bool&) except +
+
+
+cdef inline int check_comparison_error() except -1:
+    # Propagates an exception raised by a comparison of ObjectPriorityCompare
+    # during the last heap operation.
+    if PyErr_Occurred() is not NULL:
+        return -1
+    return 0
+
+
+cdef class ObjectPQ
+
+
+# ObjectItem is the handle of an entry of an ObjectPQ and works like
+# KeyedItem.
+@cython.no_gc_clear
+@cython.freelist(32)
+cdef class ObjectItem:
+    cdef ObjectPQ _pq
+    cdef size_t _slot
+    cdef uint64_t _generation
+
+    def __dealloc__(self):
+        cdef ObjectEntry* e
+        if self._pq is not None:
+            e = self._pq._entry_from_slot(self._slot, self._generation)
+            if e is not NULL and e.item == <PyObject*>self:
+                e.item = NULL
+
+    @property
+    def key(self):
+        return self._entry().key.decode('utf8')
+
+    @property
+    def value(self):
+        return <object>self._entry().value
+
+    @property
+    def data(self):
+        return from_payload(self._entry().data, self._pq._data_type)
+
+    def __eq__(self, object other):
+        cdef ObjectItem otherItem
+        if isinstance(other, ObjectItem):
+            otherItem = <ObjectItem>other
+            return (
+                self._pq is otherItem._pq and
+                self._slot == otherItem._slot and
+                self._generation == otherItem._generation
+            )
+
+        return NotImplemented
+
+    def __ne__(self, object other):
+        cdef object res = self.__eq__(other)
+        if res is NotImplemented:
+            return NotImplemented
+        return not res
+
+    cdef ObjectEntry* _entry(self) except NULL:
+        if self._pq is None:
+            raise KeyError("ObjectItem does not reference a PQ entry")
+
+        cdef ObjectEntry* e = self._pq._entry_from_slot(self._slot, self._generation)
+        if e is NULL:
+            raise KeyError("ObjectItem references an entry which has been removed from the PQ")
+        return e
+
+    @staticmethod
+    cdef ObjectItem from_entry(ObjectPQ pq, ObjectEntry* e):
+        if e.item is not NULL:
+            return <ObjectItem>e.item
+
+        cdef ObjectItem i = ObjectItem.__new__(ObjectItem)
+        i._pq = pq
+        i._slot = e.slot
+        i._generation = e.generation
+        e.item = <PyObject*>i
+        return i
+
+
+cdef class ObjectPQ:
+    cdef AnyBinHeap[ObjectHeapEntry] _heap
+    cdef unordered_map[string, ObjectEntry] _lookup_map
+    # Slot table mapping slot ids to entries, NULL marks free slots.
+    cdef vector[ObjectEntryPointer] _slots
+    cdef vector[size_t] _free_slots
+    cdef uint64_t _generation
+    cdef unsigned long long int _ts
+    cdef bint _max_heap
+    # set while the heap compares priorities, which may execute arbitrary
+    # code. The PQ must not be modified during comparisons.
+    cdef bint _comparing
+    cdef DataType _data_type
+    # As for KeyedPQ, sort_key causes Cython to generate the GC slots, see
+    # _objectpq_traverse() and _objectpq_clear().
+    cdef readonly object sort_key
+
+    def __cinit__(self, *iterables, bint max_heap=False, object sort_key=None, str data_type='object'):
+        cdef vector[ObjectHeapEntry] container
+        initObjectHeap[ObjectHeapEntry](self._heap, self._max_heap, container)
+
+        if len(iterables) > 1:
+            raise TypeError("ObjectPQ accepts at most 1 non-keyword argument, {} given".format(len(iterables)))
+
+        if sort_key is not None and not callable(sort_key):
+            raise TypeError("sort_key must be callable or None, not {}".format(type(sort_key).__name__))
+        self.sort_key = sort_key
+
+        if data_type not in _data_types:
+            raise ValueError("Unknown data_type {!r}, must be one of {}".format(
+                data_type, ', '.join(_data_types),
+            ))
+        self._data_type = _data_types[data_type]
+
+        cdef string key
+        cdef object sort_key_value
+        cdef PayloadValue payload
+        cdef ObjectEntry* e
+        if len(iterables) == 1:
+            try:
+                for element in iterables[0]:
+                    if len(element) == 2 and self._data_type == DATA_NONE:
+                        element = (element[0], element[1], None)
+                    if len(element) != 3:
+                        raise ValueError("element in initialisation iterable must have length 3, has length {}".format(len(element)))
+
+                    key = stringify(element[0])
+                    sort_key_value = self._sort_key_of(element[1])
+                    payload = to_payload(element[2], self._data_type)
+                    if self._lookup_map.count(key) > 0:
+                        release_payload(payload, self._data_type)
+                        raise KeyError("Duplicate key: key already exists in PQ")
+
+                    e = self._insert_entry(key, element[1], sort_key_value, payload)
+                    container.push_back(ObjectHeapEntry(e.sortKey, e, preincrement(self._ts)))
+            except:
+                self._clear()
+                raise
+
+        self._max_heap = max_heap
+        self._comparing = True
+        try:
+            initObjectHeap[ObjectHeapEntry](self._heap, self._max_heap, container)
+        finally:
+            self._comparing = False
+        if PyErr_Occurred() is not NULL:
+            self._clear()
+            check_comparison_error()
+
+    def __dealloc__(self):
+        self._clear()
+
+    def __len__(self):
+        return self._heap.size()
+
+    def __sizeof__(self):
+        # Approximation as for KeyedPQ, the priority objects are not included.
+        return (
+            object.__sizeof__(self) +
+            self._heap.size() * sizeof(ObjectHeapEntry) +
+            self._lookup_map.size() * (sizeof(pair[string, ObjectEntry]) + 2 * sizeof(void*)) +
+            self._lookup_map.bucket_count() * sizeof(void*) +
+            self._slots.capacity() * sizeof(ObjectEntryPointer) +
+            self._free_slots.capacity() * sizeof(size_t)
+        )
+
+    @property
+    def data_type(self):
+        for name, data_type in _data_types.items():
+            if data_type == self._data_type:
+                return name
+
+    def __contains__(self, object identifier):
+        try:
+            return self._find_identifier(identifier) is not NULL
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return self._iter_keys()
+
+    def __getitem__(self, object identifier):
+        cdef ObjectEntry* e = self._entry_from_identifier(identifier)
+        return ObjectItem.from_entry(self, e)
+
+    def __delitem__(self, object identifier):
+        self._check_mutable()
+        cdef ObjectEntry* e = self._entry_from_identifier(identifier)
+        self._remove(e)
+        self._release_entry(e)
+
+    def __eq__(self, object other):
+        if isinstance(other, ObjectPQ):
+            return other is self
+
+        return NotImplemented
+
+    def __ne__(self, object other):
+        cdef object res = self.__eq__(other)
+        if res is NotImplemented:
+            return NotImplemented
+        return not res
+
+    def get(self, object identifier, object default=None):
+        cdef ObjectEntry* e
+        try:
+            e = self._find_identifier(identifier)
+        except TypeError:
+            return default
+        if e is NULL:
+            return default
+        return ObjectItem.from_entry(self, e)
+
+    def keys(self):
+        return _KeysView(self)
+
+    def items(self):
+        return _ItemsView(self)
+
+    def values(self):
+        return _ValuesView(self)
+
+    def _iter_keys(self):
+        cdef ObjectHeapEntry entry
+        for entry in self._heap:
+            yield entry.getData().key.decode('utf8')
+
+    def _iter_items(self):
+        cdef ObjectHeapEntry entry
+        for entry in self._heap:
+            yield (
+                entry.getData().key.decode('utf8'),
+                ObjectItem.from_entry(self, entry.getData()),
+            )
+
+    def _iter_values(self):
+        cdef ObjectHeapEntry entry
+        for entry in self._heap:
+            yield ObjectItem.from_entry(self, entry.getData())
+
+    def clear(self):
+        self._check_mutable()
+        self._clear()
+
+    def add(self, object key, object value, object data=None, *, bint return_item=True):
+        self._check_mutable()
+        cdef string string_key = stringify(key)
+        cdef object sort_key_value = self._sort_key_of(value)
+        self._check_comparable(sort_key_value)
+
+        if self._lookup_map.count(string_key) > 0:
+            raise KeyError("Duplicate key: key already exists in PQ")
+
+        cdef PayloadValue payload = to_payload(data, self._data_type)
+        cdef ObjectEntry* e = self._insert_entry(string_key, value, sort_key_value, payload)
+        self._push(e)
+
+        if return_item:
+            return ObjectItem.from_entry(self, e)
+
+    def change_value(self, object identifier, object value, *, bint return_item=True):
+        self._check_mutable()
+        cdef object sort_key_value = self._sort_key_of(value)
+        self._check_comparable(sort_key_value)
+        cdef ObjectEntry* e = self._entry_from_identifier(identifier)
+        self._set_value(e, value, sort_key_value)
+        if return_item:
+            return ObjectItem.from_entry(self, e)
+
+    def add_or_change_value(self, object key, object value, object data=None, *, bint return_item=True):
+        self._check_mutable()
+        cdef string string_key = stringify(key)
+        cdef object sort_key_value = self._sort_key_of(value)
+        self._check_comparable(sort_key_value)
+
+        # As in KeyedPQ, data is converted before the lookup map is accessed
+        # and released again if the key is present.
+        cdef PayloadValue payload = to_payload(data, self._data_type)
+
+        cdef cpp_bool inserted = False
+        cdef ObjectEntry* e = findOrInsert(self._lookup_map, string_key, inserted)
+        if inserted:
+            self._init_entry(e, string_key, value, sort_key_value, payload)
+            self._push(e)
+        else:
+            release_payload(payload, self._data_type)
+            self._set_value(e, value, sort_key_value)
+
+        if return_item:
+            return ObjectItem.from_entry(self, e)
+
+    def peek(self):
+        if self._heap.size() == 0:
+            raise IndexError("PQ is empty")
+
+        return ObjectItem.from_entry(self, self._heap.top().getData())
+
+    def pop(self):
+        self._check_mutable()
+        if self._heap.size() == 0:
+            raise IndexError("PQ is empty")
+
+        # The tuple is created before the heap is modified, so that no Python
+        # objects are created while an exception raised by a comparison is
+        # pending.
+        cdef ObjectEntry* e = self._heap.top().getData()
+        cdef tuple result = (e.key.decode('utf8'), <object>e.value, from_payload(e.data, self._data_type))
+        self._pop()
+        self._release_entry(e)
+        return result
+
+    def pop_many(self, object k=None, object until=None, bint inclusive=True, *, bint columns=False):
+        self._check_mutable()
+        cdef size_t limit = self._heap.size()
+        if k is not None:
+            k = operator.index(k)
+            if k < 0:
+                raise ValueError("k must be non-negative, not {}".format(k))
+            if k < limit:
+                limit = k
+
+        cdef object until_sort_key
+        if until is not None:
+            until_sort_key = self._sort_key_of(until)
+
+        # Popped entries are only released once all entries have been popped.
+        # If a comparison raises, the pops are reverted in reverse order, so
+        # that no entries are lost.
+        cdef vector[ObjectHeapEntry] popped
+        cdef vector[ObjectEntryPointer] moved
+        cdef ObjectHeapEntry top
+        cdef ObjectEntry* last
+        cdef object top_value
+        cdef list result = []
+        cdef ObjectEntry* e
+        cdef size_t i
+        try:
+            while popped.size() < limit:
+                top = self._heap.top()
+                if until is not None:
+                    top_value = <object>top.getValue()
+                    if inclusive:
+                        if self._compare(until_sort_key, top_value):
+                            break
+                    elif not self._compare(top_value, until_sort_key):
+                        break
+
+                last = self._heap[self._heap.size() - 1].getData()
+                self._pop()
+                popped.push_back(top)
+                moved.push_back(last)
+
+            for i in range(popped.size()):
+                e = popped[i].getData()
+                result.append((e.key.decode('utf8'), <object>e.value, from_payload(e.data, self._data_type)))
+        except:
+            for i in reversed(range(popped.size())):
+                self._heap.unremove(0, popped[i], moved[i].index)
+            raise
+
+        for i in range(popped.size()):
+            self._release_entry(popped[i].getData())
+
+        if columns:
+            return (
+                [key for key, _, _ in result],
+                [value for _, value, _ in result],
+                [data for _, _, data in result],
+            )
+        return result
+
+    cdef object _sort_key_of(self, object value):
+        if self.sort_key is None:
+            return value
+        return self.sort_key(value)
+
+    cdef int _check_comparable(self, object sort_key_value) except -1:
+        # Compares sort_key_value to the priority of the top entry, so that
+        # priorities which are not comparable to those in the PQ are rejected
+        # before the PQ is modified.
+        if self._heap.size() > 0:
+            self._compare(sort_key_value, <object>self._heap.top().getValue())
+        return 0
+
+    cdef bint _compare(self, object lhs, object rhs) except -1:
+        # Returns whether lhs precedes rhs, disregarding the change timestamp.
+        self._comparing = True
+        try:
+            return PyObject_RichCompareBool(lhs, rhs, Py_GT if self._max_heap else Py_LT)
+        finally:
+            self._comparing = False
+
+    cdef inline int _check_mutable(self) except -1:
+        if self._comparing:
+            raise RuntimeError("ObjectPQ cannot be modified while priorities are being compared")
+        return 0
+
+    # The heap operations below may compare priorities. Exceptions raised by
+    # comparisons are left pending until the operation completes. The heap is
+    # then restored to its previous state without comparing priorities and
+    # the exception is propagated.
+
+    cdef int _push(self, ObjectEntry* e) except -1:
+        # Pushes a new entry, which is released if a comparison raises.
+        self._comparing = True
+        try:
+            self._heap.push(ObjectHeapEntry(e.sortKey, e, preincrement(self._ts)))
+        finally:
+            self._comparing = False
+
+        if PyErr_Occurred() is not NULL:
+            self._heap.unsift(e.index, self._heap.size() - 1)
+            self._heap.remove(self._heap.size() - 1)
+            self._release_entry(e)
+            return -1
+        return 0
+
+    cdef int _set_value(self, ObjectEntry* e, object value, object sort_key_value) except -1:
+        cdef PyObject* old_value = e.value
+        cdef PyObject* old_sort_key = e.sortKey
+        cdef size_t index = e.index
+        cdef size_t old_ts = self._heap[index].getChangeTS()
+        Py_INCREF(value)
+        Py_INCREF(sort_key_value)
+        e.value = <PyObject*>value
+        e.sortKey = <PyObject*>sort_key_value
+        self._heap[index].setValue(e.sortKey, preincrement(self._ts))
+
+        self._comparing = True
+        try:
+            self._heap.fix(index)
+        finally:
+            self._comparing = False
+
+        if PyErr_Occurred() is not NULL:
+            self._heap.unsift(e.index, index)
+            self._heap[index].setValue(old_sort_key, old_ts)
+            e.value = old_value
+            e.sortKey = old_sort_key
+            old_value = <PyObject*>value
+            old_sort_key = <PyObject*>sort_key_value
+
+        Py_XDECREF(old_value)
+        Py_XDECREF(old_sort_key)
+        return check_comparison_error()
+
+    cdef int _remove(self, ObjectEntry* e) except -1:
+        # Removes an entry from the heap, which is not released.
+        cdef size_t index = e.index
+        cdef ObjectHeapEntry removed = self._heap[index]
+        cdef ObjectEntry* last = self._heap[self._heap.size() - 1].getData()
+        self._comparing = True
+        try:
+            self._heap.remove(index)
+        finally:
+            self._comparing = False
+
+        if PyErr_Occurred() is not NULL:
+            self._heap.unremove(index, removed, last.index)
+            return -1
+        return 0
+
+    cdef int _pop(self) except -1:
+        # Removes the top entry from the heap, which is not released.
+        cdef ObjectHeapEntry top = self._heap.top()
+        cdef ObjectEntry* last = self._heap[self._heap.size() - 1].getData()
+        self._comparing = True
+        try:
+            self._heap.pop()
+        finally:
+            self._comparing = False
+
+        if PyErr_Occurred() is not NULL:
+            self._heap.unremove(0, top, last.index)
+            return -1
+        return 0
+
+    cdef void _clear(self) except *:
+        # As in KeyedPQ._clear(), all entries are moved out of the PQ before
+        # the priority and data objects are released.
+        cdef vector[PyObject*] objects
+        cdef unordered_map[string, ObjectEntry] lookup_map
+        lookup_map.swap(self._lookup_map)
+        self._heap.clear()
+        self._slots.clear()
+        self._free_slots.clear()
+
+        cdef unordered_map[string, ObjectEntry].iterator it = lookup_map.begin()
+        objects.reserve(lookup_map.size() * (3 if self._data_type == DATA_OBJECT else 2))
+        while it != lookup_map.end():
+            objects.push_back(dereference(it).second.value)
+            objects.push_back(dereference(it).second.sortKey)
+            if self._data_type == DATA_OBJECT:
+                objects.push_back(dereference(it).second.data.obj)
+            preincrement(it)
+        lookup_map.clear()
+
+        cdef size_t i
+        for i in range(objects.size()):
+            Py_XDECREF(objects[i])
+
+    cdef int _traverse_objects(self, visitproc visit, void* arg):
+        # Entries are visited through the lookup map, as they are not on the
+        # heap during initialisation.
+        cdef int res
+        cdef ObjectEntry* e
+        cdef unordered_map[string, ObjectEntry].iterator it = self._lookup_map.begin()
+        while it != self._lookup_map.end():
+            e = &dereference(it).second
+            res = visit(e.value, arg)
+            if res == 0:
+                res = visit(e.sortKey, arg)
+            if res == 0 and self._data_type == DATA_OBJECT:
+                res = visit(e.data.obj, arg)
+            if res != 0:
+                return res
+            preincrement(it)
+        return 0
+
+    cdef ObjectEntry* _insert_entry(self, string& key, object value, object sort_key_value, PayloadValue payload) except NULL:
+        # Inserts a new entry into the lookup map and assigns it a slot. The
+        # entry is not pushed onto the heap.
+        cdef ObjectEntry* e = &self._lookup_map[key]
+        self._init_entry(e, key, value, sort_key_value, payload)
+        return e
+
+    cdef void _init_entry(self, ObjectEntry* e, string& key, object value, object sort_key_value, PayloadValue payload):
+        e.key = key
+        e.data = payload
+        Py_INCREF(value)
+        Py_INCREF(sort_key_value)
+        e.value = <PyObject*>value
+        e.sortKey = <PyObject*>sort_key_value
+        e.item = NULL
+
+        if self._free_slots.empty():
+            e.slot = self._slots.size()
+            self._slots.push_back(e)
+        else:
+            e.slot = self._free_slots.back()
+            self._free_slots.pop_back()
+            self._slots[e.slot] = e
+        e.generation = preincrement(self._generation)
+
+    cdef void _release_entry(self, ObjectEntry* e):
+        # Removes an entry, which must have already been removed from the
+        # heap, from the lookup map and releases its objects.
+        cdef PyObject* value = e.value
+        cdef PyObject* sort_key_value = e.sortKey
+        cdef PayloadValue payload = e.data
+        self._slots[e.slot] = NULL
+        self._free_slots.push_back(e.slot)
+        self._lookup_map.erase(e.key)
+
+        Py_XDECREF(value)
+        Py_XDECREF(sort_key_value)
+        release_payload(payload, self._data_type)
+
+    cdef inline ObjectEntry* _entry_from_slot(self, size_t slot, uint64_t generation):
+        # Returns NULL if the slot does not reference the entry of generation.
+        if slot >= self._slots.size():
+            return NULL
+        cdef ObjectEntry* e = self._slots[slot]
+        if e is NULL or e.generation != generation:
+            return NULL
+        return e
+
+    cdef ObjectEntry* _find(self, string& key):
+        # Returns NULL if key is not present.
+        cdef unordered_map[string, ObjectEntry].iterator it = self._lookup_map.find(key)
+        if it == self._lookup_map.end():
+            return NULL
+        return &dereference(it).second
+
+    cdef ObjectEntry* _find_identifier(self, object identifier) except? NULL:
+        # Returns NULL if identifier does not reference an entry of the PQ.
+        # Raises TypeError if identifier is neither an ObjectItem nor a key.
+        cdef ObjectItem item
+        if type(identifier) is ObjectItem:
+            item = <ObjectItem>identifier
+            if item._pq is not self:
+                return NULL
+            return self._entry_from_slot(item._slot, item._generation)
+
+        return self._find(stringify(identifier))
+
+    cdef ObjectEntry* _entry_from_identifier(self, object identifier) except *:
+        cdef ObjectEntry* e = self._find_identifier(identifier)
+        if e is not NULL:
+            return e
+        if type(identifier) is ObjectItem:
+            raise KeyError("Passed identifier (of type ObjectItem) is not known to the PQ")
+        raise KeyError(identifier)
+
+    def _verify_invariants(self):
+        if self._heap.size() != self._lookup_map.size():
+            # heap and lookup map don't have the same size
+            return False
+
+        if self._slots.size() - self._free_slots.size() != self._lookup_map.size():
+            # number of occupied slots differs from the number of entries
+            return False
+
+        cdef ObjectEntry* e
+        cdef size_t i
+        for i in range(self._heap.size()):
+            e = self._heap[i].getData()
+            if e.index != i:
+                # wrong index is stored in the entry
+                return False
+            if &self._lookup_map[e.key] != e:
+                # key is not mapped to entry
+                return False
+            if e.slot >= self._slots.size() or self._slots[e.slot] != e:
+                # slot does not reference entry
+                return False
+            if self._heap[i].getValue() != e.sortKey:
+                # heap entry does not hold the sort key of the entry
+                return False
+
+        # May be called by comparisons, so the previous guard is restored.
+        cdef bint ordered = True
+        cdef bint comparing = self._comparing
+        self._comparing = True
+        try:
+            for i in range(1, self._heap.size()):
+                if self._heap.compareValues(self._heap[i], self._heap[(i - 1) // 2]):
+                    # child is less than parent
+                    ordered = False
+                    break
+        finally:
+            self._comparing = comparing
+
+        check_comparison_error()
+        return ordered
+
+
+cdef traverseproc _objectpq_base_traverse = (<PyTypeObject*>ObjectPQ).tp_traverse
+cdef inquiry _objectpq_base_clear = (<PyTypeObject*>ObjectPQ).tp_clear
+
+
+cdef int _objectpq_traverse(PyObject* o, visitproc visit, void* arg):
+    cdef int res = _objectpq_base_traverse(o, visit, arg)
+    if res != 0:
+        return res
+    return (<ObjectPQ>o)._traverse_objects(visit, arg)
+
+
+cdef int _objectpq_clear(PyObject* o):
+    (<ObjectPQ>o)._clear()
+    return _objectpq_base_clear(o)
+
+
+(<PyTypeObject*>ObjectPQ).tp_traverse = _objectpq_traverse
+(<PyTypeObject*>ObjectPQ).tp_clear = _objectpq_clear
+
+
+Mapping.register(ObjectPQ)
+
+
+cdef array.array scalar_priorities_array(vector[PriorityValue]& values, PriorityLayout& layout):
+    # Returns an array.array of the scalar priorities values, decoded
+    # according to layout.
+    cdef Py_ssize_t n = values.size()
+    cdef Py_ssize_t i
+    cdef PriorityType priority_type = layout.types[0]
+    cdef array.array a
+    if priority_type == PRIORITY_INT64:
+        a = array.clone(_int64_array_template, n, zero=False)
+        for i in range(n):
+            a.data.as_longlongs[i] = values[i].i64
+    elif priority_type == PRIORITY_FLOAT32:
+        a = array.clone(_float32_array_template, n, zero=False)
+        for i in range(n):
+            a.data.as_floats[i] = decodePriority(layout, values[i]).f32
+    else:
+        a = array.clone(_float64_array_template, n, zero=False)
+        for i in range(n):
+            a.data.as_doubles[i] = decodePriority(layout, values[i]).f64
+    return a
+
+
+cdef PriorityValue to_priority(object value, PriorityType priority_type) except *:
+    cdef PriorityValue priority
+    if priority_type == PRIORITY_INT64:
+        if not PyIndex_Check(value):
+            raise TypeError("priority must be an integer, not {}".format(type(value).__name__))
+        priority.i64 = <int64_t>value
+    elif priority_type == PRIORITY_FLOAT32:
+        priority.f32 = <float>(<double?>value)
+    else:
+        priority.f64 = <double?>value
+    return priority
+
+
+cdef object from_priority(PriorityValue priority, PriorityType priority_type):
+    if priority_type == PRIORITY_INT64:
+        return priority.i64
+    elif priority_type == PRIORITY_FLOAT32:
+        return <double>priority.f32
+    else:
+        return priority.f64
+
+
+cdef PriorityValue to_priority_value(object value, PriorityLayout& layout, PriorityTail& tail) except *:
+    # Converts value to the first priority component, which is returned.
+    # Further components of composite priorities are stored in tail.
+
+    if layout.width == 1:
+        return encodePriority(layout, to_priority(value, layout.types[0]))
+
+    if not isinstance(value, (tuple, list)):
+        raise TypeError("priority must be a tuple of {} components, not {}".format(layout.width, type(value).__name__))
+    if len(value) != <Py_ssize_t>layout.width:
+        raise ValueError("priority must have {} components, has {}".format(layout.width, len(value)))
+
+    cdef size_t i
+    for i in range(1, layout.width):
+        tail.set(i - 1, to_priority(value[i], layout.types[i]))
+
+    return encodePriority(layout, to_priority(value[0], layout.types[0]))
+
+
+cdef object from_priority_value(PriorityValue value, PriorityTail& tail, PriorityLayout& layout):
+    if layout.width == 1:
+        return from_priority(decodePriority(layout, value), layout.types[0])
+
+    cdef list components = [from_priority(decodePriority(layout, value), layout.types[0])]
+    cdef size_t i
+    for i in range(1, layout.width):
+        components.append(from_priority(tail.get(i - 1), layout.types[i]))
+
+    return tuple(components)
+
+
+cdef bint read_priority_buffer(object priorities, PriorityType priority_type, vector[PriorityValue]& values) except -1:
+    # Reads priorities from an object exposing a one-dimensional buffer with
+    # items matching priority_type. Returns False if priorities does not
+    # expose such a buffer, values is left empty in that case.
+
+    if not PyObject_CheckBuffer(priorities):
+        return False
+
+    cdef const double[:] f64_view
+    cdef const int64_t[:] i64_view
+    cdef const float[:] f32_view
+    cdef Py_ssize_t i
+    try:
+        if priority_type == PRIORITY_INT64:
+            i64_view = priorities
+        elif priority_type == PRIORITY_FLOAT32:
+            f32_view = priorities
+        else:
+            f64_view = priorities
+    except (ValueError, TypeError, BufferError):
+        return False
+
+    if priority_type == PRIORITY_INT64:
+        values.resize(i64_view.shape[0])
+        for i in range(i64_view.shape[0]):
+            values[i].i64 = i64_view[i]
+    elif priority_type == PRIORITY_FLOAT32:
+        values.resize(f32_view.shape[0])
+        for i in range(f32_view.shape[0]):
+            values[i].f32 = f32_view[i]
+    else:
+        values.resize(f64_view.shape[0])
+        for i in range(f64_view.shape[0]):
+            values[i].f64 = f64_view[i]
+
+    return True
+
+
+cdef int read_slots(object slots, vector[size_t]& slot_ids) except -1:
+    # Reads slot ids from an object exposing a one-dimensional int64 buffer
+    # or from a sequence of ints.
+    cdef const int64_t[:] view
+    cdef Py_ssize_t i
+    cdef bint is_buffer = PyObject_CheckBuffer(slots)
+    if is_buffer:
+        try:
+            view = slots
+        except (ValueError, TypeError, BufferError):
+            is_buffer = False
+
+    cdef int64_t slot
+    if is_buffer:
+        slot_ids.resize(view.shape[0])
+        for i in range(view.shape[0]):
+            slot = view[i]
+            if slot < 0:
+                raise KeyError(slot)
+            slot_ids[i] = slot
+    else:
+        slot_ids.resize(len(slots))
+        for i in range(len(slots)):
+            if not PyIndex_Check(slots[i]):
+                raise TypeError("slot must be an integer, not {}".format(type(slots[i]).__name__))
+            slot = slots[i]
+            if slot < 0:
+                raise KeyError(slot)
+            slot_ids[i] = slot
+
+    return 0
+
+
+cdef PriorityLayout parse_priority_layout(object priority_type) except *:
+    cdef PriorityLayout layout
+    cdef tuple names = (priority_type,) if isinstance(priority_type, str) else tuple(priority_type)
+
+    if not 1 <= len(names) <= <Py_ssize_t>PRIORITY_MAX_COMPONENTS:
+        raise ValueError("priority_type must have between 1 and {} components, has {}".format(
+            PRIORITY_MAX_COMPONENTS, len(names),
+        ))
+
+    layout.width = len(names)
+    layout.offset = 0
+    layout.scale = 1
+    for i, name in enumerate(names):
+        if name not in _priority_types:
+            raise ValueError("Unknown priority_type {!r}, must be one of {}".format(
+                name, ', '.join(_priority_types),
+            ))
+        layout.types[i] = _priority_types[name]
+
+    return layout
+
+
+cdef object priority_layout_name(PriorityLayout& layout):
+    cdef list names = []
+    cdef size_t i
+    for i in range(layout.width):
+        for name, t in _priority_types.items():
+            if t == layout.types[i]:
+                names.append(name)
+
+    if layout.width == 1:
+        return names[0]
+    return tuple(names)
+
+
+cdef PayloadValue to_payload(object data, DataType data_type) except *:
+    # For DATA_OBJECT, the returned payload holds a new reference to data
+    # which must be released using release_payload().
+
+    cdef PayloadValue payload
+    if data_type == DATA_INT64:
+        if not PyIndex_Check(data):
+            raise TypeError("data must be an integer, not {}".format(type(data).__name__))
+        payload.i64 = <int64_t>data
+    elif data_type == DATA_FLOAT64:
+        payload.f64 = <double?>data
+    elif data_type == DATA_NONE:
+        if data is not None:
+            raise TypeError("data must be None for a PQ without data, not {}".format(type(data).__name__))
+        payload.obj = NULL
+    else:
+        Py_INCREF(data)
+        payload.obj = <PyObject*>data
+    return payload
+
+
+cdef object from_payload(PayloadValue payload, DataType data_type):
+    if data_type == DATA_OBJECT:
+        return <object>payload.obj
+    elif data_type == DATA_INT64:
+        return payload.i64
+    elif data_type == DATA_FLOAT64:
+        return payload.f64
+    else:
+        return None
+
+
+cdef inline void release_payload(PayloadValue payload, DataType data_type):
+    if data_type == DATA_OBJECT:
+        Py_XDECREF(payload.obj)
+
+
+cdef void release_payloads(vector[PayloadValue]& payloads, DataType data_type):
+    cdef size_t i
+    if data_type == DATA_OBJECT:
+        for i in range(payloads.size()):
+            Py_XDECREF(payloads[i].obj)
 
 
 cdef string stringify(object s) except *:
+    # PyUnicode_AsUTF8AndSize() avoids allocating a bytes object. The UTF-8
+    # representation is cached in s, for ASCII strings it is s itself.
+    cdef const char* data
+    cdef Py_ssize_t size
     if isinstance(s, unicode):
-        return <string>(<unicode>s).encode('utf8')
+        data = PyUnicode_AsUTF8AndSize(s, &size)
+        return string(data, size)
 
     return <string?>(s)
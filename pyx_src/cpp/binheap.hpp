@@ -381,7 +381,7 @@ public:
 	BinHeap(const Compare& comp, const SetIndex& setInd, const Container& cont) : container(cont), compare(comp), setIndex(setInd) {
 		buildHeap();
 	}
-	BinHeap(const Compare& comp, const SetIndex& setInd, Container&& cont) : container(cont), compare(comp), setIndex(setInd) {
+	BinHeap(const Compare& comp, const SetIndex& setInd, Container&& cont) : container(std::move(cont)), compare(comp), setIndex(setInd) {
 		buildHeap();
 	}
 	template<class InputIt>
@@ -414,6 +414,51 @@ public:
 		fixPushed();
 	}
 
+	template<class InputIt>
+	void extend(InputIt first, InputIt last) {
+		/*
+		 * Pushes all values of [first, last). If there are at least as many
+		 * values as the heap contains, the values are appended and the heap
+		 * is rebuilt instead of pushing each value.
+		 *
+		 * A push is O(1) on average for values in random order, but
+		 * O(log n) in the worst case. Rebuilding is O(n), but moves all
+		 * values of the heap.
+		 */
+
+		const size_type oldSize = container.size();
+		const size_type count = static_cast<size_type>(std::distance(first, last));
+		container.reserve(oldSize + count);
+
+		if (count >= oldSize) {
+			container.insert(container.end(), first, last);
+			buildHeap();
+		} else {
+			for (; first != last; ++first)
+				push(*first);
+		}
+	}
+
+	void rebuild() {
+		/*
+		 * Restores the heap property after any number of values have been
+		 * modified in place, e.g. through operator[]. This is O(n), compared
+		 * to O(log n) for fixing each modified value.
+		 */
+
+		buildHeap();
+	}
+
+	template<class InputIt>
+	void rebuild(InputIt first, InputIt last) {
+		/*
+		 * Appends all values of [first, last) and rebuilds the heap.
+		 */
+
+		container.insert(container.end(), first, last);
+		buildHeap();
+	}
+
 	void fix(size_type ind) {
 		value_type value = std::move(container[ind]);
 		fixValue(ind, std::move(value));
@@ -425,6 +470,35 @@ public:
 		fix(it - cbegin());
 	}
 
+	void fixUp(size_type ind) {
+		/*
+		 * Restores the heap invariant after the value at ind has been
+		 * modified to be ordered before its previous value. Unlike fix(),
+		 * the children of ind are not compared.
+		 */
+
+		value_type value = std::move(container[ind]);
+		siftUp(ind, 0, std::move(value));
+	}
+
+	void fixDown(size_type ind) {
+		/*
+		 * Restores the heap invariant after the value at ind has been
+		 * modified to be ordered after its previous value. Unlike fix(),
+		 * the parent of ind is never considered.
+		 */
+
+		const size_type len = container.size();
+		if ((
+				2 * ind + 1 < len && compare(container[2 * ind + 1], container[ind]) // left child < value?
+			) || (
+				2 * ind + 2 < len && compare(container[2 * ind + 2], container[ind]) // right child < value?
+		)) {
+			value_type value = std::move(container[ind]);
+			siftDown(ind, std::move(value));
+		}
+	}
+
 	void remove(size_type ind) {
 		value_type value = std::move(container.back());
 		container.pop_back();
@@ -445,6 +519,74 @@ public:
 			siftDown(0, std::move(value));
 	}
 
+	void replaceTop(const_reference value) {
+		/*
+		 * Replaces the top value, equivalent to pop() followed by
+		 * push(value) but with a single sift down. The heap must not be
+		 * empty.
+		 */
+
+		siftDown(0, value_type(value));
+	}
+
+	void unsift(size_type ind, size_type origInd) {
+		/*
+		 * Moves the value at ind back to origInd, reversing a sift which
+		 * moved it from origInd to ind. One of the indices must be an
+		 * ancestor of the other. The values on the path between both are
+		 * moved back by one level. Values are not compared, so a sift which
+		 * has been aborted by a failing comparison can be reverted.
+		 */
+
+		if (ind == origInd)
+			return;
+
+		value_type value = std::move(container[ind]);
+		size_type holeInd = ind;
+		if (ind > origInd) {
+			// value has been sifted down, move it up
+			while (holeInd != origInd) {
+				const size_type parentPos = (holeInd - 1) / 2;
+				container[holeInd] = std::move(container[parentPos]);
+				setIndex(container[holeInd], holeInd);
+				holeInd = parentPos;
+			}
+		} else {
+			// value has been sifted up, move it down along the path to origInd
+			std::vector<size_type> path;
+			for (size_type i = origInd; i != ind; i = (i - 1) / 2)
+				path.push_back(i);
+			for (auto it = path.rbegin(); it != path.rend(); ++it) {
+				container[holeInd] = std::move(container[*it]);
+				setIndex(container[holeInd], holeInd);
+				holeInd = *it;
+			}
+		}
+
+		container[holeInd] = std::move(value);
+		setIndex(container[holeInd], holeInd);
+	}
+
+	void unremove(size_type ind, const_reference value, size_type movedInd) {
+		/*
+		 * Reverses remove(ind), or pop() if ind is 0, which removed value
+		 * and moved the previously last value to movedInd. If ind is size(),
+		 * value had been the last value and no value has been moved. Values
+		 * are not compared, see unsift().
+		 */
+
+		if (ind < container.size()) {
+			unsift(movedInd, ind);
+			value_type moved = std::move(container[ind]);
+			container[ind] = value;
+			setIndex(container[ind], ind);
+			container.push_back(std::move(moved));
+		} else {
+			container.push_back(value);
+		}
+		setIndex(container.back(), container.size() - 1);
+	}
+
 	bool empty() const {
 		return container.empty();
 	}
@@ -452,6 +594,10 @@ public:
 		return container.size();
 	}
 
+	bool compareValues(const_reference lhs, const_reference rhs) const {
+		return compare(lhs, rhs);
+	}
+
 	reference top() {
 		return container.front();
 	}
@@ -517,7 +663,9 @@ template<
 	class V = double,
 	bool ChangeTSTracking = true,
 	class SetIndex = DefaultSetIndex<T>
-> class StandardEntry {
+> class StandardEntry : private SetIndex {
+	// SetIndex is a private base rather than a member so that stateless
+	// SetIndex types occupy no space in the entry (empty base optimisation).
 protected:
 	using _full_ts_type = std::size_t;
 	using _empty_ts_type = class{};
@@ -529,8 +677,6 @@ public:
 	using entry_type = StandardEntry<T, V, ChangeTSTracking, SetIndex>;
 
 protected:
-	SetIndex _setIndex;
-
 	V value;
 	ts_type changeTS;
 	T data;
@@ -543,7 +689,7 @@ public:
 	StandardEntry(V value, T&& data, ts_type changeTS) : value(value), changeTS(changeTS), data(data) {}
 
 	void setIndex(std::size_t index) {
-		_setIndex(data, index);
+		static_cast<const SetIndex&>(*this)(data, index);
 	}
 
 	void set(V val, const T& d) {
@@ -583,9 +729,21 @@ public:
 		changeTS = ts;
 	}
 
+	// valuePtr() and changeTSPtr() allow viewing a column of a container of
+	// entries as a strided array.
+	const V* valuePtr() const {
+		return &value;
+	}
+	const ts_type* changeTSPtr() const {
+		return &changeTS;
+	}
+
 	T& getData() {
 		return data;
 	}
+	const T& getData() const {
+		return data;
+	}
 	void setData(const T& d) {
 		data = d;
 	}
@@ -719,19 +877,31 @@ public:
 	// template<class... Args>
 	// virtual void emplace(Args&&... args) = 0;
 
+	virtual void extend(const value_type* first, const value_type* last) = 0;
+
+	virtual void rebuild() = 0;
+	virtual void rebuild(const value_type* first, const value_type* last) = 0;
+
 	virtual void fix(size_type ind) = 0;
 	virtual void fix(iterator it) = 0;
 	virtual void fix(const_iterator it) = 0;
+	virtual void fixUp(size_type ind) = 0;
+	virtual void fixDown(size_type ind) = 0;
 
 	virtual void remove(size_type ind) = 0;
 	virtual void remove(iterator it) = 0;
 	virtual void remove(const_iterator it) = 0;
 
 	virtual void pop() = 0;
+	virtual void replaceTop(const_reference value) = 0;
+	virtual void unsift(size_type ind, size_type origInd) = 0;
+	virtual void unremove(size_type ind, const_reference value, size_type movedInd) = 0;
 
 	virtual bool empty() const = 0;
 	virtual size_type size() const = 0;
 
+	virtual bool compareValues(const_reference lhs, const_reference rhs) const = 0;
+
 	virtual reference top() = 0;
 
 	virtual const_reference top() const = 0;
@@ -870,19 +1040,31 @@ public:
 	template<class... Args>
 	void emplace(Args&&... args) { heap.emplace_back(std::forward<Args>(args)...); }
 
+	void extend(const value_type* first, const value_type* last) override { heap.extend(first, last); }
+
+	void rebuild() override { heap.rebuild(); }
+	void rebuild(const value_type* first, const value_type* last) override { heap.rebuild(first, last); }
+
 	void fix(size_type ind) override { heap.fix(ind); }
 	void fix(iterator it) override { heap.fix(it); }
 	void fix(const_iterator it) override { heap.fix(it); }
+	void fixUp(size_type ind) override { heap.fixUp(ind); }
+	void fixDown(size_type ind) override { heap.fixDown(ind); }
 
 	void remove(size_type ind) override { heap.remove(ind); }
 	void remove(iterator it) override { heap.remove(it); }
 	void remove(const_iterator it) override { heap.remove(it); }
 
 	void pop() override { heap.pop(); }
+	void replaceTop(const_reference value) override { heap.replaceTop(value); }
+	void unsift(size_type ind, size_type origInd) override { heap.unsift(ind, origInd); }
+	void unremove(size_type ind, const_reference value, size_type movedInd) override { heap.unremove(ind, value, movedInd); }
 
 	bool empty() const override { return heap.empty(); }
 	size_type size() const override { return heap.size(); }
 
+	bool compareValues(const_reference lhs, const_reference rhs) const override { return heap.compareValues(lhs, rhs); }
+
 	reference top() override { return heap.top(); }
 
 	const_reference top() const override { return heap.top(); }
@@ -1025,19 +1207,31 @@ public:
 	// template<class... Args>
 	// void emplace(Args&&... args) { heapPtr->emplace_back(std::forward<Args>(args)...); }
 
+	void extend(const value_type* first, const value_type* last) { heapPtr->extend(first, last); }
+
+	void rebuild() { heapPtr->rebuild(); }
+	void rebuild(const value_type* first, const value_type* last) { heapPtr->rebuild(first, last); }
+
 	void fix(size_type ind) { heapPtr->fix(ind); }
 	void fix(iterator it) { heapPtr->fix(it); }
 	void fix(const_iterator it) { heapPtr->fix(it); }
+	void fixUp(size_type ind) { heapPtr->fixUp(ind); }
+	void fixDown(size_type ind) { heapPtr->fixDown(ind); }
 
 	void remove(size_type ind) { heapPtr->remove(ind); }
 	void remove(iterator it) { heapPtr->remove(it); }
 	void remove(const_iterator it) { heapPtr->remove(it); }
 
 	void pop() { heapPtr->pop(); }
+	void replaceTop(const_reference value) { heapPtr->replaceTop(value); }
+	void unsift(size_type ind, size_type origInd) { heapPtr->unsift(ind, origInd); }
+	void unremove(size_type ind, const_reference value, size_type movedInd) { heapPtr->unremove(ind, value, movedInd); }
 
 	bool empty() const { return static_cast<const heap_interface&>(*heapPtr).empty(); }
 	size_type size() const { return static_cast<const heap_interface&>(*heapPtr).size(); }
 
+	bool compareValues(const_reference lhs, const_reference rhs) const { return static_cast<const heap_interface&>(*heapPtr).compareValues(lhs, rhs); }
+
 	reference top() { return heapPtr->top(); }
 
 	const_reference top() const { return static_cast<const heap_interface&>(*heapPtr).top(); }
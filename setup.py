@@ -267,8 +267,8 @@ cmdclass.update({
 
 extensions = [
     Extension('apq', ['pyx_src/apq.pyx'],
-        extra_compile_args = ['-std=c++14'],
-        extra_link_args = ['-std=c++14'],
+        extra_compile_args = ['-std=c++17'],
+        extra_link_args = ['-std=c++17'],
     ),
 ]
 
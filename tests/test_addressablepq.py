@@ -0,0 +1,245 @@
+import gc
+import random
+import typing
+import unittest
+import weakref
+
+from apq import AddressablePQ, Item
+
+
+class DummyClass(object):
+    pass
+
+
+class InitialisationTest(unittest.TestCase):
+    def test_correct(self) -> None:
+        self.assertEqual(len(AddressablePQ()), 0)
+        self.assertEqual(len(AddressablePQ([])), 0)
+
+        dummy = DummyClass()
+        pq: AddressablePQ[DummyClass] = AddressablePQ([(1.0, dummy)])
+        self.assertEqual(len(pq), 1)
+        item = pq.peek()
+        self.assertEqual(item.value, 1.0)
+        self.assertIs(item.data, dummy)
+        self.assertEqual(pq.priority_type, 'float64')
+        self.assertEqual(pq.data_type, 'object')
+        self.assertTrue(pq._verify_invariants())
+
+    def test_incorrect(self) -> None:
+        with self.assertRaises(TypeError):
+            typing.cast(typing.Any, AddressablePQ)([], [])
+        with self.assertRaises(ValueError):
+            AddressablePQ(typing.cast(typing.Any, [(1.0,)]))
+        with self.assertRaises(TypeError):
+            AddressablePQ(typing.cast(typing.Any, [('a', None)]))
+        with self.assertRaises(ValueError):
+            AddressablePQ(data_type='unknown')
+
+    def test_failed_initialisation_releases_data(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        with self.assertRaises(TypeError):
+            AddressablePQ(typing.cast(typing.Any, [(1.0, dummy), ('a', None)]))
+        del dummy
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+class ItemTest(unittest.TestCase):
+    def test_add_pop(self) -> None:
+        pq: AddressablePQ[str] = AddressablePQ()
+        a = pq.add(2.0, 'a')
+        b = pq.add(1.0, 'b')
+        pq.add(3.0, 'c')
+
+        self.assertIsInstance(a, Item)
+        self.assertEqual((a.value, a.data), (2.0, 'a'))
+        self.assertEqual(pq.peek(), b)
+        self.assertIs(pq.peek(), b)
+        self.assertEqual(pq.pop(), (1.0, 'b'))
+        self.assertEqual(pq.pop(), (2.0, 'a'))
+        self.assertEqual(pq.pop(), (3.0, 'c'))
+        with self.assertRaises(IndexError):
+            pq.pop()
+        with self.assertRaises(IndexError):
+            pq.peek()
+
+    def test_change_value(self) -> None:
+        pq: AddressablePQ[str] = AddressablePQ()
+        a = pq.add(2.0, 'a')
+        b = pq.add(1.0, 'b')
+
+        pq.change_value(a, 0.5)
+        self.assertEqual(a.value, 0.5)
+        self.assertEqual(pq.peek(), a)
+        pq.change_value(a, 3.0)
+        self.assertEqual(pq.peek(), b)
+        self.assertTrue(pq._verify_invariants())
+
+        # equal values are ordered by the time of the change (FIFO)
+        pq.change_value(a, 1.0)
+        self.assertEqual(pq.peek(), b)
+        pq.change_value(b, 1.0)
+        self.assertEqual(pq.peek(), a)
+
+    def test_remove(self) -> None:
+        pq: AddressablePQ[str] = AddressablePQ()
+        a = pq.add(2.0, 'a')
+        b = pq.add(1.0, 'b')
+
+        pq.remove(b)
+        self.assertNotIn(b, pq)
+        self.assertIn(a, pq)
+        self.assertEqual(len(pq), 1)
+        self.assertEqual(pq.peek(), a)
+        with self.assertRaises(KeyError):
+            b.value
+        with self.assertRaises(KeyError):
+            pq.remove(b)
+        with self.assertRaises(KeyError):
+            pq.change_value(b, 1.0)
+
+    def test_reused_slot(self) -> None:
+        pq: AddressablePQ[str] = AddressablePQ()
+        a = pq.add(1.0, 'a')
+        pq.pop()
+        b = pq.add(1.0, 'b')
+
+        self.assertNotEqual(a, b)
+        self.assertNotIn(a, pq)
+        self.assertEqual(b.data, 'b')
+        with self.assertRaises(KeyError):
+            a.data
+
+    def test_different_heaps(self) -> None:
+        pq: AddressablePQ[None] = AddressablePQ()
+        other: AddressablePQ[None] = AddressablePQ()
+        item = other.add(1.0, None)
+        pq.add(1.0, None)
+
+        self.assertNotIn(item, pq)
+        self.assertNotEqual(item, pq.peek())
+        with self.assertRaises(KeyError):
+            pq.change_value(item, 0.0)
+        with self.assertRaises(TypeError):
+            pq.remove(typing.cast(typing.Any, 'a'))
+        with self.assertRaises(TypeError):
+            pq.remove(typing.cast(typing.Any, None))
+        with self.assertRaises(TypeError):
+            pq.change_value(typing.cast(typing.Any, None), 0.0)
+
+    def test_clear(self) -> None:
+        pq: AddressablePQ[None] = AddressablePQ()
+        item = pq.add(1.0, None)
+        pq.clear()
+
+        self.assertEqual(len(pq), 0)
+        self.assertNotIn(item, pq)
+        new_item = pq.add(1.0, None)
+        self.assertNotEqual(item, new_item)
+        with self.assertRaises(KeyError):
+            item.value
+
+    def test_item_keeps_pq_alive(self) -> None:
+        pq: AddressablePQ[str] = AddressablePQ()
+        item = pq.add(1.0, 'a')
+        del pq
+        gc.collect()
+        self.assertEqual(item.data, 'a')
+
+
+class ValueTest(unittest.TestCase):
+    def test_priority_types(self) -> None:
+        int_pq: AddressablePQ[None] = AddressablePQ(priority_type='int64')
+        item = int_pq.add(2 ** 62 + 1, None)
+        int_pq.add(2 ** 62, None)
+        self.assertEqual(item.value, 2 ** 62 + 1)
+        int_pq.change_value(item, -1)
+        self.assertEqual(int_pq.pop(), (-1, None))
+
+        composite_pq: AddressablePQ[None] = AddressablePQ(priority_type=('float64', 'int64'))
+        a = composite_pq.add((1.0, 2), None)
+        b = composite_pq.add((1.0, 1), None)
+        self.assertEqual(composite_pq.peek(), b)
+        composite_pq.change_value(a, (1.0, 0))
+        self.assertEqual(composite_pq.peek(), a)
+        self.assertEqual(a.value, (1.0, 0))
+        self.assertTrue(composite_pq._verify_invariants())
+
+    def test_data_types(self) -> None:
+        for data_type, data in [('none', None), ('int64', 7), ('float64', 0.5)]:
+            with self.subTest(data_type=data_type):
+                pq: AddressablePQ[typing.Any] = AddressablePQ(data_type=data_type)
+                item = pq.add(1.0, data)
+                self.assertEqual(pq.data_type, data_type)
+                self.assertEqual(item.data, data)
+                self.assertEqual(pq.pop(), (1.0, data))
+
+    def test_random(self) -> None:
+        for max_heap in (False, True):
+            with self.subTest(max_heap=max_heap):
+                pq: AddressablePQ[int] = AddressablePQ(max_heap=max_heap)
+                items: typing.Dict[int, Item[int]] = {}
+                values: typing.Dict[int, float] = {}
+                sign = -1 if max_heap else 1
+                for i in range(2000):
+                    op = random.random()
+                    if items and op < 0.2:
+                        data = random.choice(list(items))
+                        pq.remove(items.pop(data))
+                        del values[data]
+                    elif items and op < 0.5:
+                        data = random.choice(list(items))
+                        values[data] = float(random.randrange(50))
+                        pq.change_value(items[data], values[data])
+                    elif items and op < 0.6:
+                        value, data = pq.pop()
+                        self.assertEqual(sign * value, min(sign * v for v in values.values()))
+                        self.assertEqual(value, values.pop(data))
+                        del items[data]
+                    else:
+                        values[i] = float(random.randrange(50))
+                        items[i] = pq.add(values[i], i)
+
+                    if i % 100 == 0:
+                        self.assertTrue(pq._verify_invariants())
+                        self.assertTrue(all(item.value == values[data] for data, item in items.items()))
+                self.assertEqual(len(pq), len(items))
+
+                popped = [pq.pop() for _ in range(len(pq))]
+                self.assertEqual([sign * value for value, _ in popped], sorted(sign * v for v in values.values()))
+
+
+class ReleaseTest(unittest.TestCase):
+    def _assert_released(self, ref: "weakref.ReferenceType[DummyClass]") -> None:
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_remove(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq: AddressablePQ[DummyClass] = AddressablePQ()
+        item = pq.add(1.0, dummy)
+        del dummy
+        pq.remove(item)
+        self._assert_released(ref)
+
+    def test_del(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq: AddressablePQ[DummyClass] = AddressablePQ([(1.0, dummy)])
+        del dummy, pq
+        self._assert_released(ref)
+
+    def test_reference_cycle(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq: AddressablePQ[DummyClass] = AddressablePQ()
+        setattr(dummy, 'item', pq.add(1.0, dummy))
+        del dummy, pq
+        self._assert_released(ref)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,15 @@
+import array
+import collections.abc
+import gc
 import heapq
 import itertools
 import math
 import random
+import struct
+import sys
 import typing
 import unittest
+import weakref
 
 from apq import KeyedPQ, KeyedItem
 
@@ -191,6 +197,262 @@ class ValueTest(unittest.TestCase):
         self.assertTrue(item_added in self.pq)
         self.assertTrue(item_changed in self.pq)
 
+    def test_add_or_change_value_data(self) -> None:
+        pq: KeyedPQ[DummyClass] = KeyedPQ()
+        dummy_a, dummy_b = DummyClass(), DummyClass()
+        ref_b = weakref.ref(dummy_b)
+
+        pq.add_or_change_value('a', 1.0, dummy_a)
+        pq.add_or_change_value('a', 2.0, dummy_b)
+
+        self.assertIs(pq['a'].data, dummy_a)
+        self.assertEqual(pq['a'].value, 2.0)
+        self.assertTrue(pq._verify_invariants())
+        del dummy_b
+        self.assertIsNone(ref_b())
+
+    def test_relax(self) -> None:
+        pq: KeyedPQ[str] = KeyedPQ()
+
+        self.assertTrue(pq.relax('a', 5.0, 'x'))
+        self.assertFalse(pq.relax('a', 6.0, 'y'))
+        self.assertFalse(pq.relax('a', 5.0, 'z'))
+        self.assertEqual((pq['a'].value, pq['a'].data), (5.0, 'x'))
+
+        self.assertTrue(pq.relax('a', 4.0, 'w'))
+        self.assertEqual((pq['a'].value, pq['a'].data), (4.0, 'w'))
+
+        self.assertTrue(pq.relax('b', 4.5, 'v'))
+        self.assertEqual(pq.pop(), ('a', 4.0, 'w'))
+        self.assertTrue(pq._verify_invariants())
+
+    def test_relax_max_heap(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ(max_heap=True)
+
+        self.assertTrue(pq.relax('a', 5.0))
+        self.assertFalse(pq.relax('a', 4.0))
+        self.assertTrue(pq.relax('a', 6.0))
+        self.assertEqual(pq['a'].value, 6.0)
+
+    def test_relax_data_released(self) -> None:
+        pq: KeyedPQ[DummyClass] = KeyedPQ()
+        dummy_a, dummy_b = DummyClass(), DummyClass()
+        ref_a, ref_b = weakref.ref(dummy_a), weakref.ref(dummy_b)
+
+        pq.relax('a', 2.0, dummy_a)
+        pq.relax('a', 3.0, dummy_b)
+        del dummy_b
+        self.assertIsNone(ref_b())
+
+        pq.relax('a', 1.0, DummyClass())
+        del dummy_a
+        self.assertIsNone(ref_a())
+
+    def test_increment(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ([('a', 1.0, None), ('b', 2.0, None), ('c', 3.0, None)])
+
+        self.assertEqual(pq.increment('a', 1.5), 2.5)
+        self.assertEqual(pq.peek().key, 'b')
+        self.assertEqual(pq.increment('c', -3.0), 0.0)
+        self.assertEqual(pq.peek().key, 'c')
+        self.assertEqual(pq.increment('c', 2.0), 2.0)
+        # a tie moves the incremented entry after the other entries
+        self.assertEqual([pq.pop()[0] for _ in range(3)], ['b', 'c', 'a'])
+
+        with self.assertRaises(KeyError):
+            pq.increment('a', 1.0)
+        self.assertEqual(len(pq), 0)
+
+        self.assertEqual(pq.increment('a', 1.0, default=10.0), 11.0)
+        self.assertEqual(pq.increment('a', 1.0, default=10.0), 12.0)
+        self.assertTrue(pq._verify_invariants())
+
+    def test_increment_int64(self) -> None:
+        pq: KeyedPQ[str] = KeyedPQ(priority_type='int64', max_heap=True)
+
+        self.assertEqual(pq.increment('a', 1, default=0, data='x'), 1)
+        self.assertEqual(pq.increment('b', 2, default=0, data='y'), 2)
+        self.assertEqual(pq.peek().key, 'b')
+        self.assertEqual(pq.increment('a', 2, default=0, data='z'), 3)
+        self.assertEqual(pq.peek().key, 'a')
+        self.assertEqual(pq['a'].data, 'x')
+
+        self.assertEqual(pq.increment('a', 2 ** 63 - 1), 2 ** 63 - 1)
+
+        with self.assertRaises(TypeError):
+            pq.increment('a', 1.5)
+
+        composite_pq: KeyedPQ[None] = KeyedPQ(priority_type=('float64', 'int64'))
+        with self.assertRaises(ValueError):
+            composite_pq.increment('a', 1.0, default=0.0)
+
+    def test_increment_random(self) -> None:
+        for max_heap in (False, True):
+            pq: KeyedPQ[None] = KeyedPQ(((str(i), float(random.randrange(20)), None) for i in range(200)), max_heap=max_heap)
+            for _ in range(1000):
+                pq.increment(str(random.randrange(200)), float(random.randrange(-5, 6)))
+                self.assertTrue(pq._verify_invariants())
+            for _ in range(100):
+                pq.increment_many([str(random.randrange(200)) for _ in range(5)], [float(random.randrange(-5, 6)) for _ in range(5)])
+                self.assertTrue(pq._verify_invariants())
+
+    def test_shift_all(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ([('a', 1.0, None), ('b', 2.0, None)])
+
+        pq.shift_all(-1.5)
+        self.assertEqual(pq['a'].value, -0.5)
+        self.assertEqual(pq.peek().value, -0.5)
+
+        pq.add('c', 0.0, None)
+        pq.change_value('a', 1.0)
+        self.assertEqual(pq['c'].value, 0.0)
+        self.assertEqual(pq.increment('c', 0.25), 0.25)
+        self.assertEqual(pq.iter_below(0.5), [('c', 0.25, None), ('b', 0.5, None)])
+        self.assertEqual(list(pq.priorities_array()), [0.25, 0.5, 1.0])
+
+        pq.shift_all(1.0)
+        self.assertEqual(pq.pop_many(until=1.5), [('c', 1.25, None), ('b', 1.5, None)])
+        self.assertEqual(pq.pop(), ('a', 2.0, None))
+
+        with self.assertRaises(ValueError):
+            pq.shift_all(math.inf)
+
+    def test_scale_all(self) -> None:
+        for max_heap in (False, True):
+            pq: KeyedPQ[None] = KeyedPQ([('a', 1.0, None), ('b', 2.0, None), ('c', -4.0, None)], max_heap=max_heap)
+
+            pq.scale_all(0.5)
+            self.assertEqual(sorted(pq.priorities_array()), [-2.0, 0.5, 1.0])
+
+            pq.shift_all(1.0)
+            pq.scale_all(2.0)
+            pq.add('d', 3.0, None)
+            pq.relax('d', 2.5 if max_heap else 3.5)
+            pq.upsert_many(['a', 'e'], [0.5, 1.5], policy='sum')
+            self.assertTrue(pq._verify_invariants())
+
+            expected = [('a', 3.5, None), ('b', 4.0, None), ('c', -2.0, None), ('d', 3.0, None), ('e', 1.5, None)]
+            expected.sort(key=lambda t: t[1], reverse=max_heap)
+            self.assertEqual(pq.sorted_snapshot(), ([t[0] for t in expected], array.array('d', [t[1] for t in expected]), [None] * 5))
+
+        with self.assertRaises(ValueError):
+            pq.scale_all(0.0)
+        with self.assertRaises(ValueError):
+            pq.scale_all(-1.0)
+
+    def test_transform_priority_types(self) -> None:
+        pq_int64: KeyedPQ[None] = KeyedPQ(priority_type='int64')
+        with self.assertRaises(ValueError):
+            pq_int64.shift_all(1)
+        with self.assertRaises(ValueError):
+            pq_int64.scale_all(2)
+
+        pq_float32: KeyedPQ[None] = KeyedPQ([('a', 1.0, None)], priority_type='float32')
+        pq_float32.scale_all(3.0)
+        pq_float32.shift_all(0.5)
+        self.assertEqual(pq_float32['a'].value, 3.5)
+
+        pq_composite: KeyedPQ[None] = KeyedPQ([('a', (1.0, 2), None), ('b', (1.0, 1), None)], priority_type=('float64', 'int64'))
+        pq_composite.shift_all(-1.0)
+        pq_composite.add('c', (0.0, 0), None)
+        self.assertEqual(pq_composite.pop_many(), [('c', (0.0, 0), None), ('b', (0.0, 1), None), ('a', (0.0, 2), None)])
+
+    def test_transform_renormalise(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ((str(i), float(i), None) for i in range(100))
+
+        # the scale leaves the range in which it is kept, values are
+        # renormalised
+        for _ in range(40):
+            pq.scale_all(0.5)
+        for _ in range(40):
+            pq.scale_all(2.0)
+            pq.add(str(len(pq)), 1.0, None)
+
+        self.assertTrue(pq._verify_invariants())
+        self.assertEqual(pq['99'].value, 99.0)
+        self.assertEqual(pq.pop(), ('0', 0.0, None))
+
+        for _ in range(1000):
+            pq.shift_all(1e6)
+        self.assertEqual(pq['99'].value, 99.0 + 1e9)
+        self.assertTrue(pq._verify_invariants())
+
+        pq.clear()
+        pq.add('a', 1.0, None)
+        self.assertEqual(pq['a'].value, 1.0)
+
+    def test_pushpop(self) -> None:
+        pq: KeyedPQ[str] = KeyedPQ()
+
+        self.assertEqual(pq.pushpop('a', 1.0, 'x'), ('a', 1.0, 'x'))
+        self.assertEqual(len(pq), 0)
+
+        pq.add('b', 2.0, 'y')
+        self.assertEqual(pq.pushpop('a', 1.0, 'x'), ('a', 1.0, 'x'))
+        self.assertEqual(pq.pushpop('c', 2.0, 'z'), ('b', 2.0, 'y'))
+        self.assertEqual(pq.pushpop('d', 3.0, 'w'), ('c', 2.0, 'z'))
+        self.assertEqual(list(pq.keys()), ['d'])
+        self.assertTrue(pq._verify_invariants())
+
+        with self.assertRaises(KeyError):
+            pq.pushpop('d', 0.0, 'v')
+
+        max_pq: KeyedPQ[None] = KeyedPQ([('a', 1.0, None)], max_heap=True)
+        self.assertEqual(max_pq.pushpop('b', 2.0), ('b', 2.0, None))
+        self.assertEqual(max_pq.pushpop('c', 0.0), ('a', 1.0, None))
+
+    def test_replace_top(self) -> None:
+        pq: KeyedPQ[str] = KeyedPQ([('a', 1.0, 'x'), ('b', 2.0, 'y')])
+
+        self.assertEqual(pq.replace_top('c', 3.0, 'z'), ('a', 1.0, 'x'))
+        self.assertEqual(pq.replace_top('b', 0.5, 'w'), ('b', 2.0, 'y'))
+        self.assertEqual(pq.replace_top('d', 0.0, 'v'), ('b', 0.5, 'w'))
+        self.assertTrue(pq._verify_invariants())
+        self.assertEqual(pq['d'].data, 'v')
+        self.assertNotIn('a', pq)
+        self.assertNotIn('b', pq)
+
+        with self.assertRaises(KeyError):
+            pq.replace_top('c', 0.0)
+
+        with self.assertRaises(IndexError):
+            KeyedPQ().replace_top('a', 1.0)
+
+    def test_replace_top_handles(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ([('a', 1.0, None), ('b', 2.0, None)])
+        item_a = pq['a']
+
+        pq.replace_top('c', 3.0)
+        item_c = pq['c']
+        self.assertNotEqual(item_a, item_c)
+        with self.assertRaises(KeyError):
+            item_a.value
+        self.assertEqual(item_c.value, 3.0)
+        self.assertEqual(pq.peek().key, 'b')
+
+        pq.replace_top('b', 4.0)
+        with self.assertRaises(KeyError):
+            pq.change_value(item_a, 0.0)
+        self.assertEqual([pq.pop()[0] for _ in range(2)], ['c', 'b'])
+
+    def test_pushpop_random(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ()
+        heap: typing.List[typing.Tuple[float, int]] = []
+
+        for i in range(1000):
+            value = float(random.randrange(100))
+            if i % 3 == 0:
+                pq.add(str(i), value, None)
+                heapq.heappush(heap, (value, i))
+            elif i % 3 == 1 or not heap:
+                key, popped_value, _ = pq.pushpop(str(i), value, None)
+                self.assertEqual((popped_value, int(key)), heapq.heappushpop(heap, (value, i)))
+            else:
+                key, popped_value, _ = pq.replace_top(str(i), value, None)
+                self.assertEqual((popped_value, int(key)), heapq.heapreplace(heap, (value, i)))
+
+        self.assertTrue(pq._verify_invariants())
+
     def test_add_infinity(self) -> None:
         self.pq.add('a', math.inf, None)
         self.pq.add('b', 3000.0, None)
@@ -212,6 +474,978 @@ class ValueTest(unittest.TestCase):
         self.assertEqual(key_second, 'a')
 
 
+class PriorityTypeTest(unittest.TestCase):
+    def test_default(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ()
+
+        self.assertEqual(pq.priority_type, 'float64')
+
+    def test_unknown(self) -> None:
+        with self.assertRaises(ValueError):
+            KeyedPQ(priority_type='int32')
+
+    def test_int64_exact(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ(priority_type='int64')
+        base = 2 ** 62
+
+        pq.add('c', base + 2, None)
+        pq.add('a', base, None)
+        pq.add('b', base + 1, None)
+
+        self.assertEqual(pq.priority_type, 'int64')
+        self.assertEqual(pq['b'].value, base + 1)
+
+        for key, value in [('a', base), ('b', base + 1), ('c', base + 2)]:
+            key_popped, value_popped, _ = pq.pop()
+            self.assertEqual(key_popped, key)
+            self.assertEqual(value_popped, value)
+            self.assertIs(type(value_popped), int)
+
+    def test_int64_incorrect(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ(priority_type='int64')
+
+        with self.assertRaises(TypeError):
+            pq.add('a', 1.5, None)
+        with self.assertRaises(OverflowError):
+            pq.add('a', 2 ** 63, None)
+
+        self.assertEqual(len(pq), 0)
+        self.assertFalse('a' in pq)
+
+        pq.add('a', -2 ** 63, None)
+        with self.assertRaises(TypeError):
+            pq.change_value('a', 1.5)
+        self.assertEqual(pq['a'].value, -2 ** 63)
+
+    def test_float32_rounding(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ(priority_type='float32')
+        rounded = struct.unpack('f', struct.pack('f', 0.1))[0]
+
+        pq.add('a', 0.1, None)
+
+        self.assertEqual(pq['a'].value, rounded)
+        self.assertEqual(pq.pop()[1], rounded)
+
+    def test_invariants(self) -> None:
+        for priority_type, max_heap in itertools.product(['float64', 'int64', 'float32'], [False, True]):
+            values: typing.List[float]
+            if priority_type == 'int64':
+                values = [random.randrange(-2 ** 63, 2 ** 63) for _ in range(1000)]
+            else:
+                values = [random.random() for _ in range(1000)]
+
+            pq: KeyedPQ[None] = KeyedPQ(
+                ((str(i), val, None) for i, val in enumerate(values)),
+                max_heap=max_heap,
+                priority_type=priority_type,
+            )
+            self.assertTrue(pq._verify_invariants())
+
+            for i in range(0, 1000, 2):
+                pq.change_value(str(i), values[i + 1])
+                values[i] = values[i + 1]
+            self.assertTrue(pq._verify_invariants())
+
+            popped = [pq.pop()[1] for _ in range(len(pq))]
+            self.assertEqual(popped, sorted(popped, reverse=max_heap))
+
+
+class CompositePriorityTest(unittest.TestCase):
+    PRIORITY_TYPE = ('float64', 'int64', 'int64')
+
+    def _random_priority(self) -> typing.Tuple[float, int, int]:
+        return (float(random.randrange(10)), random.randrange(-5, 5), random.randrange(1000))
+
+    def test_priority_type(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ(priority_type=self.PRIORITY_TYPE)
+
+        self.assertEqual(pq.priority_type, self.PRIORITY_TYPE)
+
+    def test_incorrect_priority_type(self) -> None:
+        with self.assertRaises(ValueError):
+            KeyedPQ(priority_type=())
+        with self.assertRaises(ValueError):
+            KeyedPQ(priority_type=('float64',) * 5)
+        with self.assertRaises(ValueError):
+            KeyedPQ(priority_type=('float64', 'int32'))
+
+    def test_incorrect_priority(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ(priority_type=self.PRIORITY_TYPE)
+
+        with self.assertRaises(TypeError):
+            pq.add('a', 1.0, None)
+        with self.assertRaises(ValueError):
+            pq.add('a', (1.0, 2), None)
+        with self.assertRaises(TypeError):
+            pq.add('a', (1.0, 2, 3.5), None)
+
+        self.assertEqual(len(pq), 0)
+
+        pq.add('a', (1.0, 2, 3), None)
+        with self.assertRaises(ValueError):
+            pq.change_value('a', (1.0, 2, 3, 4))
+        self.assertEqual(pq['a'].value, (1.0, 2, 3))
+
+    def test_lexicographic_order(self) -> None:
+        for max_heap in [False, True]:
+            priorities = [self._random_priority() for _ in range(1000)]
+            pq: KeyedPQ[int] = KeyedPQ(
+                ((str(i), priority, i) for i, priority in enumerate(priorities)),
+                max_heap=max_heap,
+                priority_type=self.PRIORITY_TYPE,
+            )
+
+            self.assertTrue(pq._verify_invariants())
+
+            for i in range(0, 1000, 3):
+                priorities[i] = self._random_priority()
+                pq.change_value(str(i), priorities[i])
+                self.assertEqual(pq[str(i)].value, priorities[i])
+            self.assertTrue(pq._verify_invariants())
+
+            for i in range(1000, 1500):
+                priorities.append(self._random_priority())
+                pq.add(str(i), priorities[i], i)
+            self.assertTrue(pq._verify_invariants())
+
+            popped = [pq.pop()[1] for _ in range(len(pq))]
+            self.assertEqual(popped, sorted(priorities, reverse=max_heap))
+
+
+class DataTypeTest(unittest.TestCase):
+    def _assert_released(self, ref: "weakref.ReferenceType[DummyClass]") -> None:
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_default(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ()
+
+        self.assertEqual(pq.data_type, 'object')
+
+    def test_unknown(self) -> None:
+        with self.assertRaises(ValueError):
+            KeyedPQ(data_type='int32')
+
+    def test_none(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ([('a', 1.0), ('b', 2.0, None)], data_type='none')
+        pq.add('c', 3.0)
+
+        self.assertEqual(pq.data_type, 'none')
+        self.assertIsNone(pq['c'].data)
+        self.assertEqual(pq.pop(), ('a', 1.0, None))
+
+        with self.assertRaises(TypeError):
+            pq.add('d', 4.0, typing.cast(None, 4))
+        self.assertFalse('d' in pq)
+
+    def test_int64(self) -> None:
+        pq: KeyedPQ[int] = KeyedPQ([('a', 1.0, 2 ** 62)], data_type='int64')
+        pq.add('b', 2.0, -5)
+
+        self.assertEqual(pq['a'].data, 2 ** 62)
+        self.assertEqual(pq.pop(), ('a', 1.0, 2 ** 62))
+        self.assertEqual(pq.pop(), ('b', 2.0, -5))
+
+        with self.assertRaises(TypeError):
+            pq.add('c', 3.0, typing.cast(int, 4.5))
+        with self.assertRaises(OverflowError):
+            pq.add('c', 3.0, 2 ** 64)
+        self.assertEqual(len(pq), 0)
+
+    def test_float64(self) -> None:
+        pq: KeyedPQ[float] = KeyedPQ(data_type='float64')
+        pq.add('a', 1.0, 3)
+
+        data = pq['a'].data
+        self.assertEqual(data, 3.0)
+        self.assertIs(type(data), float)
+
+        with self.assertRaises(TypeError):
+            pq.add('b', 2.0, typing.cast(float, 'x'))
+        self.assertEqual(len(pq), 1)
+
+    def test_object_released(self) -> None:
+        pq: KeyedPQ[DummyClass] = KeyedPQ()
+
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq.add('a', 1.0, dummy)
+        del dummy
+        self.assertIsNotNone(ref())
+        pq.pop()
+        self._assert_released(ref)
+
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq.add('a', 1.0, dummy)
+        del dummy
+        del pq['a']
+        self._assert_released(ref)
+
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq.add('a', 1.0, dummy)
+        del dummy
+        pq.clear()
+        self._assert_released(ref)
+
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq.add('a', 1.0, dummy)
+        del dummy
+        del pq
+        self._assert_released(ref)
+
+
+class GarbageCollectionTest(unittest.TestCase):
+    def test_referents(self) -> None:
+        dummy = DummyClass()
+        pq: KeyedPQ[DummyClass] = KeyedPQ([('a', 1.0, dummy)])
+        pq.add('b', 2.0, dummy)
+
+        self.assertEqual(gc.get_referents(pq).count(dummy), 2)
+        self.assertTrue(gc.is_tracked(pq))
+
+    def test_cycle_collected(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq: KeyedPQ[DummyClass] = KeyedPQ()
+        pq.add('a', 1.0, dummy)
+        setattr(dummy, 'pq', pq)
+        del dummy, pq
+
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_clear_reentrant(self) -> None:
+        pq: KeyedPQ[object] = KeyedPQ()
+        lengths: typing.List[int] = []
+
+        class Finalised(object):
+            def __del__(self) -> None:
+                lengths.append(len(pq))
+                pq.add('b', 2.0, None)
+
+        pq.add('a', 1.0, Finalised())
+        pq.clear()
+
+        self.assertEqual(lengths, [0])
+        self.assertEqual(len(pq), 1)
+        self.assertTrue(pq._verify_invariants())
+
+    def test_failed_initialisation_released(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+
+        def elements() -> typing.Iterator[typing.Tuple[str, float, DummyClass]]:
+            yield ('a', 1.0, dummy)
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            KeyedPQ(elements())
+        del dummy
+
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+class BulkTest(unittest.TestCase):
+    def _assert_pops(self, pq: "KeyedPQ[typing.Any]", expected: typing.List[typing.Tuple[str, typing.Any, typing.Any]]) -> None:
+        self.assertTrue(pq._verify_invariants())
+        self.assertEqual([pq.pop() for _ in range(len(pq))], expected)
+
+    def test_from_arrays(self) -> None:
+        pq: KeyedPQ[int] = KeyedPQ.from_arrays(['a', 'b', 'c'], [3.0, 1.0, 2.0], [1, 2, 3])
+
+        self._assert_pops(pq, [('b', 1.0, 2), ('c', 2.0, 3), ('a', 3.0, 1)])
+
+    def test_from_arrays_buffer(self) -> None:
+        for priority_type, typecode in [('float64', 'd'), ('int64', 'q'), ('float32', 'f')]:
+            priorities = array.array(typecode, [3, 1, 2])
+            pq: KeyedPQ[None] = KeyedPQ.from_arrays(['a', 'b', 'c'], priorities, priority_type=priority_type)
+
+            self.assertEqual(pq.priority_type, priority_type)
+            self._assert_pops(pq, [('b', 1, None), ('c', 2, None), ('a', 3, None)])
+
+        strided = memoryview(array.array('d', [2.0, 0.0, 3.0, 0.0, 1.0]))[::2]
+        pq = KeyedPQ.from_arrays(['a', 'b', 'c'], strided, max_heap=True)
+        self._assert_pops(pq, [('b', 3.0, None), ('a', 2.0, None), ('c', 1.0, None)])
+
+    def test_from_arrays_buffer_mismatch(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ.from_arrays(['a', 'b'], array.array('f', [2.5, 1.5]))
+        self._assert_pops(pq, [('b', 1.5, None), ('a', 2.5, None)])
+
+        with self.assertRaises(TypeError):
+            KeyedPQ.from_arrays(['a', 'b'], array.array('d', [2.5, 1.5]), priority_type='int64')
+
+    def test_from_arrays_composite(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ.from_arrays(['a', 'b'], [(1, 2), (1, 1)], priority_type=('int64', 'int64'))
+
+        self._assert_pops(pq, [('b', (1, 1), None), ('a', (1, 2), None)])
+
+    def test_add_many(self) -> None:
+        rand = random.Random(0)
+        pq: KeyedPQ[None] = KeyedPQ((str(i), rand.random(), None) for i in range(100))
+        expected = {key: item.value for key, item in pq.items()}
+
+        for size in [1, 10, 200, 1000]:
+            keys = [str(len(expected) + i) for i in range(size)]
+            priorities = array.array('d', [rand.random() for _ in range(size)])
+            pq.add_many(keys, priorities)
+            expected.update(zip(keys, priorities))
+            self.assertTrue(pq._verify_invariants())
+
+        self.assertEqual(len(pq), len(expected))
+        self.assertEqual(
+            [pq.pop()[:2] for _ in range(len(pq))],
+            sorted(expected.items(), key=lambda el: el[1]),
+        )
+
+    def test_add_many_length_mismatch(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ()
+
+        with self.assertRaises(ValueError):
+            pq.add_many(['a', 'b'], [1.0])
+        with self.assertRaises(ValueError):
+            pq.add_many(['a', 'b'], [1.0, 2.0], [None])
+        self.assertEqual(len(pq), 0)
+
+    def test_add_many_failure_atomic(self) -> None:
+        pq: KeyedPQ[DummyClass] = KeyedPQ([('a', 1.0, DummyClass())])
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+
+        with self.assertRaises(KeyError):
+            pq.add_many(['b', 'a'], [2.0, 3.0], [dummy, dummy])
+        with self.assertRaises(KeyError):
+            pq.add_many(['b', 'b'], [2.0, 3.0], [dummy, dummy])
+        with self.assertRaises(TypeError):
+            pq.add_many(['b', 'c'], [2.0, typing.cast(float, 'x')], [dummy, dummy])
+
+        self.assertEqual(list(pq.keys()), ['a'])
+        self.assertTrue(pq._verify_invariants())
+        del dummy
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+    def test_upsert_many(self) -> None:
+        pq: KeyedPQ[int] = KeyedPQ([('a', 5.0, 1), ('b', 3.0, 2)])
+
+        self.assertEqual(pq.upsert_many(['a', 'c', 'c'], [1.0, 4.0, 2.0], [10, 20, 30]), (1, 2))
+        self._assert_pops(pq, [('a', 1.0, 1), ('c', 2.0, 20), ('b', 3.0, 2)])
+
+    def test_upsert_many_policies(self) -> None:
+        combine: typing.Dict[str, typing.Callable[[float, float], float]] = {
+            'replace': lambda old, new: new,
+            'min': min,
+            'max': max,
+            'sum': lambda old, new: old + new,
+        }
+
+        for policy, f in combine.items():
+            rand = random.Random(0)
+            pq: KeyedPQ[None] = KeyedPQ((str(i), float(rand.randrange(100)), None) for i in range(100))
+            expected = {key: item.value for key, item in pq.items()}
+
+            # covers fixing entries one by one as well as rebuilding the heap
+            for size in [1, 10, 100, 1000]:
+                keys = [str(rand.randrange(300)) for _ in range(size)]
+                priorities = [float(rand.randrange(100)) for _ in range(size)]
+
+                inserted = 0
+                for key, priority in zip(keys, priorities):
+                    if key in expected:
+                        expected[key] = f(expected[key], priority)
+                    else:
+                        expected[key] = priority
+                        inserted += 1
+
+                self.assertEqual(pq.upsert_many(keys, priorities, policy=policy), (inserted, size - inserted))
+                self.assertTrue(pq._verify_invariants())
+                self.assertEqual({key: item.value for key, item in pq.items()}, expected)
+
+    def test_upsert_many_unchanged(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ([('a', 1.0, None), ('b', 1.0, None)])
+
+        # an entry keeps its position among equal priorities if unchanged
+        pq.upsert_many(['a'], [2.0], policy='min')
+        self._assert_pops(pq, [('a', 1.0, None), ('b', 1.0, None)])
+
+    def test_upsert_many_composite(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ([('a', (1, 5), None)], priority_type=('int64', 'int64'))
+
+        pq.upsert_many(['a', 'b'], [(1, 3), (0, 1)], policy='min')
+        pq.upsert_many(['a', 'b'], [(1, 4), (0, 2)], policy='max')
+        self._assert_pops(pq, [('b', (0, 2), None), ('a', (1, 4), None)])
+
+        with self.assertRaises(ValueError):
+            pq.upsert_many(['a'], [(1, 1)], policy='sum')
+
+    def test_upsert_many_sum_saturates(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ([('a', 2 ** 63 - 2, None), ('b', -2 ** 63 + 2, None)], priority_type='int64')
+
+        pq.upsert_many(['a', 'b'], [5, -5], policy='sum')
+        self.assertEqual(pq['a'].value, 2 ** 63 - 1)
+        self.assertEqual(pq['b'].value, -2 ** 63)
+
+    def test_upsert_many_errors(self) -> None:
+        pq: KeyedPQ[DummyClass] = KeyedPQ([('a', 1.0, DummyClass())])
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+
+        with self.assertRaises(ValueError):
+            pq.upsert_many(['a'], [2.0], policy='median')
+        with self.assertRaises(TypeError):
+            pq.upsert_many(['b', 'c'], [2.0, typing.cast(float, 'x')], [dummy, dummy])
+        self.assertEqual(list(pq.keys()), ['a'])
+
+        # data of updated entries is discarded
+        pq.upsert_many(['a'], [2.0], [dummy])
+        self.assertIsNot(pq['a'].data, dummy)
+        del dummy
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+    def test_relax_many(self) -> None:
+        pq: KeyedPQ[str] = KeyedPQ([('a', 5.0, 'x'), ('b', 1.0, 'y')])
+
+        # inserts c, lowers a twice, leaves b unchanged
+        self.assertEqual(pq.relax_many(['a', 'b', 'c', 'a', 'a'], [4.0, 2.0, 3.0, 4.5, 0.5], ['p', 'q', 'r', 's', 't']), 3)
+        self._assert_pops(pq, [('a', 0.5, 't'), ('b', 1.0, 'y'), ('c', 3.0, 'r')])
+
+        max_pq: KeyedPQ[None] = KeyedPQ([('a', 5.0, None)], max_heap=True)
+        self.assertEqual(max_pq.relax_many(['a', 'a'], [4.0, 6.0]), 1)
+        self.assertEqual(max_pq['a'].value, 6.0)
+
+    def test_increment_many(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ([('a', 1.0, None), ('b', 2.0, None)])
+
+        pq.increment_many(['b', 'a', 'b'], [-1.5, 2.0, -1.0])
+        self._assert_pops(pq, [('b', -0.5, None), ('a', 3.0, None)])
+
+        pq.increment_many(['a', 'b', 'a'], array.array('d', [1.0, 2.0, 3.0]), default=10.0)
+        self._assert_pops(pq, [('b', 12.0, None), ('a', 14.0, None)])
+
+        pq.add('a', 1.0, None)
+        with self.assertRaises(KeyError) as cm:
+            pq.increment_many(('a', 'b'), [1.0, 1.0])
+        self.assertEqual(cm.exception.args, ('b',))
+        self._assert_pops(pq, [('a', 1.0, None)])
+
+        # large batches modify the heap in place and rebuild it
+        pq = KeyedPQ((str(i), float(i), None) for i in range(100))
+        pq.increment_many([str(i) for i in range(0, 100, 2)], [100.0] * 50)
+        self._assert_pops(pq, [(str(i), float(i), None) for i in range(1, 100, 2)] + [(str(i), float(i + 100), None) for i in range(0, 100, 2)])
+
+    def test_discard_many(self) -> None:
+        for n in (10, 100):
+            pq: KeyedPQ[int] = KeyedPQ((str(i), float(i), i) for i in range(n))
+            item = pq['3']
+
+            self.assertEqual(pq.discard_many(['1', item, 'missing', '1', '5']), 3)
+            self.assertNotIn('3', pq)
+            self._assert_pops(pq, [(str(i), float(i), i) for i in range(n) if i not in (1, 3, 5)])
+
+            # large batches compact the heap and rebuild it
+            pq = KeyedPQ((str(i), float(i), i) for i in range(n))
+            self.assertEqual(pq.discard_many([str(i) for i in range(0, n, 3)] + [str(i) for i in range(1, n, 3)]), n - n // 3)
+            self._assert_pops(pq, [(str(i), float(i), i) for i in range(2, n, 3)])
+
+        with self.assertRaises(TypeError):
+            pq.discard_many(typing.cast(typing.Any, [1]))
+
+    def test_discard_many_data(self) -> None:
+        dummies = [DummyClass() for _ in range(4)]
+        refs = [weakref.ref(dummy) for dummy in dummies]
+        pq: KeyedPQ[DummyClass] = KeyedPQ((str(i), float(i), dummy) for i, dummy in enumerate(dummies))
+        del dummies
+
+        pq.discard_many(['0'])
+        self.assertIsNone(refs[0]())
+        pq.discard_many(['1', '2', '3'])
+        self.assertEqual([ref() for ref in refs], [None] * 4)
+
+    def test_retain_remove_where(self) -> None:
+        pq: KeyedPQ[int] = KeyedPQ((str(i), float(i), i) for i in range(20))
+
+        self.assertEqual(pq.remove_where(lambda key, priority, data: data % 2 == 0), 10)
+        self.assertEqual(pq.retain(lambda key, priority, data: priority < 15), 3)
+        self._assert_pops(pq, [(str(i), float(i), i) for i in range(1, 15, 2)])
+
+        max_pq: KeyedPQ[None] = KeyedPQ([('a', (1.0, 2), None), ('b', (3.0, 4), None)], max_heap=True, priority_type=('float64', 'int64'))
+        seen: typing.List[typing.Tuple[str, typing.Any, None]] = []
+
+        def predicate(key: str, priority: typing.Any, data: None) -> bool:
+            seen.append((key, priority, data))
+            return key == 'a'
+
+        self.assertEqual(max_pq.retain(predicate), 1)
+        self.assertEqual(sorted(seen), [('a', (1.0, 2), None), ('b', (3.0, 4), None)])
+        self.assertEqual(list(max_pq.keys()), ['a'])
+
+    def test_remove_where_modifying(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ((str(i), float(i), None) for i in range(10))
+
+        def predicate(key: str, priority: float, data: None) -> bool:
+            # removes the entry with the next key and replaces it
+            next_key = str(int(key) + 1)
+            if next_key in pq:
+                del pq[next_key]
+                pq.add('new' + next_key, 0.0, None)
+            return True
+
+        pq.remove_where(predicate)
+        self.assertTrue(pq._verify_invariants())
+        self.assertTrue(all(key.startswith('new') for key in pq.keys()))
+
+        def failing(key: str, priority: float, data: None) -> bool:
+            raise RuntimeError()
+
+        n = len(pq)
+        with self.assertRaises(RuntimeError):
+            pq.retain(failing)
+        self.assertEqual(len(pq), n)
+
+    def test_merge(self) -> None:
+        pq: KeyedPQ[str] = KeyedPQ([('a', 1.0, 'a'), ('b', 2.0, 'b')])
+        other: KeyedPQ[str] = KeyedPQ([('c', 1.0, 'c'), ('d', 0.5, 'd')])
+        item = other['c']
+
+        pq.merge(other)
+        self.assertEqual(len(other), 0)
+        self.assertTrue(other._verify_invariants())
+        self.assertTrue(pq._verify_invariants())
+        # equal priorities of other are ordered after those of pq
+        self.assertEqual([(i.key, i.value, i.data) for i in pq.ordered_iter()], [
+            ('d', 0.5, 'd'), ('a', 1.0, 'a'), ('c', 1.0, 'c'), ('b', 2.0, 'b'),
+        ])
+        self.assertNotIn(item, pq)
+
+        other.add('e', 0.0, 'e')
+        self.assertEqual(other.pop(), ('e', 0.0, 'e'))
+
+    def test_merge_policies(self) -> None:
+        for policy, expected in [
+            ('keep', [('a', 1.0, 'a'), ('b', 2.0, 'b')]),
+            ('replace', [('b', 0.5, 'B'), ('a', 3.0, 'A')]),
+            ('min', [('b', 0.5, 'B'), ('a', 1.0, 'a')]),
+            ('max', [('b', 2.0, 'b'), ('a', 3.0, 'A')]),
+            ('sum', [('b', 2.5, 'b'), ('a', 4.0, 'a')]),
+        ]:
+            with self.subTest(policy=policy):
+                pq: KeyedPQ[str] = KeyedPQ([('a', 1.0, 'a'), ('b', 2.0, 'b')])
+                other: KeyedPQ[str] = KeyedPQ([('a', 3.0, 'A'), ('b', 0.5, 'B'), ('c', 5.0, 'c')])
+                pq.merge(other, policy)
+                self.assertTrue(pq._verify_invariants())
+                self.assertEqual([(i.key, i.value, i.data) for i in pq.ordered_iter()], expected + [('c', 5.0, 'c')])
+
+    def test_merge_errors(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ([('a', 1.0, None), ('b', 2.0, None)])
+        other: KeyedPQ[None] = KeyedPQ([('c', 1.0, None), ('b', 0.5, None)])
+
+        with self.assertRaises(KeyError):
+            pq.merge(other)
+        self.assertEqual(len(pq), 2)
+        self.assertEqual(len(other), 2)
+
+        with self.assertRaises(ValueError):
+            pq.merge(other, 'unknown')
+        with self.assertRaises(ValueError):
+            pq.merge(pq)
+        with self.assertRaises(TypeError):
+            pq.merge(typing.cast(typing.Any, None))
+        with self.assertRaises(ValueError):
+            pq.merge(KeyedPQ(max_heap=True))
+        with self.assertRaises(ValueError):
+            pq.merge(KeyedPQ(priority_type='int64'))
+        with self.assertRaises(ValueError):
+            pq.merge(KeyedPQ(data_type='none'))
+        composite: KeyedPQ[None] = KeyedPQ(priority_type=('float64', 'int64'))
+        with self.assertRaises(ValueError):
+            composite.merge(KeyedPQ(priority_type=('float64', 'int64')), 'sum')
+
+    def test_merge_transformed(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ((str(i), float(i), None) for i in range(10))
+        other: KeyedPQ[None] = KeyedPQ((str(i), float(i), None) for i in range(10, 20))
+        pq.shift_all(1.0)
+        other.scale_all(0.5)
+
+        pq.merge(other)
+        self.assertTrue(pq._verify_invariants())
+        self.assertEqual(list(pq.sorted_snapshot()[1]), sorted([i + 1.0 for i in range(10)] + [i * 0.5 for i in range(10, 20)]))
+
+        # sums of priorities sharing the same offset
+        pq = KeyedPQ([('x', 10.0, None), ('y', 1.0, None)])
+        other = KeyedPQ([('x', 5.0, None)])
+        pq.shift_all(100.0)
+        other.shift_all(100.0)
+        pq.merge(other, policy='sum')
+        self.assertTrue(pq._verify_invariants())
+        self.assertEqual(pq['x'].value, 215.0)
+        self.assertEqual(pq['y'].value, 101.0)
+
+    def test_split(self) -> None:
+        pq: KeyedPQ[int] = KeyedPQ((str(i), float(i % 10), i) for i in range(100))
+        pq.shift_all(0.5)
+        item = pq['0']
+
+        below = pq.split(3.5)
+        self.assertTrue(pq._verify_invariants())
+        self.assertTrue(below._verify_invariants())
+        self.assertEqual(len(below), 40)
+        self.assertEqual(len(pq), 60)
+        self.assertTrue(all(i.value <= 3.5 for i in below.ordered_iter()))
+        self.assertTrue(all(i.value > 3.5 for i in pq.ordered_iter()))
+        self.assertEqual(below['10'].data, 10)
+        self.assertNotIn(item, pq)
+        self.assertNotIn(item, below)
+        self.assertEqual(len(pq.split(5.5, inclusive=False)), 10)
+
+        even = pq.split(lambda key, priority, data: data % 2 == 0)
+        self.assertTrue(pq._verify_invariants())
+        self.assertTrue(even._verify_invariants())
+        self.assertEqual(sorted(even.keys()), sorted(str(i) for i in range(100) if i % 2 == 0 and i % 10 > 4))
+        self.assertEqual(len(pq) + len(even), 50)
+
+        # the order of equal priorities is kept
+        fifo: KeyedPQ[None] = KeyedPQ((str(i), float(i % 2), None) for i in range(10))
+        self.assertEqual([i.key for i in fifo.split(0.0).ordered_iter()], ['0', '2', '4', '6', '8'])
+
+        even.merge(pq)
+        self.assertEqual(len(even), 50)
+        self.assertTrue(even._verify_invariants())
+
+    def test_get_priorities(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ((str(i), i * 0.5, None) for i in range(10))
+        pq.scale_all(2.0)
+
+        priorities = pq.get_priorities(['3', 'missing', '0'])
+        self.assertIsInstance(priorities, array.array)
+        self.assertEqual(priorities[0], 3.0)
+        self.assertTrue(math.isnan(priorities[1]))
+        self.assertEqual(priorities[2], 0.0)
+        self.assertEqual(list(pq.get_priorities(('1', 'missing'), -1.0)), [1.0, -1.0])
+        self.assertEqual(list(pq.get_priorities([])), [])
+        self.assertEqual(list(pq.get_priorities(str(i) for i in range(3))), [0.0, 1.0, 2.0])
+
+        for priority_type in ('int64', 'float32'):
+            with self.subTest(priority_type=priority_type):
+                typed_pq: KeyedPQ[None] = KeyedPQ([('a', 3, None)], priority_type=priority_type)
+                self.assertEqual(list(typed_pq.get_priorities(['a', 'b'], 0.0)), [3.0, 0.0])
+
+        with self.assertRaises(ValueError):
+            KeyedPQ(priority_type=('float64', 'int64')).get_priorities(['a'])
+        with self.assertRaises(TypeError):
+            pq.get_priorities(typing.cast(typing.Any, [1]))
+
+    def test_get_data_many(self) -> None:
+        pq: KeyedPQ[int] = KeyedPQ((str(i), float(i), i) for i in range(10))
+
+        self.assertEqual(pq.get_data_many(['3', 'missing', '0']), [3, None, 0])
+        self.assertEqual(pq.get_data_many(['missing', '9'], -1), [-1, 9])
+        self.assertEqual(pq.get_data_many(iter(['1', 'missing'])), [1, None])
+
+        none_pq: KeyedPQ[None] = KeyedPQ([('a', 1.0, None)], data_type='none')
+        self.assertEqual(none_pq.get_data_many(['a', 'b'], 0), [None, 0])
+
+    def test_slots(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ((str(i), float(i), None) for i in range(10))
+
+        slots = pq.slots()
+        self.assertIsInstance(slots, array.array)
+        self.assertEqual(sorted(slots), list(range(10)))
+        self.assertEqual([pq.slot(key) for key in pq.keys_list()], list(slots))
+        self.assertEqual(pq.slot(pq['3']), pq.slot('3'))
+
+        # slots are kept while entries move and reused once they are removed
+        slot = pq.slot('5')
+        pq.change_value('5', -1.0)
+        self.assertEqual(pq.slot('5'), slot)
+        del pq['5']
+        pq.add('new', 0.0, None)
+        self.assertEqual(pq.slot('new'), slot)
+
+        with self.assertRaises(KeyError):
+            pq.slot('5')
+
+    def test_set_priorities(self) -> None:
+        pq: KeyedPQ[int] = KeyedPQ((str(i), float(i), i) for i in range(100))
+        pq.shift_all(1.0)
+
+        pq.set_priorities([pq.slot('50'), pq.slot('60')], [-2.0, -1.0])
+        self.assertTrue(pq._verify_invariants())
+        self.assertEqual(pq.pop(), ('50', -2.0, 50))
+        self.assertEqual(pq.pop(), ('60', -1.0, 60))
+
+        slots = pq.slots()
+        keys = pq.keys_list()
+        priorities = [float(-int(key)) for key in keys]
+        pq.set_priorities(slots, array.array('d', priorities))
+        self.assertTrue(pq._verify_invariants())
+        self.assertEqual(list(pq.get_priorities(keys)), priorities)
+        self.assertEqual(pq.peek().key, '99')
+
+        # an int64 buffer of slots
+        pq.set_priorities(array.array('q', [pq.slot('0')]), [-200.0])
+        self.assertEqual(pq.peek().key, '0')
+
+        composite: KeyedPQ[None] = KeyedPQ([('a', (1.0, 2), None), ('b', (1.0, 1), None)], priority_type=('float64', 'int64'))
+        composite.set_priorities([composite.slot('a')], [(1.0, 0)])
+        self.assertEqual(composite.peek().key, 'a')
+        self.assertTrue(composite._verify_invariants())
+
+    def test_set_priorities_errors(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ((str(i), float(i), None) for i in range(10))
+        free_slot = pq.slot('3')
+        del pq['3']
+
+        for slots in ([free_slot], [100], [-1], array.array('q', [-1])):
+            with self.subTest(slots=slots):
+                with self.assertRaises(KeyError):
+                    pq.set_priorities(typing.cast(typing.Any, slots), [0.0] * len(slots))
+        with self.assertRaises(TypeError):
+            pq.set_priorities(typing.cast(typing.Any, [1.0]), [0.0])
+        with self.assertRaises(ValueError):
+            pq.set_priorities([0, 1], [0.0])
+        # nothing is changed if any slot is invalid
+        with self.assertRaises(KeyError):
+            pq.set_priorities([0, free_slot], [-1.0, -1.0])
+        self.assertEqual(pq.peek().value, 0.0)
+        self.assertTrue(pq._verify_invariants())
+
+    def test_priorities_view(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ((str(i), float(i), None) for i in range(100))
+        pq.shift_all(0.5)
+        pq.scale_all(2.0)
+
+        with pq.priorities_view() as view:
+            self.assertTrue(view.readonly)
+            self.assertEqual(view.format, 'd')
+            self.assertEqual(view.tolist(), pq._export())
+            self.assertEqual(view.tolist(), list(pq.priorities_array()))
+            self.assertEqual(array.array('d', view), pq.priorities_array())
+        with pq.timestamps_view() as view:
+            self.assertEqual(len(view), 100)
+            self.assertEqual(len(set(view.tolist())), 100)
+
+        for priority_type, format in [('int64', 'q'), ('float32', 'f')]:
+            with self.subTest(priority_type=priority_type):
+                typed_pq: KeyedPQ[None] = KeyedPQ.from_arrays([str(i) for i in range(10)], list(range(10)), priority_type=priority_type)
+                with typed_pq.priorities_view() as view:
+                    self.assertEqual(view.format, format)
+                    self.assertEqual(view.tolist(), list(typed_pq.priorities_array()))
+
+        self.assertEqual(KeyedPQ().priorities_view().tolist(), [])
+        with self.assertRaises(ValueError):
+            KeyedPQ(priority_type=('float64', 'int64')).priorities_view()
+
+    def test_priorities_view_mutation(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ((str(i), float(i), None) for i in range(10))
+        other: KeyedPQ[None] = KeyedPQ([('other', 0.0, None)])
+        views = [pq.priorities_view(), pq.timestamps_view()]
+
+        mutations: typing.List[typing.Callable[[], object]] = [
+            lambda: pq.add('new', 0.0, None),
+            lambda: pq.pop(),
+            lambda: pq.change_value('1', 5.0),
+            lambda: pq.__delitem__('1'),
+            lambda: pq.clear(),
+            lambda: pq.add_many(['new'], [0.0]),
+            lambda: pq.set_priorities([0], [0.0]),
+            lambda: pq.shift_all(1.0),
+            lambda: pq.merge(other),
+            lambda: other.merge(pq),
+            lambda: pq.split(5.0),
+        ]
+        for mutate in mutations:
+            with self.assertRaises(BufferError):
+                mutate()
+        self.assertEqual(len(pq), 10)
+        self.assertEqual(len(other), 1)
+        self.assertEqual(views[0].tolist(), [float(i) for i in range(10)])
+
+        views[0].release()
+        with self.assertRaises(BufferError):
+            pq.pop()
+        views[1].release()
+        self.assertEqual(pq.pop(), ('0', 0.0, None))
+
+        # views keep their PQ alive
+        view = KeyedPQ([('a', 1.0, None)]).priorities_view()
+        gc.collect()
+        self.assertEqual(view.tolist(), [1.0])
+
+    def test_view_taken_by_callback(self) -> None:
+        pq: KeyedPQ[None] = KeyedPQ((str(i), float(i), None) for i in range(100))
+        views: typing.List[memoryview] = []
+
+        def predicate(key: str, priority: float, data: None) -> bool:
+            views.append(pq.priorities_view())
+            return True
+
+        def identifiers() -> typing.Iterator[str]:
+            views.append(pq.timestamps_view())
+            yield '1'
+
+        class Priority(object):
+            def __float__(self) -> float:
+                views.append(pq.priorities_view())
+                return 0.0
+
+        # views exported by predicates or conversions prevent the following
+        # modification
+        mutations: typing.List[typing.Callable[[], object]] = [
+            lambda: pq.retain(predicate),
+            lambda: pq.remove_where(predicate),
+            lambda: pq.split(predicate),
+            lambda: pq.discard_many(identifiers()),
+            lambda: pq.add_many(['new'], typing.cast(typing.Any, [Priority()])),
+            lambda: pq.upsert_many(['1'], typing.cast(typing.Any, [Priority()])),
+            lambda: pq.set_priorities([0], typing.cast(typing.Any, [Priority()])),
+        ]
+        for mutate in mutations:
+            with self.assertRaises(BufferError):
+                mutate()
+            self.assertEqual(len(pq), 100)
+            self.assertEqual(len(views[-1]), 100)
+            for view in views:
+                view.release()
+            views.clear()
+        self.assertTrue(pq._verify_invariants())
+
+    def test_pop_many(self) -> None:
+        pq: KeyedPQ[int] = KeyedPQ((str(i), float(i % 5), i) for i in range(10))
+
+        self.assertEqual(pq.pop_many(3), [('0', 0.0, 0), ('5', 0.0, 5), ('1', 1.0, 1)])
+        self.assertEqual(pq.pop_many(0), [])
+        self.assertEqual(len(pq), 7)
+        self.assertTrue(pq._verify_invariants())
+
+        self.assertEqual(len(pq.pop_many(100)), 7)
+        self.assertEqual(pq.pop_many(), [])
+
+        with self.assertRaises(ValueError):
+            pq.pop_many(-1)
+        with self.assertRaises(TypeError):
+            pq.pop_many(typing.cast(typing.Any, 2.5))
+
+    def test_pop_many_until(self) -> None:
+        pq: KeyedPQ[int] = KeyedPQ((str(i), float(i % 5), i) for i in range(10))
+
+        self.assertEqual(pq.pop_many(until=0.5), [('0', 0.0, 0), ('5', 0.0, 5)])
+        self.assertEqual(pq.pop_many(until=1.0, inclusive=False), [])
+        self.assertEqual(pq.pop_many(until=2.0), [('1', 1.0, 1), ('6', 1.0, 6), ('2', 2.0, 2), ('7', 2.0, 7)])
+        self.assertEqual(pq.pop_many(1, until=4.0), [('3', 3.0, 3)])
+        self.assertTrue(pq._verify_invariants())
+
+        max_pq: KeyedPQ[None] = KeyedPQ([('a', 1.0, None), ('b', 2.0, None)], max_heap=True)
+        self.assertEqual(max_pq.pop_many(until=2.0, inclusive=False), [])
+        self.assertEqual(max_pq.pop_many(until=1.5), [('b', 2.0, None)])
+
+        composite_pq: KeyedPQ[None] = KeyedPQ([('a', (1, 2), None), ('b', (1, 1), None)], priority_type=('int64', 'int64'))
+        self.assertEqual(composite_pq.pop_many(until=(1, 1)), [('b', (1, 1), None)])
+
+    def test_pop_many_columns(self) -> None:
+        for priority_type, typecode in [('float64', 'd'), ('int64', 'q'), ('float32', 'f')]:
+            pq: KeyedPQ[int] = KeyedPQ([('a', 2, 1), ('b', 1, 2)], priority_type=priority_type)
+
+            keys, priorities, data = pq.pop_many(columns=True)
+            self.assertEqual(keys, ['b', 'a'])
+            self.assertIsInstance(priorities, array.array)
+            self.assertEqual(typing.cast("array.array[typing.Any]", priorities).typecode, typecode)
+            self.assertEqual(list(priorities), [1, 2])
+            self.assertEqual(data, [2, 1])
+
+        composite_pq: KeyedPQ[None] = KeyedPQ([('a', (1, 2), None)], priority_type=('int64', 'int64'))
+        self.assertEqual(composite_pq.pop_many(columns=True), (['a'], [(1, 2)], [None]))
+
+    def test_pop_many_data(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq: KeyedPQ[DummyClass] = KeyedPQ([('a', 1.0, dummy)])
+        del dummy
+
+        popped = pq.pop_many()
+        self.assertIs(popped[0][2], ref())
+        del popped
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+    def test_peek_many(self) -> None:
+        rand = random.Random(0)
+        for max_heap in (False, True):
+            pq: KeyedPQ[int] = KeyedPQ(((str(i), float(rand.randrange(50)), i) for i in range(200)), max_heap=max_heap)
+            ordered = [(item.key, item.value, item.data) for item in pq.ordered_iter()]
+
+            self.assertEqual(pq.peek_many(0), [])
+            self.assertEqual(pq.peek_many(10), ordered[:10])
+            self.assertEqual(pq.peek_many(1000), ordered)
+            self.assertEqual(len(pq), 200)
+            self.assertTrue(pq._verify_invariants())
+
+        self.assertEqual(pq.peek_many(2, columns=True), ([el[0] for el in ordered[:2]], array.array('d', [el[1] for el in ordered[:2]]), [el[2] for el in ordered[:2]]))
+
+        with self.assertRaises(ValueError):
+            pq.peek_many(-1)
+
+    def test_iter_below(self) -> None:
+        rand = random.Random(0)
+        for max_heap in (False, True):
+            pq: KeyedPQ[int] = KeyedPQ(((str(i), float(rand.randrange(50)), i) for i in range(200)), max_heap=max_heap)
+            entries = [(item.key, item.value, item.data) for item in pq.values()]
+
+            for threshold in (-1.0, 10.0, 25.0, 100.0):
+                for inclusive in (True, False):
+                    if max_heap:
+                        expected = [el for el in entries if el[1] > threshold or (inclusive and el[1] == threshold)]
+                    else:
+                        expected = [el for el in entries if el[1] < threshold or (inclusive and el[1] == threshold)]
+
+                    self.assertEqual(sorted(pq.iter_below(threshold, inclusive)), sorted(expected))
+
+            self.assertEqual(len(pq), 200)
+
+        composite_pq: KeyedPQ[None] = KeyedPQ([('a', (1, 2), None), ('b', (1, 1), None)], priority_type=('int64', 'int64'))
+        self.assertEqual(composite_pq.iter_below((1, 1), columns=True), (['b'], [(1, 1)], [None]))
+
+    def test_peek_many_data(self) -> None:
+        dummy = DummyClass()
+        pq: KeyedPQ[DummyClass] = KeyedPQ([('a', 1.0, dummy)])
+        refcount = sys.getrefcount(dummy)
+
+        peeked = pq.peek_many(1) + pq.iter_below(1.0)
+        self.assertIs(peeked[0][2], dummy)
+        self.assertIs(peeked[1][2], dummy)
+        del peeked
+        self.assertEqual(sys.getrefcount(dummy), refcount)
+
+
+    def test_sorted_snapshot(self) -> None:
+        rand = random.Random(0)
+        for priority_type in ('float64', 'int64', 'float32', ('int64', 'float64')):
+            if isinstance(priority_type, tuple):
+                random_priority: typing.Callable[[], typing.Any] = lambda: (rand.randrange(5), rand.random())
+            else:
+                random_priority = lambda: rand.randrange(20)
+
+            for max_heap in (False, True):
+                pq: KeyedPQ[int] = KeyedPQ(((str(i), random_priority(), i) for i in range(200)), max_heap=max_heap, priority_type=priority_type)
+                for _ in range(50):
+                    pq.change_value(str(rand.randrange(200)), random_priority())
+
+                keys, priorities, data = pq.sorted_snapshot()
+                self.assertEqual(
+                    list(zip(keys, priorities, data)),
+                    [(item.key, item.value, item.data) for item in pq.ordered_iter()],
+                )
+                self.assertEqual(len(pq), 200)
+
+        self.assertEqual(KeyedPQ().sorted_snapshot(), ([], array.array('d'), []))
+
+
 class MappingStyleInterfaceTest(unittest.TestCase):
     def setUp(self) -> None:
         self.pq: KeyedPQ[DummyClass] = KeyedPQ()
@@ -237,6 +1471,21 @@ class MappingStyleInterfaceTest(unittest.TestCase):
         self.assertIsNone(self.pq.get('a', default=None))
         self.assertEqual(self.pq.get('a', default=4.0), 4.0)
 
+    def test_get_item_default_invalid_identifier(self) -> None:
+        other: KeyedPQ[None] = KeyedPQ()
+        item = other.add('a', 1.0, None)
+        self.pq.add('a', 1.0, DummyClass())
+
+        self.assertEqual(self.pq.get(typing.cast(str, 4.0), default=4.0), 4.0)
+        self.assertEqual(self.pq.get(typing.cast(str, item), default=4.0), 4.0)
+        self.assertFalse(typing.cast(str, 4.0) in self.pq)
+        self.assertFalse(typing.cast(str, item) in self.pq)
+
+    def test_get_item_missing_key_error(self) -> None:
+        with self.assertRaises(KeyError) as cm:
+            self.pq['a']
+        self.assertEqual(cm.exception.args, ('a',))
+
     def test_get_item_default_existing(self) -> None:
         dummy = DummyClass()
         self.pq.add('a', 1.0, dummy)
@@ -294,21 +1543,60 @@ class MappingStyleInterfaceTest(unittest.TestCase):
             iter(self.pq),
         )
 
-        for key, value, (item_key, item_value), iter_value in zipped:
+        for key, value, (item_key, item_value), iter_key in zipped:
             self.assertTrue(key in self.pq)
 
             self.assertEqual(key, value.key)
             self.assertEqual(key, item_key)
             self.assertEqual(key, item_value.key)
-            self.assertEqual(key, iter_value.key)
+            self.assertEqual(key, iter_key)
 
             self.assertEqual(value.value, self.pq[key].value)
             self.assertEqual(value.value, item_value.value)
-            self.assertEqual(value.value, iter_value.value)
 
             self.assertIs(value.data, self.pq[key].data)
             self.assertIs(value.data, item_value.data)
-            self.assertIs(value.data, iter_value.data)
+
+        self.assertEqual(self.pq.keys_list(), list(self.pq.keys()))
+        self.assertEqual(list(self.pq.priorities_array()), [item.value for item in self.pq.values()])
+
+    def test_views(self) -> None:
+        dummy = DummyClass()
+        item_a = self.pq.add('a', 2.0, dummy)
+        item_b = self.pq.add('b', 1.0, dummy)
+        other: KeyedPQ[None] = KeyedPQ([('a', 1.0, None)])
+
+        self.assertIsInstance(self.pq, collections.abc.Mapping)
+
+        keys = self.pq.keys()
+        self.assertIsInstance(keys, collections.abc.KeysView)
+        self.assertEqual(len(keys), 2)
+        self.assertTrue('a' in keys)
+        self.assertFalse('c' in keys)
+        self.assertFalse(item_a in keys)
+        self.assertEqual(keys & {'a', 'c'}, {'a'})
+
+        values = self.pq.values()
+        self.assertIsInstance(values, collections.abc.ValuesView)
+        self.assertEqual(len(values), 2)
+        self.assertTrue(item_a in values)
+        self.assertFalse('a' in values)
+        self.assertFalse(other['a'] in values)
+        self.assertEqual([item.key for item in values], ['b', 'a'])
+
+        items = self.pq.items()
+        self.assertIsInstance(items, collections.abc.ItemsView)
+        self.assertEqual(len(items), 2)
+        self.assertTrue(('a', item_a) in items)
+        self.assertFalse(('a', item_b) in items)
+        self.assertFalse(('c', item_a) in items)
+        self.assertEqual(dict(items), {'a': item_a, 'b': item_b})
+
+        # views reflect changes of the PQ
+        del self.pq['a']
+        self.assertEqual(len(keys), 1)
+        self.assertFalse('a' in keys)
+        self.assertEqual(dict(self.pq), {'b': item_b})
 
     def test_clear(self) -> None:
         # Setup
@@ -382,6 +1670,98 @@ class ItemTest(unittest.TestCase):
         self._assert_not_equal(item_a, self)
         self._assert_not_equal(item_a, self.pq)
 
+    def test_reused_slot(self) -> None:
+        item_a = self.pq.add('a', 0.0, None)
+        del self.pq['a']
+        item_b = self.pq.add('b', 1.0, None)
+        item_a_readded = self.pq.add('a', 2.0, None)
+
+        self._assert_not_equal(item_a, item_b)
+        self._assert_not_equal(item_a, item_a_readded)
+        self.assertFalse(item_a in self.pq)
+        self.assertEqual(item_b.value, 1.0)
+
+        with self.assertRaises(KeyError):
+            self.pq.change_value(item_a, 3.0)
+        self.assertEqual(self.pq['a'].value, 2.0)
+        self.assertTrue(self.pq._verify_invariants())
+
+    def test_stale_item(self) -> None:
+        item_a = self.pq.add('a', 0.0, None)
+        item_b = self.pq.add('b', 1.0, None)
+        self.assertEqual(item_a.key, 'a')
+        self.pq.pop()
+        self.pq.clear()
+        self.pq.add('c', 2.0, None)
+
+        for item in [item_a, item_b]:
+            with self.assertRaises(KeyError):
+                item.value
+            with self.assertRaises(KeyError):
+                item.data
+            with self.assertRaises(KeyError):
+                del self.pq[item]
+
+            with self.assertRaises(KeyError):
+                item.key
+        self.assertEqual(len(self.pq), 1)
+
+    def test_unbound_item(self) -> None:
+        item: KeyedItem[None] = KeyedItem()
+
+        with self.assertRaises(KeyError):
+            item.value
+        with self.assertRaises(KeyError):
+            item.key
+
+    def test_item_keeps_pq_alive(self) -> None:
+        item = KeyedPQ([('a', 1.0, None)]).add('b', 2.0, None)
+        gc.collect()
+
+        self.assertEqual(item.key, 'b')
+        self.assertEqual(item.value, 2.0)
+        self.assertIsNone(item.data)
+
+    def test_item_reused(self) -> None:
+        item = self.pq.add('a', 0.0, None)
+
+        self.assertIs(self.pq['a'], item)
+        self.assertIs(self.pq.peek(), item)
+        self.assertIs(self.pq.change_value('a', 1.0), item)
+        self.assertIs(next(iter(self.pq.values())), item)
+
+        del item
+        item = self.pq['a']
+        self.assertEqual(item.key, 'a')
+        self.assertEqual(item.value, 1.0)
+        self.assertIs(self.pq.get('a'), item)
+        del self.pq['a']
+
+        item_readded = self.pq.add('a', 2.0, None)
+        self.assertIsNot(item_readded, item)
+        self._assert_not_equal(item_readded, item)
+
+    def test_return_item(self) -> None:
+        self.assertIsNone(self.pq.add('a', 0.0, None, return_item=False))
+        self.assertIsNone(self.pq.change_value('a', 1.0, return_item=False))
+        self.assertIsNone(self.pq.add_or_change_value('a', 2.0, None, return_item=False))
+        self.assertIsNone(self.pq.add_or_change_value('b', 3.0, None, return_item=False))
+
+        self.assertEqual(self.pq['a'].value, 2.0)
+        self.assertEqual(self.pq['b'].value, 3.0)
+        self.assertTrue(self.pq._verify_invariants())
+
+    def test_item_identifier(self) -> None:
+        items = {key: self.pq.add(key, float(i), None) for i, key in enumerate('abcdef')}
+
+        self.pq.change_value(items['a'], 10.0)
+        del self.pq[items['b']]
+
+        self.assertEqual(items['a'].value, 10.0)
+        self.assertFalse(items['b'] in self.pq)
+        self.assertEqual(self.pq.pop()[0], 'c')
+        self.assertTrue(self.pq._verify_invariants())
+
 
 class InvariantTest(unittest.TestCase):
     NUMBER_OF_ENTRIES = 10000
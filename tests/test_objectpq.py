@@ -0,0 +1,357 @@
+import datetime
+import decimal
+import gc
+import heapq
+import random
+import typing
+import unittest
+import weakref
+
+from apq import ObjectItem, ObjectPQ
+
+
+class DummyClass(object):
+    pass
+
+
+class Rank(object):
+    # Rank only supports <, comparing two Ranks with raise_on set raises.
+    def __init__(self, rank: int, raise_on: bool=False) -> None:
+        self.rank = rank
+        self.raise_on = raise_on
+
+    def __lt__(self, other: object) -> bool:
+        if not isinstance(other, Rank):
+            return NotImplemented
+        if self.raise_on or other.raise_on:
+            raise ValueError("rank cannot be compared")
+        return self.rank < other.rank
+
+
+class LimitedRank(Rank):
+    # Comparisons of LimitedRanks raise once budget is exhausted, a negative
+    # budget is unlimited.
+    budget = -1
+
+    def __lt__(self, other: object) -> bool:
+        if LimitedRank.budget == 0:
+            raise ValueError("comparison budget exhausted")
+        LimitedRank.budget -= 1
+        return super().__lt__(other)
+
+
+_base = datetime.datetime(2020, 1, 1)
+
+
+def _dt(days: int) -> datetime.datetime:
+    return _base + datetime.timedelta(days=days)
+
+
+class InitialisationTest(unittest.TestCase):
+    def test_correct(self) -> None:
+        self.assertEqual(len(ObjectPQ()), 0)
+        self.assertEqual(len(ObjectPQ([])), 0)
+
+        dummy = DummyClass()
+        pq: ObjectPQ[typing.Optional[DummyClass]] = ObjectPQ([('a', _dt(1), dummy), ('b', _dt(0), None)])
+        self.assertEqual(len(pq), 2)
+        self.assertEqual(pq.peek().key, 'b')
+        self.assertIs(pq['a'].data, dummy)
+        self.assertIsNone(pq.sort_key)
+        self.assertEqual(pq.data_type, 'object')
+        self.assertTrue(pq._verify_invariants())
+
+        none_pq: ObjectPQ[None] = ObjectPQ([('a', 1)], data_type='none')
+        self.assertEqual(none_pq.pop(), ('a', 1, None))
+
+    def test_incorrect(self) -> None:
+        with self.assertRaises(TypeError):
+            typing.cast(typing.Any, ObjectPQ)([], [])
+        with self.assertRaises(ValueError):
+            ObjectPQ(typing.cast(typing.Any, [('a', 1.0)]))
+        with self.assertRaises(KeyError):
+            ObjectPQ([('a', 1, None), ('a', 2, None)])
+        with self.assertRaises(TypeError):
+            ObjectPQ([('a', 1, None), ('b', 'b', None)])
+        with self.assertRaises(TypeError):
+            ObjectPQ(sort_key=typing.cast(typing.Any, 1))
+        with self.assertRaises(ValueError):
+            ObjectPQ(data_type='unknown')
+
+    def test_failed_initialisation_releases_objects(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        with self.assertRaises(TypeError):
+            ObjectPQ([('a', Rank(1), dummy), ('b', 'b', None)])
+        del dummy
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+class ValueTest(unittest.TestCase):
+    def test_add_pop(self) -> None:
+        pq: ObjectPQ[int] = ObjectPQ()
+        a = pq.add('a', decimal.Decimal('2.5'), 0)
+        pq.add('b', decimal.Decimal('1.5'), 1)
+        self.assertIsNone(pq.add('c', decimal.Decimal('3'), 2, return_item=False))
+
+        self.assertIsInstance(a, ObjectItem)
+        self.assertEqual((a.key, a.value, a.data), ('a', decimal.Decimal('2.5'), 0))
+        self.assertEqual(pq.peek(), pq['b'])
+        self.assertEqual(pq.pop(), ('b', decimal.Decimal('1.5'), 1))
+        self.assertEqual(pq.pop(), ('a', decimal.Decimal('2.5'), 0))
+        self.assertEqual(pq.pop(), ('c', decimal.Decimal('3'), 2))
+        with self.assertRaises(IndexError):
+            pq.pop()
+        with self.assertRaises(IndexError):
+            pq.peek()
+
+    def test_mapping(self) -> None:
+        pq: ObjectPQ[None] = ObjectPQ([('a', 1), ('b', 0)], data_type='none')
+
+        self.assertEqual(set(pq), {'a', 'b'})
+        self.assertEqual(set(pq.keys()), {'a', 'b'})
+        self.assertIn(pq['a'], pq.values())
+        self.assertIn(('a', pq['a']), pq.items())
+        self.assertIn(pq['a'], pq)
+        self.assertNotIn('c', pq)
+        self.assertNotIn(1, pq)
+        self.assertIsNone(pq.get('c'))
+        self.assertEqual(pq.get(pq['b']), pq['b'])
+
+        item = pq['b']
+        del pq[item]
+        self.assertNotIn(item, pq)
+        with self.assertRaises(KeyError):
+            item.value
+        with self.assertRaises(KeyError):
+            del pq['b']
+        del pq['a']
+        self.assertEqual(len(pq), 0)
+
+    def test_change_value(self) -> None:
+        pq: ObjectPQ[None] = ObjectPQ([('a', _dt(2)), ('b', _dt(1))], data_type='none')
+
+        item = pq.change_value('a', _dt(0))
+        self.assertEqual(item.value, _dt(0))
+        self.assertEqual(pq.peek().key, 'a')
+        pq.change_value(item, _dt(3))
+        self.assertEqual(pq.peek().key, 'b')
+        with self.assertRaises(KeyError):
+            pq.change_value('c', _dt(0))
+
+        pq.add_or_change_value('c', _dt(1))
+        pq.add_or_change_value('a', _dt(0))
+        self.assertEqual([key for key, _, _ in pq.pop_many()], ['a', 'b', 'c'])
+
+    def test_fifo(self) -> None:
+        for max_heap in (False, True):
+            with self.subTest(max_heap=max_heap):
+                pq: ObjectPQ[None] = ObjectPQ(max_heap=max_heap, data_type='none')
+                for i in range(30):
+                    pq.add(str(i), Rank(i % 3))
+
+                popped = [int(key) for key, _, _ in pq.pop_many()]
+                expected = sorted(range(30), key=lambda i: (-(i % 3) if max_heap else i % 3, i))
+                self.assertEqual(popped, expected)
+
+    def test_sort_key(self) -> None:
+        calls = []
+
+        def sort_key(value: typing.Tuple[str, int]) -> int:
+            calls.append(value)
+            return value[1]
+
+        pq: ObjectPQ[None] = ObjectPQ([('a', ('x', 3))], sort_key=sort_key, data_type='none')
+        pq.add('b', ('y', 1))
+        pq.add('c', ('z', 2))
+        pq.change_value('a', ('x', 0))
+
+        self.assertIs(pq.sort_key, sort_key)
+        self.assertEqual(pq['a'].value, ('x', 0))
+        # the sort key is computed once for each value, not on comparisons
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(pq.pop_many(until=('', 1)), [('a', ('x', 0), None), ('b', ('y', 1), None)])
+        self.assertEqual(len(calls), 5)
+
+    def test_pop_many(self) -> None:
+        pq: ObjectPQ[int] = ObjectPQ((str(i), decimal.Decimal(i % 5), i) for i in range(10))
+
+        self.assertEqual([key for key, _, _ in pq.pop_many(3)], ['0', '5', '1'])
+        self.assertEqual(pq.pop_many(0), [])
+        self.assertEqual(pq.pop_many(until=decimal.Decimal(2), inclusive=False), [('6', decimal.Decimal(1), 6)])
+        keys, priorities, data = pq.pop_many(until=decimal.Decimal(3), columns=True)
+        self.assertEqual(keys, ['2', '7', '3', '8'])
+        self.assertEqual(priorities, [2, 2, 3, 3])
+        self.assertEqual(data, [2, 7, 3, 8])
+        self.assertEqual(len(pq.pop_many(10)), 2)
+        with self.assertRaises(ValueError):
+            pq.pop_many(-1)
+        with self.assertRaises(TypeError):
+            pq.pop_many(typing.cast(typing.Any, 2.5))
+
+        max_pq: ObjectPQ[None] = ObjectPQ(((str(i), i) for i in range(10)), max_heap=True, data_type='none')
+        self.assertEqual([value for _, value, _ in max_pq.pop_many(until=7)], [9, 8, 7])
+
+    def test_random(self) -> None:
+        for max_heap in (False, True):
+            with self.subTest(max_heap=max_heap):
+                pq: ObjectPQ[None] = ObjectPQ(max_heap=max_heap, data_type='none')
+                values: typing.Dict[str, datetime.datetime] = {}
+                for i in range(2000):
+                    op = random.random()
+                    if values and op < 0.2:
+                        key = random.choice(list(values))
+                        del pq[key]
+                        del values[key]
+                    elif values and op < 0.5:
+                        key = random.choice(list(values))
+                        values[key] = _dt(random.randrange(50))
+                        pq.change_value(key, values[key])
+                    elif values and op < 0.6:
+                        key, value, _ = pq.pop()
+                        expected = max(values.values()) if max_heap else min(values.values())
+                        self.assertEqual(value, expected)
+                        self.assertEqual(value, values.pop(key))
+                    else:
+                        values[str(i)] = _dt(random.randrange(50))
+                        pq.add(str(i), values[str(i)])
+
+                    if i % 100 == 0:
+                        self.assertTrue(pq._verify_invariants())
+                self.assertEqual(len(pq), len(values))
+
+                popped = [value for _, value, _ in pq.pop_many()]
+                self.assertEqual(popped, heapq.nlargest(len(values), values.values()) if max_heap else sorted(values.values()))
+
+
+class ComparisonErrorTest(unittest.TestCase):
+    def test_incomparable(self) -> None:
+        pq: ObjectPQ[None] = ObjectPQ([('a', _dt(0))], data_type='none')
+
+        # incomparable priorities are rejected before the PQ is modified
+        with self.assertRaises(TypeError):
+            pq.add('b', 1)
+        with self.assertRaises(TypeError):
+            pq.change_value('a', 1)
+        with self.assertRaises(TypeError):
+            pq.add_or_change_value('a', 1)
+        self.assertEqual(list(pq), ['a'])
+        self.assertEqual(pq['a'].value, _dt(0))
+        with self.assertRaises(TypeError):
+            pq.pop_many(until=1)
+        self.assertEqual(len(pq), 1)
+
+    def tearDown(self) -> None:
+        LimitedRank.budget = -1
+
+    def test_raising_comparison(self) -> None:
+        with self.assertRaises(ValueError):
+            ObjectPQ([('a', Rank(0)), ('b', Rank(1, raise_on=True))])
+
+        operations: typing.Dict[str, typing.Callable[[ObjectPQ[None]], object]] = {
+            'add': lambda pq: pq.add('x', LimitedRank(-5)),
+            'add_or_change_value': lambda pq: pq.add_or_change_value('x', LimitedRank(-5)),
+            'change_value up': lambda pq: pq.change_value('9', LimitedRank(-5)),
+            'change_value down': lambda pq: pq.change_value('0', LimitedRank(20)),
+            'del': lambda pq: pq.__delitem__('3'),
+            'pop': lambda pq: pq.pop(),
+            'pop_many': lambda pq: pq.pop_many(8),
+            'pop_many until': lambda pq: pq.pop_many(until=LimitedRank(7)),
+        }
+
+        # Each operation either succeeds or raises and leaves the PQ as it
+        # was, for comparisons raising at any point during the operation.
+        expected = [(str(i), i) for i in range(10)]
+        for name, operation in operations.items():
+            for budget in range(60):
+                with self.subTest(operation=name, budget=budget):
+                    pq: ObjectPQ[None] = ObjectPQ(((str(i), LimitedRank(i)) for i in range(10)), data_type='none')
+                    LimitedRank.budget = budget
+                    try:
+                        operation(pq)
+                    except ValueError:
+                        LimitedRank.budget = -1
+                        self.assertEqual(len(pq), 10)
+                        self.assertNotIn('x', pq)
+                        self.assertTrue(pq._verify_invariants())
+                        self.assertEqual([(key, value.rank) for key, value, _ in pq.pop_many()], expected)
+                    else:
+                        LimitedRank.budget = -1
+                        self.assertTrue(pq._verify_invariants())
+                        break
+            self.assertGreater(budget, 2)
+
+    def test_modification_during_comparison(self) -> None:
+        pq: ObjectPQ[None] = ObjectPQ(data_type='none')
+        mutate = False
+
+        class Mutating(object):
+            def __lt__(self, other: 'Mutating') -> bool:
+                if mutate:
+                    pq.clear()
+                return False
+
+        for key in 'abc':
+            pq.add(key, Mutating())
+        mutate = True
+        # add() is rejected before the PQ is modified, pop() is reverted when
+        # the exception raised by clear() is propagated
+        with self.assertRaises(RuntimeError):
+            pq.add('d', Mutating())
+        with self.assertRaises(RuntimeError):
+            pq.pop()
+        with self.assertRaises(RuntimeError):
+            pq.pop_many(until=Mutating())
+        with self.assertRaises(RuntimeError):
+            pq._verify_invariants()
+        mutate = False
+        self.assertEqual(len(pq), 3)
+        self.assertTrue(pq._verify_invariants())
+
+
+class ReleaseTest(unittest.TestCase):
+    def _assert_released(self, ref: "weakref.ReferenceType[DummyClass]") -> None:
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_pop(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq: ObjectPQ[DummyClass] = ObjectPQ([('a', Rank(0), dummy)])
+        del dummy
+        pq.pop()
+        self._assert_released(ref)
+
+    def test_change_value(self) -> None:
+        priority = Rank(0)
+        ref = weakref.ref(priority)
+        pq: ObjectPQ[None] = ObjectPQ([('a', priority)], sort_key=lambda rank: rank, data_type='none')
+        del priority
+        pq.change_value('a', Rank(1))
+        self._assert_released(typing.cast(typing.Any, ref))
+
+    def test_del(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq: ObjectPQ[DummyClass] = ObjectPQ([('a', Rank(0), dummy)])
+        del dummy, pq
+        self._assert_released(ref)
+
+    def test_reference_cycle(self) -> None:
+        for as_priority in (False, True):
+            with self.subTest(as_priority=as_priority):
+                dummy = DummyClass()
+                ref = weakref.ref(dummy)
+                pq: ObjectPQ[typing.Any] = ObjectPQ()
+                if as_priority:
+                    pq.add('a', dummy, None)
+                else:
+                    pq.add('a', 0, dummy)
+                setattr(dummy, 'pq', pq)
+                del dummy, pq
+                self._assert_released(ref)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+import array
+import gc
+import heapq
+import random
+import typing
+import unittest
+import weakref
+
+from apq import SimplePQ
+
+
+class DummyClass(object):
+    pass
+
+
+class InitialisationTest(unittest.TestCase):
+    def test_correct(self) -> None:
+        self.assertEqual(len(SimplePQ()), 0)
+        self.assertEqual(len(SimplePQ([])), 0)
+
+        dummy = DummyClass()
+        pq: SimplePQ[DummyClass] = SimplePQ([(1.0, dummy)])
+        self.assertEqual(len(pq), 1)
+        value, data = pq.peek()
+        self.assertEqual(value, 1.0)
+        self.assertIs(data, dummy)
+        self.assertEqual(pq.priority_type, 'float64')
+        self.assertEqual(pq.data_type, 'object')
+
+    def test_incorrect(self) -> None:
+        with self.assertRaises(TypeError):
+            typing.cast(typing.Any, SimplePQ)([], [])
+        with self.assertRaises(ValueError):
+            SimplePQ(typing.cast(typing.Any, [(1.0,)]))
+        with self.assertRaises(TypeError):
+            SimplePQ(typing.cast(typing.Any, [('a', None)]))
+        with self.assertRaises(ValueError):
+            SimplePQ(priority_type=typing.cast(typing.Any, ('float64', 'int64')))
+        with self.assertRaises(ValueError):
+            SimplePQ(data_type='unknown')
+
+    def test_failed_initialisation_releases_data(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        with self.assertRaises(TypeError):
+            SimplePQ(typing.cast(typing.Any, [(1.0, dummy), ('a', None)]))
+        del dummy
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+class ValueTest(unittest.TestCase):
+    def test_add_pop(self) -> None:
+        pq: SimplePQ[str] = SimplePQ()
+        pq.add(2.0, 'a')
+        pq.add(1.0, 'b')
+        pq.add(3.0, 'c')
+
+        self.assertEqual(len(pq), 3)
+        self.assertEqual(pq.peek(), (1.0, 'b'))
+        self.assertEqual(pq.pop(), (1.0, 'b'))
+        self.assertEqual(pq.pop(), (2.0, 'a'))
+        self.assertEqual(pq.pop(), (3.0, 'c'))
+        with self.assertRaises(IndexError):
+            pq.pop()
+        with self.assertRaises(IndexError):
+            pq.peek()
+
+    def test_fifo(self) -> None:
+        pq: SimplePQ[int] = SimplePQ((float(i % 3), i) for i in range(30))
+        for i in range(30, 60):
+            pq.add(float(i % 3), i)
+
+        popped = [pq.pop() for _ in range(60)]
+        self.assertEqual(popped, sorted(popped))
+
+    def test_max_heap(self) -> None:
+        pq: SimplePQ[int] = SimplePQ(((1.0, 0), (3.0, 1), (3.0, 2)), max_heap=True)
+        pq.add(2.0, 3)
+        self.assertEqual([pq.pop() for _ in range(4)], [(3.0, 1), (3.0, 2), (2.0, 3), (1.0, 0)])
+
+    def test_priority_types(self) -> None:
+        int_pq: SimplePQ[None] = SimplePQ(priority_type='int64')
+        int_pq.add(2 ** 62 + 1, None)
+        int_pq.add(2 ** 62, None)
+        self.assertEqual(int_pq.pop(), (2 ** 62, None))
+        with self.assertRaises(TypeError):
+            int_pq.add(1.5, None)
+
+        float_pq: SimplePQ[None] = SimplePQ(priority_type='float32')
+        float_pq.add(0.1, None)
+        self.assertEqual(float_pq.pop(), (array.array('f', [0.1])[0], None))
+
+    def test_data_types(self) -> None:
+        for data_type, data in [('none', None), ('int64', 7), ('float64', 0.5)]:
+            with self.subTest(data_type=data_type):
+                pq: SimplePQ[typing.Any] = SimplePQ(data_type=data_type)
+                pq.add(1.0, data)
+                pq.add_many([2.0], [data])
+                self.assertEqual(pq.data_type, data_type)
+                self.assertEqual(pq.pop(), (1.0, data))
+
+    def test_random(self) -> None:
+        for max_heap in (False, True):
+            with self.subTest(max_heap=max_heap):
+                pq: SimplePQ[int] = SimplePQ(max_heap=max_heap)
+                heap: typing.List[typing.Tuple[float, int]] = []
+                sign = -1 if max_heap else 1
+                for i in range(2000):
+                    if heap and random.random() < 0.4:
+                        value, data = pq.pop()
+                        expected_value, expected_data = heapq.heappop(heap)
+                        self.assertEqual((value, data), (sign * expected_value, expected_data))
+                    else:
+                        value = float(random.randrange(50))
+                        pq.add(value, i)
+                        heapq.heappush(heap, (sign * value, i))
+
+                    if i % 100 == 0:
+                        self.assertTrue(pq._verify_invariants())
+                self.assertEqual(len(pq), len(heap))
+
+
+class BulkTest(unittest.TestCase):
+    def test_add_many(self) -> None:
+        pq: SimplePQ[int] = SimplePQ([(0.5, -1)])
+        pq.add_many([3.0, 1.0, 2.0], [0, 1, 2])
+        pq.add_many(array.array('d', [1.0, 0.0]), [3, 4])
+        self.assertTrue(pq._verify_invariants())
+        self.assertEqual(pq.pop_many(), [(0.0, 4), (0.5, -1), (1.0, 1), (1.0, 3), (2.0, 2), (3.0, 0)])
+
+        none_pq: SimplePQ[None] = SimplePQ(data_type='none')
+        none_pq.add_many(array.array('d', [float(i % 7) for i in range(1000)]))
+        self.assertEqual(len(none_pq), 1000)
+        self.assertTrue(none_pq._verify_invariants())
+
+        int_pq: SimplePQ[None] = SimplePQ(priority_type='int64')
+        int_pq.add_many(array.array('q', [3, 1]))
+        self.assertEqual(int_pq.pop(), (1, None))
+
+    def test_add_many_errors(self) -> None:
+        pq: SimplePQ[typing.Any] = SimplePQ(data_type='int64')
+        with self.assertRaises(ValueError):
+            pq.add_many([1.0, 2.0], [1])
+        with self.assertRaises(TypeError):
+            pq.add_many([1.0, 2.0], [1, 'a'])
+        with self.assertRaises(TypeError):
+            pq.add_many(typing.cast(typing.Any, [1.0, 'a']))
+        self.assertEqual(len(pq), 0)
+
+    def test_pop_many(self) -> None:
+        pq: SimplePQ[int] = SimplePQ((float(i % 5), i) for i in range(10))
+
+        self.assertEqual(pq.pop_many(3), [(0.0, 0), (0.0, 5), (1.0, 1)])
+        self.assertEqual(pq.pop_many(0), [])
+        self.assertEqual(pq.pop_many(until=2.0, inclusive=False), [(1.0, 6)])
+        priorities, data = pq.pop_many(until=3.0, columns=True)
+        self.assertEqual(list(priorities), [2.0, 2.0, 3.0, 3.0])
+        self.assertEqual(data, [2, 7, 3, 8])
+        self.assertEqual(pq.pop_many(10), [(4.0, 4), (4.0, 9)])
+        self.assertEqual(pq.pop_many(), [])
+        with self.assertRaises(ValueError):
+            pq.pop_many(-1)
+        with self.assertRaises(TypeError):
+            pq.pop_many(typing.cast(typing.Any, 2.5))
+
+        max_pq: SimplePQ[None] = SimplePQ(((float(i), None) for i in range(10)), max_heap=True)
+        self.assertEqual([value for value, _ in max_pq.pop_many(until=7.0)], [9.0, 8.0, 7.0])
+
+
+class ReleaseTest(unittest.TestCase):
+    def _assert_released(self, ref: "weakref.ReferenceType[DummyClass]") -> None:
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_pop(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq: SimplePQ[DummyClass] = SimplePQ()
+        pq.add(1.0, dummy)
+        del dummy
+        self.assertIsNotNone(ref())
+        pq.pop()
+        self._assert_released(ref)
+
+    def test_clear(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq: SimplePQ[DummyClass] = SimplePQ([(1.0, dummy)])
+        del dummy
+        pq.clear()
+        self.assertEqual(len(pq), 0)
+        self._assert_released(ref)
+
+    def test_del(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq: SimplePQ[DummyClass] = SimplePQ([(1.0, dummy)])
+        del dummy, pq
+        self._assert_released(ref)
+
+    def test_reference_cycle(self) -> None:
+        dummy = DummyClass()
+        ref = weakref.ref(dummy)
+        pq: SimplePQ[DummyClass] = SimplePQ([(1.0, dummy)])
+        setattr(dummy, 'pq', pq)
+        del dummy, pq
+        self._assert_released(ref)
+
+
+if __name__ == '__main__':
+    unittest.main()